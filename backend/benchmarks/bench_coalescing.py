@@ -0,0 +1,60 @@
+"""Checks that identical concurrent generations share one upstream call.
+
+Fires --requests identical generate_notes calls at once, then the same
+number of identical /notes/stream-style subscriptions, against the offline
+stub backend with an empty response cache. Each burst must reach the backend
+exactly once; the script exits non-zero otherwise.
+
+    python benchmarks/bench_coalescing.py --requests 100
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+async def consume(tokens) -> str:
+    return "".join([token async for token in tokens])
+
+
+async def main(args) -> bool:
+    import main as backend
+    from cache import ResponseCache
+    from llm import StubBackend
+
+    ok = True
+    for kind in ("completion", "stream"):
+        stub = StubBackend(latency=f"fixed:{args.latency}", tokens_per_second=args.tokens_per_second)
+        assistant = backend.EduMentorChatbot(stub, response_cache=ResponseCache())
+        started = time.perf_counter()
+        if kind == "completion":
+            replies = await asyncio.gather(*(assistant.generate_notes(args.topic) for _ in range(args.requests)))
+        else:
+            streams = await asyncio.gather(
+                *(assistant.open_generation_stream("notes", topic=args.topic) for _ in range(args.requests))
+            )
+            replies = await asyncio.gather(*(consume(tokens) for tokens in streams))
+        elapsed = time.perf_counter() - started
+        identical = len(set(replies)) == 1
+        print(f"{kind:<10} requests {args.requests}  upstream calls {stub.completions}  "
+              f"identical replies {identical}  {elapsed * 1000:.0f}ms")
+        ok &= stub.completions == 1 and identical
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--tokens-per-second", type=float, default=400)
+    parser.add_argument("--topic", default="quadratic equations")
+    args = parser.parse_args()
+
+    os.environ.setdefault("GROQ_REQUESTS_PER_MINUTE", "1000000")
+    os.environ.setdefault("GROQ_TOKENS_PER_MINUTE", "1000000000")
+    os.environ.setdefault("PROGRESS_DB", os.path.join(tempfile.mkdtemp(prefix="edumentor-bench-"), "progress.db"))
+    sys.exit(0 if asyncio.run(main(args)) else 1)
@@ -0,0 +1,66 @@
+"""Measures upstream throughput of EduMentorChatbot as client concurrency grows.
+
+Runs against the fake Groq server, so the only cost per request is the
+simulated completion latency. With the async client the throughput should
+scale with concurrency until LLM_MAX_CONCURRENCY is reached; a blocking
+client stays flat at roughly 1 / latency.
+
+Run from the backend directory:
+
+    python benchmarks/bench_concurrency.py --latency 0.2
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_groq import serve_in_thread  # noqa: E402
+
+
+async def run_level(assistant, concurrency: int, total: int) -> float:
+    """Fires `total` note generations with `concurrency` workers and returns requests/second."""
+    queue = asyncio.Queue()
+    # Topics are unique per level, so no request is answered from the response cache or coalesced.
+    for i in range(total):
+        queue.put_nowait(f"topic {concurrency}-{i}")
+
+    async def worker():
+        while not queue.empty():
+            topic = queue.get_nowait()
+            await assistant.generate_notes(topic)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return total / (time.perf_counter() - start)
+
+
+async def main(args):
+    from groq import AsyncGroq
+    import main as backend
+    from llm import GroqBackend
+
+    client = AsyncGroq(api_key="fake", base_url=f"http://127.0.0.1:{args.port}", max_retries=0)
+    assistant = backend.EduMentorChatbot(GroqBackend(client), max_concurrency=args.max_concurrency)
+    print(f"{'concurrency':>12} {'req/s':>10}")
+    for concurrency in args.levels:
+        rps = await run_level(assistant, concurrency, max(args.requests, concurrency * 4))
+        print(f"{concurrency:>12} {rps:>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--max-concurrency", type=int, default=64)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    # Lift the local quota so it doesn't cap the measured throughput.
+    os.environ.setdefault("GROQ_REQUESTS_PER_MINUTE", "1000000")
+    os.environ.setdefault("GROQ_TOKENS_PER_MINUTE", "1000000000")
+    serve_in_thread(args.port, args.latency)
+    asyncio.run(main(args))
@@ -0,0 +1,163 @@
+"""Load-tests /chat, /chat/stream, /notes, /notes/stream and /test against the offline stub backend.
+
+Starts uvicorn in a subprocess with LLM_BACKEND=stub (no network access
+beyond localhost), lifts the local quota and disables the response and
+semantic caches so every request reaches the backend, then drives each
+endpoint at rising concurrency. Reports throughput, p50/p95/p99 latency and,
+for streaming endpoints, time to first token. Suitable for CI: --json writes
+the results and --fail-p95-ms exits non-zero on a latency regression.
+
+    python benchmarks/bench_endpoints.py --levels 1 4 16 --requests 64
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENDPOINTS = {
+    "/chat": lambda i: {"message": f"Explain question {i} about projectile motion", "session_id": f"bench-{i}"},
+    "/chat/stream": lambda i: {"message": f"Explain question {i} about projectile motion", "session_id": f"stream-{i}"},
+    "/notes": lambda i: {"topic": f"topic {i}"},
+    "/notes/stream": lambda i: {"topic": f"streamed topic {i}"},
+    "/test": lambda i: {"subject": "math"},
+}
+
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else float("nan")
+
+
+async def timed_request(client: httpx.AsyncClient, endpoint: str, payload: dict) -> tuple[float, float | None, bool]:
+    """Returns (latency s, time to first token s or None, success)."""
+    started = time.perf_counter()
+    if not endpoint.endswith("/stream"):
+        response = await client.post(endpoint, json=payload)
+        return time.perf_counter() - started, None, response.status_code == 200
+    first_token = None
+    async with client.stream("POST", endpoint, json=payload) as response:
+        async for line in response.aiter_lines():
+            if first_token is None and line.startswith("data:"):
+                first_token = time.perf_counter() - started
+    return time.perf_counter() - started, first_token, response.status_code == 200
+
+
+async def run_level(client: httpx.AsyncClient, endpoint: str, concurrency: int, total: int, offset: int) -> dict:
+    queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(offset + i)
+    latencies, ttfts, errors = [], [], 0
+
+    async def worker():
+        nonlocal errors
+        while not queue.empty():
+            i = queue.get_nowait()
+            latency, ttft, ok = await timed_request(client, endpoint, ENDPOINTS[endpoint](i))
+            latencies.append(latency)
+            if ttft is not None:
+                ttfts.append(ttft)
+            errors += not ok
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "rps": round(total / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "ttft_p50_ms": round(percentile(ttfts, 0.50) * 1000, 1) if ttfts else None,
+        "ttft_p95_ms": round(percentile(ttfts, 0.95) * 1000, 1) if ttfts else None,
+    }
+
+
+async def run(args) -> list:
+    base_url = f"http://127.0.0.1:{args.port}"
+    limits = httpx.Limits(max_connections=max(args.levels) * 2)
+    results = []
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        offset = 0
+        for endpoint in args.endpoints:
+            for concurrency in args.levels:
+                total = max(args.requests, concurrency * 4)
+                result = await run_level(client, endpoint, concurrency, total, offset)
+                offset += total
+                results.append(result)
+                ttft = f"{result['ttft_p50_ms']:>9.1f}" if result["ttft_p50_ms"] is not None else f"{'-':>9}"
+                print(f"{endpoint:<14} {concurrency:>5} {result['rps']:>8.1f} {result['p50_ms']:>8.1f} "
+                      f"{result['p95_ms']:>8.1f} {result['p99_ms']:>8.1f} {ttft} {result['errors']:>6}")
+    return results
+
+
+def start_server(args) -> subprocess.Popen:
+    data_dir = tempfile.mkdtemp(prefix="edumentor-bench-")
+    env = {
+        **os.environ,
+        "LLM_BACKEND": "stub",
+        "LLM_STUB_LATENCY": args.latency,
+        "LLM_STUB_TOKENS_PER_SECOND": str(args.tokens_per_second),
+        "LLM_STUB_ERROR_RATE_5XX": str(args.error_rate),
+        "GROQ_REQUESTS_PER_MINUTE": "10000000",
+        "GROQ_TOKENS_PER_MINUTE": "10000000000",
+        "RESPONSE_CACHE_TTL": "0",
+        "SEMANTIC_CACHE_INTENTS": "",
+        "PROGRESS_DB": os.path.join(data_dir, "progress.db"),
+        "JOBS_DB": os.path.join(data_dir, "jobs.db"),
+        "CATALOGUE_WARMUP_ON_STARTUP": "0",
+        "RETRIEVAL_DIR": os.path.join(data_dir, "course_index"),
+        "LOG_LEVEL": "WARNING",
+    }
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{args.port}/readyz").status_code == 200:
+                return server
+        except httpx.TransportError:
+            pass
+        time.sleep(0.05)
+    server.terminate()
+    raise RuntimeError("server did not become ready")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8003)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--requests", type=int, default=64, help="Requests per level (at least 4x concurrency).")
+    parser.add_argument("--endpoints", nargs="+", default=list(ENDPOINTS), choices=list(ENDPOINTS))
+    parser.add_argument("--latency", default="lognormal:0.3:0.4", help="Stub time-to-first-token distribution.")
+    parser.add_argument("--tokens-per-second", type=float, default=250)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Injected 5xx rate.")
+    parser.add_argument("--json", help="Write results to this file.")
+    parser.add_argument("--fail-p95-ms", type=float, help="Exit 1 if any level's p95 exceeds this.")
+    args = parser.parse_args()
+
+    server = start_server(args)
+    try:
+        print(f"{'endpoint':<14} {'conc':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'ttft ms':>9} {'errors':>6}")
+        results = asyncio.run(run(args))
+    finally:
+        server.terminate()
+        server.wait()
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump({"latency": args.latency, "tokens_per_second": args.tokens_per_second, "results": results},
+                      output, indent=2)
+    if args.fail_p95_ms is not None and any(result["p95_ms"] > args.fail_p95_ms for result in results):
+        sys.exit(1)
@@ -0,0 +1,61 @@
+"""Measures practice-test grading throughput and checks it never reaches the upstream.
+
+Generates one structured test with the offline stub backend, then grades
+--submissions random answer sheets from --students students through
+EduMentorChatbot.submit_test with --concurrency in flight. Each student's
+first submission updates per-topic accuracy, the attempt record and XP in
+the progress store; later ones are only graded. The script exits non-zero
+if grading made any upstream call.
+
+    python benchmarks/bench_grading.py --submissions 20000 --concurrency 256
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+async def main(args) -> bool:
+    import main as backend
+    from llm import StubBackend
+
+    stub = StubBackend(latency="fixed:0.05", tokens_per_second=10000)
+    assistant = backend.EduMentorChatbot(stub)
+    test_id = (await assistant.generate_test("math"))["test_id"]
+    calls_before = stub.completions
+    test = await assistant.get_test(test_id)
+
+    rng = random.Random(3)
+    queue = asyncio.Queue()
+    for i in range(args.submissions):
+        queue.put_nowait((f"student-{i % args.students}", [rng.choice("ABCD") for _ in test["questions"]]))
+
+    async def worker():
+        while not queue.empty():
+            student_id, answers = queue.get_nowait()
+            await assistant.submit_test(test, answers, student_id)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    await assistant.progress.close()
+    upstream_calls = stub.completions - calls_before
+    print(f"graded {args.submissions} submissions in {elapsed:.2f}s: {args.submissions / elapsed:,.0f}/s  "
+          f"upstream calls during grading: {upstream_calls}  {assistant.progress.stats()}")
+    return upstream_calls == 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--submissions", type=int, default=20000)
+    parser.add_argument("--students", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=256)
+    args = parser.parse_args()
+
+    os.environ.setdefault("PROGRESS_DB", os.path.join(tempfile.mkdtemp(prefix="edumentor-bench-"), "progress.db"))
+    sys.exit(0 if asyncio.run(main(args)) else 1)
@@ -0,0 +1,148 @@
+"""Calibrates the local intent classifier on held-out messages and checks it against the LLM path.
+
+HELD_OUT holds labeled student messages that are not in the classifier's
+seed phrases. For each candidate threshold the script reports how many
+messages the classifier would answer locally (coverage) and how many of
+those it gets right (precision), then recommends the lowest threshold
+whose precision reaches --target-precision. That value is the
+INTENT_CONFIDENCE_THRESHOLD default in main.py.
+
+With --llm, every held-out message is also classified through the
+upstream path that local misses fall back to (GROQ_API_KEY from the
+environment). The script then reports that path's accuracy and how often
+the local answer agrees with it.
+
+    python benchmarks/bench_intent.py --target-precision 0.95
+    python benchmarks/bench_intent.py --llm
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from intent import LocalIntentClassifier  # noqa: E402
+
+HELD_OUT = [
+    ("can you make a test on algebra", "TEST"),
+    ("i need a test for tomorrow's chemistry class", "TEST"),
+    ("give me 10 questions on the french revolution", "TEST"),
+    ("prepare a quiz about fractions", "TEST"),
+    ("set a practice paper for physics", "TEST"),
+    ("check how much i know about cells", "TEST"),
+    ("ask me some questions about verbs", "TEST"),
+    ("i want to test myself on geometry", "TEST"),
+    ("make flashcard style questions on acids", "TEST"),
+    ("unit test for trigonometry please", "TEST"),
+    ("play a video about volcanoes", "VIDEO"),
+    ("is there a video explaining fractions", "VIDEO"),
+    ("i learn better by watching, show me the water cycle", "VIDEO"),
+    ("make an animation of blood circulation", "VIDEO"),
+    ("visualize how gears work", "VIDEO"),
+    ("video lesson on the mughal empire", "VIDEO"),
+    ("can i watch something on electricity", "VIDEO"),
+    ("create a video tutorial on verbs", "VIDEO"),
+    ("make notes on the industrial revolution", "NOTES"),
+    ("i need a cheat sheet for derivatives", "NOTES"),
+    ("summarize chapter 4 of biology", "NOTES"),
+    ("write short notes on magnetism", "NOTES"),
+    ("revision sheet for organic chemistry", "NOTES"),
+    ("key points of the cold war for revision", "NOTES"),
+    ("notes on tenses in english", "NOTES"),
+    ("jot down the main formulas of kinematics", "NOTES"),
+    ("make a syllabus for class 10 math", "SYLLABUS"),
+    ("plan my studies for the next month", "SYLLABUS"),
+    ("what should my curriculum look like for history", "SYLLABUS"),
+    ("course outline for learning spanish", "SYLLABUS"),
+    ("build me a 6 week study plan for physics", "SYLLABUS"),
+    ("which chapters should i cover first in chemistry", "SYLLABUS"),
+    ("design a learning path for beginner science", "SYLLABUS"),
+    ("i am losing hope with maths", "MOTIVATION"),
+    ("i feel hopeless about my exams", "MOTIVATION"),
+    ("nothing goes in my head, i want to quit", "MOTIVATION"),
+    ("i'm really stressed about boards", "MOTIVATION"),
+    ("give me some motivation to study", "MOTIVATION"),
+    ("i keep procrastinating and feel bad", "MOTIVATION"),
+    ("everyone is smarter than me", "MOTIVATION"),
+    ("i can't focus at all today", "MOTIVATION"),
+    ("explain the theory of relativity", "EXPLANATION"),
+    ("what is a covalent bond", "EXPLANATION"),
+    ("describe how volcanoes form", "EXPLANATION"),
+    ("what are mitochondria", "EXPLANATION"),
+    ("meaning of photosynthesis in simple words", "EXPLANATION"),
+    ("teach me how democracy works", "EXPLANATION"),
+    ("define kinetic energy", "EXPLANATION"),
+    ("tell me about the mughal empire", "EXPLANATION"),
+    ("how does the heart pump blood", "EXPLANATION"),
+    ("solve x^2 - 5x + 6 = 0", "DOUBT_SOLVING"),
+    ("what is 12 * 8", "DOUBT_SOLVING"),
+    ("i'm stuck on question 3 of my homework", "DOUBT_SOLVING"),
+    ("why does ice float on water", "DOUBT_SOLVING"),
+    ("how do i find the area of a triangle", "DOUBT_SOLVING"),
+    ("help me with this equation 3x = 12", "DOUBT_SOLVING"),
+    ("i got 14 but the book says 16, where is my mistake", "DOUBT_SOLVING"),
+    ("how to calculate percentage increase", "DOUBT_SOLVING"),
+    ("doubt in chapter 2 exercise 5", "DOUBT_SOLVING"),
+    ("hello there", "DEFAULT"),
+    ("thanks a lot", "DEFAULT"),
+    ("good evening", "DEFAULT"),
+    ("who made you", "DEFAULT"),
+    ("ok cool", "DEFAULT"),
+    ("bye see you", "DEFAULT"),
+    ("what's your name", "DEFAULT"),
+    # Subject questions that mention a rule keyword without asking for that feature.
+    ("i have some questions about photosynthesis", "EXPLANATION"),
+    ("is this on the test?", "DEFAULT"),
+    ("motivation behind the french revolution", "EXPLANATION"),
+    ("can you explain the notes of a musical scale", "EXPLANATION"),
+    ("i am stressed, can you explain integration", "EXPLANATION"),
+]
+
+THRESHOLDS = [0.5, 0.6, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95, 0.99]
+
+
+def calibrate(classifier: LocalIntentClassifier, target_precision: float) -> float | None:
+    predictions = [(classifier.predict(text), label) for text, label in HELD_OUT]
+    print(f"{'threshold':>9} {'coverage':>9} {'precision':>9} {'local':>6} {'wrong':>6}")
+    recommended = None
+    for threshold in THRESHOLDS:
+        answered = [(intent, label) for (intent, confidence), label in predictions if confidence >= threshold]
+        wrong = sum(intent != label for intent, label in answered)
+        precision = (len(answered) - wrong) / len(answered) if answered else 1.0
+        print(f"{threshold:>9.2f} {len(answered) / len(HELD_OUT):>9.1%} {precision:>9.1%} {len(answered):>6} {wrong:>6}")
+        if recommended is None and precision >= target_precision:
+            recommended = threshold
+    for (intent, confidence), label in predictions:
+        if intent != label and confidence >= (recommended or 1.0):
+            print(f"  local mistake at the recommended threshold: {label} -> {intent} ({confidence:.2f})")
+    return recommended
+
+
+async def compare_with_llm(threshold: float):
+    import main
+
+    assistant = main.get_assistant()
+    classifier = LocalIntentClassifier(threshold=threshold)
+    llm_correct = agree = local = 0
+    for text, label in HELD_OUT:
+        llm_intent = await assistant.classify_intent_with_llm(text)
+        llm_correct += llm_intent == label
+        local_intent = classifier.classify(text)
+        if local_intent is not None:
+            local += 1
+            agree += local_intent == llm_intent
+    print(f"LLM path accuracy: {llm_correct / len(HELD_OUT):.1%}  "
+          f"local/LLM agreement on {local} locally answered messages: {agree / local if local else 0:.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--target-precision", type=float, default=0.95)
+    parser.add_argument("--llm", action="store_true", help="Also classify through the upstream LLM path.")
+    args = parser.parse_args()
+
+    threshold = calibrate(LocalIntentClassifier(), args.target_precision)
+    print(f"recommended INTENT_CONFIDENCE_THRESHOLD: {threshold}")
+    if args.llm:
+        asyncio.run(compare_with_llm(threshold or 1.0))
@@ -0,0 +1,94 @@
+"""Concurrency and scaling check for SQLiteProgressStore.
+
+1. Consistency: N worker processes share one database file and each submits
+   many concurrent tests for the same set of students. Every XP point and
+   attempt must be accounted for afterwards.
+2. Scaling: /progress lookups are primary-key reads, so their latency should
+   not change between a small and a large student table.
+
+    python benchmarks/bench_progress.py --workers 8
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from progress import SQLiteProgressStore  # noqa: E402
+
+
+async def submit_tests(path: str, students: int, submissions: int, write_behind: bool):
+    store = SQLiteProgressStore(path, write_behind=write_behind)
+
+    async def submit(i):
+        student_id = f"student-{i % students}"
+        await store.award(student_id, 100, "Mock Test Ace")
+        await store.record_attempt(student_id, "math", "math fundamentals")
+
+    await asyncio.gather(*(submit(i) for i in range(submissions)))
+    await store.close()
+
+
+def worker(path: str, students: int, submissions: int, write_behind: bool):
+    asyncio.run(submit_tests(path, students, submissions, write_behind))
+
+
+async def verify(path: str, students: int, expected_per_student: int) -> bool:
+    store = SQLiteProgressStore(path)
+    ok = True
+    for i in range(students):
+        progress = await store.get_progress(f"student-{i}")
+        if progress["xp"] != expected_per_student * 100 or progress["math"]["attempts"] != expected_per_student:
+            ok = False
+            print(f"mismatch for student-{i}: {progress}")
+    await store.close()
+    return ok
+
+
+async def lookup_latency(path: str, population: int, samples: int = 2000) -> float:
+    """Median /progress lookup in microseconds with `population` students in the table."""
+    store = SQLiteProgressStore(path)
+    store._apply([(
+        "INSERT OR IGNORE INTO students (student_id, xp, updated_at) VALUES (?, ?, 0)", (f"pop-{i}", i)
+    ) for i in range(population)])
+    timings = []
+    for i in range(samples):
+        started = time.perf_counter()
+        await store.get_progress(f"pop-{(i * 7919) % population}")
+        timings.append(time.perf_counter() - started)
+    await store.close()
+    return statistics.median(timings) * 1e6
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--students", type=int, default=50)
+    parser.add_argument("--submissions", type=int, default=500, help="Test submissions per worker.")
+    parser.add_argument("--write-behind", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "progress.db")
+        SQLiteProgressStore(path)  # create the schema before workers race for it
+        started = time.perf_counter()
+        processes = [multiprocessing.Process(target=worker, args=(path, args.students, args.submissions, args.write_behind))
+                     for _ in range(args.workers)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - started
+        total = args.workers * args.submissions
+        expected = total // args.students
+        consistent = asyncio.run(verify(path, args.students, expected))
+        print(f"{args.workers} workers, {total} submissions in {elapsed:.2f}s ({total / elapsed:.0f}/s), consistent={consistent}")
+
+        for population in (1_000, 100_000):
+            path = os.path.join(directory, f"lookup-{population}.db")
+            print(f"median /progress lookup with {population:>7} students: {asyncio.run(lookup_latency(path, population)):.1f} us")
@@ -0,0 +1,57 @@
+"""Micro-benchmark for system-prompt assembly in process_message.
+
+Compares the original per-turn build (f-string concatenation plus
+json.dumps of the whole RESOURCES dict) against the precompiled templates
+with subject-trimmed resource context, reporting build time and an
+approximate token count per turn.
+
+    python benchmarks/bench_prompt_build.py
+"""
+import json
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GROQ_BASE_URL", "http://127.0.0.1:9")
+
+import main  # noqa: E402
+from sessions import StudentSession  # noqa: E402
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+def approx_tokens(text: str) -> int:
+    """Word-and-punctuation count; close enough to BPE counts for a before/after comparison."""
+    return len(TOKEN_PATTERN.findall(text))
+
+
+def legacy_build(intent: str, session: StudentSession) -> str:
+    """The prompt assembly process_message used before templates were precompiled."""
+    prompt_data = main.MASTER_SYSTEM_PROMPTS.get(intent, main.MASTER_SYSTEM_PROMPTS["DEFAULT"])
+    contextual_info = f"""
+        CURRENT CONTEXT:
+        - Study Status: {session.study_status}
+        - Current Subject: {session.current_subject or 'Not Set'}
+        - Resources: {json.dumps(main.RESOURCES)}
+        - XP: {session.xp}
+        - Achievements: {json.dumps(session.achievements)}
+        """
+    anti_repetition_rule = "CRITICAL: Do NOT repeat or translate the user's question. Answer directly."
+    return f"{prompt_data['persona']}\n{contextual_info}\nRULES:\n{prompt_data['rules']}\n{anti_repetition_rule}"
+
+
+if __name__ == "__main__":
+    session = StudentSession("bench")
+    session.xp = 150
+    session.achievements = ["Mock Test Ace"]
+    number = 20000
+    print(f"{'subject':>10} {'intent':>14} {'legacy us':>10} {'compiled us':>12} {'legacy tok':>11} {'compiled tok':>13}")
+    for subject in [None, "math", "history"]:
+        session.current_subject = subject
+        for intent in ["DEFAULT", "EXPLANATION", "MOTIVATION"]:
+            legacy = timeit.timeit(lambda: legacy_build(intent, session), number=number) / number * 1e6
+            compiled = timeit.timeit(lambda: main.build_system_prompt(intent, session), number=number) / number * 1e6
+            print(f"{subject or '-':>10} {intent:>14} {legacy:>10.2f} {compiled:>12.2f} "
+                  f"{approx_tokens(legacy_build(intent, session)):>11} {approx_tokens(main.build_system_prompt(intent, session)):>13}")
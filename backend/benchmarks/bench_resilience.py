@@ -0,0 +1,90 @@
+"""Exercises the upstream resilience layer against the fake Groq server.
+
+Scenarios:
+  1. 30% of completions answered with 429 + Retry-After: retries should hide almost all of them.
+  2. Upstream fully down (503): the breaker should open and later calls fail fast.
+  3. Upstream recovers: after the reset timeout a probe closes the breaker again.
+  4. Local quota smaller than the offered load: requests are spaced out instead of hitting 429s.
+
+    python benchmarks/bench_resilience.py
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_groq import serve_in_thread  # noqa: E402
+
+
+async def fire(assistant, count: int):
+    """Sends count concurrent note requests; returns (successes, errors, mean latency in ms)."""
+    async def one(i):
+        started = time.perf_counter()
+        reply = await assistant.generate_notes(f"resilience topic {time.time()} {i}")
+        return not reply.startswith("⚠️"), time.perf_counter() - started
+
+    results = await asyncio.gather(*(one(i) for i in range(count)))
+    ok = sum(1 for success, _ in results if success)
+    return ok, count - ok, sum(latency for _, latency in results) / count * 1000
+
+
+async def main(args):
+    from groq import AsyncGroq
+    import main as backend
+    from llm import GroqBackend
+    from resilience import CircuitBreaker, RateLimiter, UpstreamGuard
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    faults = httpx.AsyncClient(base_url=base_url)
+
+    def make_assistant(requests_per_minute=1e6):
+        guard = UpstreamGuard(
+            RateLimiter(requests_per_minute, 1e9, max_wait=30),
+            CircuitBreaker(failure_threshold=5, reset_timeout=args.reset_timeout),
+            max_retries=4, backoff_base=0.05, backoff_max=1.0,
+        )
+        return backend.EduMentorChatbot(
+            GroqBackend(AsyncGroq(api_key="fake", base_url=base_url, max_retries=0)), upstream_guard=guard
+        )
+
+    def report(name, assistant, outcome):
+        ok, errors, latency = outcome
+        stats = assistant.upstream_guard.stats()
+        print(f"{name:<28} ok={ok:<4} errors={errors:<4} mean={latency:7.1f}ms breaker={stats['breaker_state']:<9} "
+              f"retries={stats['retries']} rejected={stats['breaker_rejected']} throttled={stats['rate_limit_throttled']}")
+
+    assistant = make_assistant()
+    await faults.post("/_faults", json={"rate_429": 0.3, "retry_after": 0.1})
+    report("429s with Retry-After", assistant, await fire(assistant, args.requests))
+
+    await faults.post("/_faults", json={"rate_429": 0.0, "down": True})
+    report("upstream down", assistant, await fire(assistant, args.requests))
+    report("upstream down (fail fast)", assistant, await fire(assistant, args.requests))
+
+    await faults.post("/_faults", json={"down": False})
+    await asyncio.sleep(args.reset_timeout)
+    report("recovered (probe)", assistant, await fire(assistant, 1))
+    report("recovered", assistant, await fire(assistant, args.requests))
+
+    throttled = make_assistant(requests_per_minute=12)
+    report("local quota 12 req/min", throttled, await fire(throttled, 14))
+    await faults.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8788)
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--reset-timeout", type=float, default=1.0)
+    args = parser.parse_args()
+
+    os.environ["GROQ_BASE_URL"] = f"http://127.0.0.1:{args.port}"
+    # Measure the guard on its own: no fallback model to hide the primary's failures.
+    os.environ["LLM_ROUTES"] = '{"notes": {"fallback": null}}'
+    serve_in_thread(args.port, latency=0.05)
+    asyncio.run(main(args))
@@ -0,0 +1,67 @@
+"""Measures course index build time, mmap load time and BM25 query latency.
+
+Builds a synthetic course of --passages passages split across --documents
+documents, deletes one document (tombstone + merge), then reopens the index
+from disk and times queries.
+
+    python benchmarks/bench_retrieval.py --passages 100000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from retrieval import CourseIndex  # noqa: E402
+
+VOCABULARY = [
+    "force", "mass", "acceleration", "velocity", "energy", "momentum", "gravity", "friction", "newton", "inertia",
+    "light", "refraction", "reflection", "lens", "wave", "frequency", "current", "voltage", "resistance", "circuit",
+    "atom", "electron", "proton", "nucleus", "molecule", "reaction", "acid", "base", "salt", "oxidation",
+    "cell", "photosynthesis", "chlorophyll", "enzyme", "protein", "gene", "evolution", "ecosystem", "species", "tissue",
+] + [f"term{i}" for i in range(5000)]
+
+
+def passage(rng: random.Random) -> str:
+    return " ".join(rng.choice(VOCABULARY) for _ in range(rng.randint(30, 60)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--passages", type=int, default=100000)
+    parser.add_argument("--documents", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    with tempfile.TemporaryDirectory() as directory:
+        index = CourseIndex(directory)
+        started = time.perf_counter()
+        document_ids = []
+        per_document = args.passages // args.documents
+        for _ in range(args.documents):
+            document_ids.append(index.add_document([passage(rng) for _ in range(per_document)]))
+        print(f"build: {time.perf_counter() - started:.2f}s for {args.passages} passages, {index.stats()}")
+
+        started = time.perf_counter()
+        index.delete_document(document_ids[0])
+        index.compact()
+        print(f"delete + merge: {time.perf_counter() - started:.2f}s, {index.stats()}")
+
+        started = time.perf_counter()
+        reopened = CourseIndex(directory)
+        print(f"load: {(time.perf_counter() - started) * 1000:.2f}ms")
+
+        queries = [" ".join(rng.sample(VOCABULARY[:40], 3)) for _ in range(args.queries)]
+        latencies = []
+        for query in queries:
+            started = time.perf_counter()
+            reopened.search(query, k=4)
+            latencies.append((time.perf_counter() - started) * 1000)
+        latencies.sort()
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+        print(f"query: p50 {statistics.median(latencies):.2f}ms  p95 {p95:.2f}ms  max {latencies[-1]:.2f}ms")
@@ -0,0 +1,104 @@
+"""Measures /chat throughput as the number of worker processes grows.
+
+For each --workers count, starts serve.py with the offline stub backend
+(near-zero latency, so requests are bound by the server's own CPU work),
+shared SQLite state in a fresh directory, the local quota lifted and the
+caches disabled. Then drives /chat with --concurrency requests in flight and
+reports throughput and the speedup over one worker. Every session gets two
+turns, so with more than one worker most second turns are served by a
+different process than the first and read the history from shared state.
+Scaling is bounded by the host's cores; the CPU count is printed first.
+
+    python benchmarks/bench_scaling.py --workers 1 2 4 --requests 2000
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def start_server(args, workers: int) -> subprocess.Popen:
+    data_dir = tempfile.mkdtemp(prefix="edumentor-bench-")
+    env = {
+        **os.environ,
+        "LLM_BACKEND": "stub",
+        "LLM_STUB_LATENCY": args.latency,
+        "LLM_STUB_TOKENS_PER_SECOND": "1000000",
+        "GROQ_REQUESTS_PER_MINUTE": "10000000",
+        "GROQ_TOKENS_PER_MINUTE": "10000000000",
+        "RESPONSE_CACHE_TTL": "0",
+        "SEMANTIC_CACHE_INTENTS": "",
+        "SHARED_STATE_URL": f"sqlite:///{os.path.join(data_dir, 'state.db')}",
+        "PROGRESS_DB": os.path.join(data_dir, "progress.db"),
+        "JOBS_DB": os.path.join(data_dir, "jobs.db"),
+        "CATALOGUE_WARMUP_ON_STARTUP": "0",
+        "RETRIEVAL_DIR": os.path.join(data_dir, "course_index"),
+        "LOG_LEVEL": "WARNING",
+    }
+    server = subprocess.Popen(
+        [sys.executable, "serve.py", "--workers", str(workers), "--port", str(args.port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{args.port}/readyz").status_code == 200:
+                return server
+        except httpx.TransportError:
+            pass
+        time.sleep(0.05)
+    server.terminate()
+    raise RuntimeError("server did not become ready")
+
+
+async def drive(args) -> tuple[float, int]:
+    """Returns (requests per second, failed requests) for one /chat run."""
+    queue = asyncio.Queue()
+    for i in range(args.requests):
+        queue.put_nowait(i)
+    errors = 0
+
+    async def worker(client: httpx.AsyncClient):
+        nonlocal errors
+        while not queue.empty():
+            i = queue.get_nowait()
+            payload = {"message": f"Explain question {i} about projectile motion", "session_id": f"scaling-{i // 2}"}
+            response = await client.post("/chat", json=payload)
+            errors += response.status_code != 200
+
+    limits = httpx.Limits(max_connections=args.concurrency * 2)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=120, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+    return args.requests / elapsed, errors
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8004)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--latency", default="fixed:0.01", help="Stub time-to-first-token distribution.")
+    args = parser.parse_args()
+
+    print(f"cpus: {os.cpu_count()}")
+    print(f"{'workers':>7} {'req/s':>9} {'speedup':>8} {'errors':>6}")
+    baseline = None
+    for workers in args.workers:
+        server = start_server(args, workers)
+        try:
+            rps, errors = asyncio.run(drive(args))
+        finally:
+            server.terminate()
+            server.wait()
+        baseline = baseline or rps
+        print(f"{workers:>7} {rps:>9.1f} {rps / baseline:>7.2f}x {errors:>6}")
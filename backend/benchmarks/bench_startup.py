@@ -0,0 +1,68 @@
+"""Measures how long the backend takes from process start to import, liveness and readiness.
+
+Starts uvicorn in a subprocess pointed at the fake Groq server (whose
+latency stands in for the key-validation round-trip) and polls /healthz and
+/readyz. Importing main.py should not touch the network at all.
+
+    python benchmarks/bench_startup.py --latency 0.5
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from fake_groq import serve_in_thread  # noqa: E402
+
+
+def time_import(env: dict) -> float:
+    """Seconds spent importing main.py in a fresh interpreter."""
+    code = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+    output = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True)
+    return float(output.stdout.strip().splitlines()[-1])
+
+
+def time_boot(env: dict, port: int, timeout: float = 30.0) -> tuple[float, float]:
+    """Seconds from spawning uvicorn until /healthz and /readyz first return 200."""
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    live = ready = None
+    try:
+        while ready is None and time.perf_counter() - started < timeout:
+            try:
+                if live is None and httpx.get(f"http://127.0.0.1:{port}/healthz").status_code == 200:
+                    live = time.perf_counter() - started
+                if live is not None and httpx.get(f"http://127.0.0.1:{port}/readyz").status_code == 200:
+                    ready = time.perf_counter() - started
+            except httpx.TransportError:
+                pass
+            time.sleep(0.01)
+    finally:
+        server.terminate()
+        server.wait()
+    return live, ready
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fake-port", type=int, default=8789)
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.5, help="Simulated key-validation latency.")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    serve_in_thread(args.fake_port, latency=args.latency)
+    env = {**os.environ, "GROQ_BASE_URL": f"http://127.0.0.1:{args.fake_port}", "GROQ_API_KEY": "fake"}
+    print(f"{'run':>4} {'import s':>9} {'live s':>8} {'ready s':>8}")
+    for run in range(1, args.runs + 1):
+        imported = time_import(env)
+        live, ready = time_boot(env, args.port)
+        print(f"{run:>4} {imported:>9.3f} {live or float('nan'):>8.3f} {ready or float('nan'):>8.3f}")
@@ -0,0 +1,94 @@
+"""Measures server peak RSS while /upload ingests text files of increasing size.
+
+Each size runs against a fresh uvicorn process (pointed at the fake Groq
+server) so the kernel's high-water mark (VmHWM) belongs to that upload
+alone. Peak RSS should stay roughly flat as the file grows.
+
+    python benchmarks/bench_upload.py --sizes-mb 1 16 64
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from fake_groq import serve_in_thread  # noqa: E402
+
+PARAGRAPH = ("Photosynthesis converts light energy into chemical energy stored in glucose. " * 12 + "\n\n").encode()
+
+
+def peak_rss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def write_document(size_mb: int) -> str:
+    handle, path = tempfile.mkstemp(suffix=".txt")
+    with os.fdopen(handle, "wb") as document:
+        for _ in range(size_mb * 1024 * 1024 // len(PARAGRAPH)):
+            document.write(PARAGRAPH)
+    return path
+
+
+def run_upload(env: dict, port: int, path: str) -> tuple[float, float, int]:
+    """Uploads path to a fresh server; returns (seconds, peak RSS MB, NDJSON lines)."""
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while True:
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/healthz").status_code == 200:
+                    break
+            except httpx.TransportError:
+                time.sleep(0.05)
+        started = time.perf_counter()
+        with open(path, "rb") as document:
+            response = httpx.post(f"http://127.0.0.1:{port}/upload?mode=notes",
+                                  files={"file": (os.path.basename(path), document, "text/plain")}, timeout=600)
+        elapsed = time.perf_counter() - started
+        return elapsed, peak_rss_mb(server.pid), len(response.text.splitlines())
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fake-port", type=int, default=8790)
+    parser.add_argument("--port", type=int, default=8002)
+    parser.add_argument("--sizes-mb", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--max-chunks", type=int, default=200)
+    args = parser.parse_args()
+
+    serve_in_thread(args.fake_port, latency=0.01)
+    env = {
+        **os.environ,
+        "GROQ_BASE_URL": f"http://127.0.0.1:{args.fake_port}",
+        "GROQ_API_KEY": "fake",
+        "GROQ_REQUESTS_PER_MINUTE": "100000",
+        "GROQ_TOKENS_PER_MINUTE": "100000000",
+        "UPLOAD_MAX_BYTES": str((max(args.sizes_mb) + 1) * 1024 * 1024),
+        "UPLOAD_MAX_CHUNKS": str(args.max_chunks),
+        "PROGRESS_DB": os.path.join(tempfile.gettempdir(), "bench_upload_progress.db"),
+        "JOBS_DB": os.path.join(tempfile.gettempdir(), "bench_upload_jobs.db"),
+        "CATALOGUE_WARMUP_ON_STARTUP": "0",
+    }
+    print(f"{'size MB':>8} {'seconds':>8} {'peak RSS MB':>12} {'lines':>6}")
+    for size_mb in args.sizes_mb:
+        path = write_document(size_mb)
+        try:
+            elapsed, peak, lines = run_upload(env, args.port, path)
+        finally:
+            os.remove(path)
+        print(f"{size_mb:>8} {elapsed:>8.2f} {peak:>12.1f} {lines:>6}")
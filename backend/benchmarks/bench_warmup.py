@@ -0,0 +1,61 @@
+"""Measures catalogue request latency before and after the response-cache warm-up.
+
+Uses the offline stub backend. Times one request per catalogue item against
+an empty cache, then runs the warm-up into a second, empty cache and times
+the same requests again. After the warm-up every item should be a cache hit
+served in well under a millisecond.
+
+    python benchmarks/bench_warmup.py --latency 0.3
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+async def time_catalogue(assistant, generations) -> list:
+    latencies = []
+    for method, arguments in generations:
+        started = time.perf_counter()
+        await assistant._generate(method, **arguments)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def report(label: str, latencies: list):
+    print(f"{label:<8} p50 {statistics.median(latencies):9.2f}ms  max {max(latencies):9.2f}ms")
+
+
+async def main(args):
+    import main as backend
+    from cache import ResponseCache
+    from llm import StubBackend
+
+    generations = backend.catalogue_generations(backend.RESOURCES)
+    stub = StubBackend(latency=f"fixed:{args.latency}", tokens_per_second=args.tokens_per_second)
+    report("cold", await time_catalogue(backend.EduMentorChatbot(stub, response_cache=ResponseCache()), generations))
+
+    assistant = backend.EduMentorChatbot(stub, response_cache=ResponseCache())
+    started = time.perf_counter()
+    outcomes = await assistant.warm_cache(generations, args.concurrency)
+    print(f"warm-up  {len(generations)} items in {time.perf_counter() - started:.2f}s "
+          f"(concurrency {args.concurrency}): {outcomes}")
+    report("warm", await time_catalogue(assistant, generations))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--tokens-per-second", type=float, default=400)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    os.environ.setdefault("GROQ_REQUESTS_PER_MINUTE", "1000000")
+    os.environ.setdefault("GROQ_TOKENS_PER_MINUTE", "1000000000")
+    os.environ.setdefault("PROGRESS_DB", os.path.join(tempfile.mkdtemp(prefix="edumentor-bench-"), "progress.db"))
+    asyncio.run(main(args))
@@ -0,0 +1,121 @@
+"""A local stand-in for the Groq API used by the benchmarks.
+
+Serves the two endpoints the backend touches (model listing and chat
+completions, buffered or streamed) with a configurable artificial latency,
+so load tests never burn real quota. Faults (429s with Retry-After, 5xx
+responses, a fully down upstream) can be injected at start-up or changed at
+runtime via POST /_faults.
+
+    python benchmarks/fake_groq.py --port 8787 --latency 0.2 --rate-429 0.1
+"""
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+FAKE_REPLY = "This is a canned EduMentor reply from the fake Groq server."
+
+
+def create_app(latency: float = 0.2, token_interval: float = 0.01, rate_429: float = 0.0, rate_5xx: float = 0.0,
+               retry_after: float | None = None) -> FastAPI:
+    """Builds the fake Groq app with a fixed time-to-first-token, per-token interval and fault rates."""
+    app = FastAPI(title="Fake Groq")
+    app.state.latency = latency
+    app.state.token_interval = token_interval
+    app.state.faults = {"rate_429": rate_429, "rate_5xx": rate_5xx, "retry_after": retry_after, "down": False}
+    app.state.completions = 0
+    app.state.injected = {"429": 0, "5xx": 0}
+    app.state.cancelled_streams = 0
+
+    def injected_fault() -> JSONResponse | None:
+        faults = app.state.faults
+        if faults["down"] or random.random() < faults["rate_5xx"]:
+            app.state.injected["5xx"] += 1
+            return JSONResponse({"error": {"message": "upstream unavailable", "type": "server_error"}}, status_code=503)
+        if random.random() < faults["rate_429"]:
+            app.state.injected["429"] += 1
+            headers = {} if faults["retry_after"] is None else {"retry-after": str(faults["retry_after"])}
+            return JSONResponse({"error": {"message": "rate limit reached", "type": "tokens"}}, status_code=429, headers=headers)
+        return None
+
+    @app.post("/_faults")
+    async def set_faults(request: Request):
+        app.state.faults.update(await request.json())
+        return {"faults": app.state.faults, "completions": app.state.completions, "injected": app.state.injected}
+
+    @app.get("/openai/v1/models")
+    async def list_models():
+        await asyncio.sleep(app.state.latency)
+        return {"object": "list", "data": [{"id": "llama3-70b-8192", "object": "model", "created": 0, "owned_by": "fake"}]}
+
+    @app.post("/openai/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        fault = injected_fault()
+        if fault is not None:
+            return fault
+        app.state.completions += 1
+        if body.get("stream"):
+            return StreamingResponse(stream_completion(body), media_type="text/event-stream")
+        await asyncio.sleep(app.state.latency)
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "llama3-70b-8192"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": FAKE_REPLY}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 12, "total_tokens": 22},
+        }
+
+    async def stream_completion(body: dict):
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        await asyncio.sleep(app.state.latency)
+        try:
+            for index, word in enumerate(FAKE_REPLY.split(" ")):
+                if index:
+                    await asyncio.sleep(app.state.token_interval)
+                chunk = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": body.get("model", "llama3-70b-8192"),
+                    "choices": [{"index": 0, "delta": {"content": ("" if index == 0 else " ") + word}, "finish_reason": None}],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+            yield "data: [DONE]\n\n"
+        except asyncio.CancelledError:
+            app.state.cancelled_streams += 1
+            raise
+
+    return app
+
+
+def serve_in_thread(port: int = 8787, latency: float = 0.2, token_interval: float = 0.01, **faults) -> uvicorn.Server:
+    """Starts the fake server on a background thread and waits until it accepts requests."""
+    config = uvicorn.Config(create_app(latency, token_interval, **faults), host="127.0.0.1", port=port, log_level="warning")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a fake Groq server for local load testing.")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds to wait before each completion.")
+    parser.add_argument("--token-interval", type=float, default=0.01, help="Seconds between streamed tokens.")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Fraction of completions answered with 429.")
+    parser.add_argument("--rate-5xx", type=float, default=0.0, help="Fraction of completions answered with 503.")
+    parser.add_argument("--retry-after", type=float, default=None, help="Retry-After seconds sent with 429s.")
+    args = parser.parse_args()
+    app = create_app(args.latency, args.token_interval, args.rate_429, args.rate_5xx, args.retry_after)
+    uvicorn.run(app, host="127.0.0.1", port=args.port)
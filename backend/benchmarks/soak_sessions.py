@@ -0,0 +1,40 @@
+"""Soak test for SessionManager memory usage.
+
+Simulates many distinct students each sending a few chat turns and samples
+traced memory along the way. With bounded history and the session cap,
+memory should plateau once SESSION_MAX_COUNT sessions are live instead of
+growing with the total number of messages served.
+
+    python benchmarks/soak_sessions.py --sessions 100000
+"""
+import argparse
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sessions import SessionManager  # noqa: E402
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=100000)
+    parser.add_argument("--turns", type=int, default=5, help="Chat turns per session.")
+    parser.add_argument("--max-sessions", type=int, default=10000)
+    parser.add_argument("--samples", type=int, default=10)
+    args = parser.parse_args()
+
+    manager = SessionManager(max_sessions=args.max_sessions, history_messages=6, max_message_chars=4000)
+    question = "Can you explain how photosynthesis converts light energy into chemical energy? " * 3
+    answer = "Photosynthesis happens in the chloroplasts, where light reactions produce ATP and NADPH. " * 6
+
+    tracemalloc.start()
+    step = max(1, args.sessions // args.samples)
+    print(f"{'sessions':>10} {'messages':>10} {'live':>8} {'traced MiB':>11}")
+    for i in range(1, args.sessions + 1):
+        session = manager.get(f"student-{i}")
+        for _ in range(args.turns):
+            session.add_turn(question, answer, manager.max_message_chars)
+        if i % step == 0:
+            current, _ = tracemalloc.get_traced_memory()
+            print(f"{i:>10} {i * args.turns * 2:>10} {len(manager):>8} {current / 2**20:>11.1f}")
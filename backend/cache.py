@@ -0,0 +1,198 @@
+"""Content-addressed response cache for the generation endpoints.
+
+Entries are keyed on a normalized (method, arguments, prompt template hash,
+model, temperature) tuple. A bounded in-memory LRU tier with TTL sits in
+front of an optional SQLite tier that survives restarts and can be shared by
+the workers of one host, or of a SharedState tier (e.g. Redis) shared by
+workers on several hosts. Entries written under an old template hash are
+never looked up again; the shared tier lets them expire by TTL. When several
+workers share the second tier, memory_ttl bounds how long each worker's
+memory copy is trusted, so an invalidation on one worker reaches the others
+within that time.
+"""
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+from shared_state import SharedState
+
+
+def normalize_argument(value):
+    """Case- and whitespace-folds string arguments so trivially different requests share an entry."""
+    if isinstance(value, str):
+        return " ".join(value.lower().split())
+    return value
+
+
+def template_hash(*parts: str) -> str:
+    """Short stable hash of the prompt text that feeds a generation method."""
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+class ResponseCache:
+    """Two-tier (memory LRU + optional SQLite or SharedState) cache of generated responses."""
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 32 * 1024 * 1024, ttl: float = 86400.0,
+                 db_path: str | None = None, shared: SharedState | None = None, memory_ttl: float | None = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.memory_ttl = memory_ttl
+        # key -> (value, expires_at, method, template_hash, size)
+        self._entries: "OrderedDict[str, Tuple[str, float, str, str, int]]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.shared = shared
+        self._db = None
+        self._db_lock = threading.Lock()
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, method TEXT NOT NULL, template_hash TEXT NOT NULL, "
+                "value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_method ON responses (method)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_template ON responses (template_hash)")
+            self._db.commit()
+
+    @staticmethod
+    def make_key(method: str, arguments: Dict, prompt_hash: str, model: str, temperature: float) -> str:
+        """Builds the content address for a generation request."""
+        normalized = {name: normalize_argument(value) for name, value in sorted(arguments.items())}
+        payload = json.dumps([method, normalized, prompt_hash, model, round(temperature, 3)], sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, value: str, expires_at: float, method: str, prompt_hash: str):
+        """Inserts into the memory tier and evicts least-recently-used entries past the limits."""
+        self._forget(key)
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        if self.memory_ttl:
+            # Past this the entry is re-read from the second tier, which other workers may have invalidated.
+            expires_at = min(expires_at, time.time() + self.memory_ttl)
+        self._entries[key] = (value, expires_at, method, prompt_hash, size)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted[4]
+
+    def _forget(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry:
+            self._bytes -= entry[4]
+
+    def _disk_get(self, key: str):
+        with self._db_lock:
+            return self._db.execute(
+                "SELECT value, expires_at, method, template_hash FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+
+    def _disk_set(self, key: str, value: str, expires_at: float, method: str, prompt_hash: str):
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, method, template_hash, value, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (key, method, prompt_hash, value, expires_at),
+            )
+            self._db.commit()
+
+    async def get(self, key: str) -> str | None:
+        """Returns the cached value for key, or None on a miss or expiry."""
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry:
+            if entry[1] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self._forget(key)
+        if self._db is not None:
+            row = await asyncio.to_thread(self._disk_get, key)
+            if row and row[1] > now:
+                self._remember(key, *row)
+                self.disk_hits += 1
+                return row[0]
+        elif self.shared is not None:
+            record = await self.shared.get(f"response:{key}")
+            if record is not None:
+                value, expires_at, method, prompt_hash = json.loads(record)
+                self._remember(key, value, expires_at, method, prompt_hash)
+                self.disk_hits += 1
+                return value
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: str, method: str, prompt_hash: str):
+        """Stores a value in both tiers."""
+        expires_at = time.time() + self.ttl
+        self._remember(key, value, expires_at, method, prompt_hash)
+        if self._db is not None:
+            await asyncio.to_thread(self._disk_set, key, value, expires_at, method, prompt_hash)
+        elif self.shared is not None:
+            await self.shared.set(f"response:{key}", json.dumps([value, expires_at, method, prompt_hash]), self.ttl)
+
+    async def invalidate(self, method: str | None = None, prompt_hash: str | None = None) -> int:
+        """Drops entries matching method and/or template hash (everything if neither is given)."""
+        def matches(entry_method, entry_hash):
+            return (method is None or entry_method == method) and (prompt_hash is None or entry_hash == prompt_hash)
+
+        doomed = [key for key, entry in self._entries.items() if matches(entry[2], entry[3])]
+        for key in doomed:
+            self._forget(key)
+        removed = len(doomed)
+        if self._db is not None:
+            clauses, params = [], []
+            if method is not None:
+                clauses.append("method = ?")
+                params.append(method)
+            if prompt_hash is not None:
+                clauses.append("template_hash = ?")
+                params.append(prompt_hash)
+            where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+            with self._db_lock:
+                removed = max(removed, self._db.execute(f"DELETE FROM responses{where}", params).rowcount)
+                self._db.commit()
+        elif self.shared is not None:
+            shared_removed = 0
+            for shared_key, record in await self.shared.scan("response:"):
+                _, _, entry_method, entry_hash = json.loads(record)
+                if matches(entry_method, entry_hash):
+                    await self.shared.delete(shared_key)
+                    shared_removed += 1
+            removed = max(removed, shared_removed)
+        return removed
+
+    def retain_templates(self, current: Dict[str, str]) -> int:
+        """Purges persisted entries written under prompt templates that have since changed."""
+        if self._db is None:
+            return 0
+        removed = 0
+        with self._db_lock:
+            for method, prompt_hash in current.items():
+                removed += self._db.execute(
+                    "DELETE FROM responses WHERE method = ? AND template_hash != ?", (method, prompt_hash)
+                ).rowcount
+            removed += self._db.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),)).rowcount
+            self._db.commit()
+        return removed
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "memory_hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            "persistent": self._db is not None,
+            "shared": self.shared.name if self.shared is not None else None,
+        }
@@ -0,0 +1,112 @@
+"""Bounded-memory ingestion of uploaded study material.
+
+The request body is read chunk by chunk against a byte budget and handed to
+Starlette's multipart parser, which spools the file part to a
+SpooledTemporaryFile (in memory up to 1 MiB, on disk beyond that). Text is
+then extracted one read block or one PDF page at a time and re-cut into
+token-bounded chunks, so only a few chunks are ever held in memory whatever
+the size of the file.
+"""
+import codecs
+import os
+from typing import AsyncIterator, BinaryIO, Iterable, Iterator
+
+from starlette.datastructures import FormData, UploadFile
+from starlette.formparsers import MultiPartParser
+from starlette.requests import Request
+
+try:
+    from pypdf import PdfReader
+except ImportError:  # PDF support is optional
+    PdfReader = None
+
+# Same heuristic as the local rate limiter's token estimate.
+CHARS_PER_TOKEN = 4
+READ_BLOCK_BYTES = 64 * 1024
+
+TEXT_EXTENSIONS = {".txt", ".md", ".markdown", ".csv", ".tex"}
+
+
+class UploadTooLargeError(Exception):
+    """Raised as soon as the request body exceeds the upload size limit."""
+
+
+class UnsupportedDocumentError(Exception):
+    """Raised for file types we cannot extract text from."""
+
+
+async def _limited_stream(request: Request, max_bytes: int) -> AsyncIterator[bytes]:
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > max_bytes:
+            raise UploadTooLargeError(f"upload exceeds {max_bytes} bytes")
+        yield chunk
+
+
+async def read_upload_form(request: Request, max_bytes: int) -> FormData:
+    """Parses a multipart upload without buffering it, rejecting it once it passes max_bytes.
+
+    The caller owns the returned form and must close it to delete the spooled files.
+    """
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > max_bytes:
+        raise UploadTooLargeError(f"upload exceeds {max_bytes} bytes")
+    parser = MultiPartParser(request.headers, _limited_stream(request, max_bytes), max_files=1, max_fields=10)
+    return await parser.parse()
+
+
+def form_file(form: FormData, field: str) -> UploadFile | None:
+    """The uploaded file in field, or None if the field is missing or a plain form value."""
+    value = form.get(field)
+    return value if isinstance(value, UploadFile) else None
+
+
+def document_kind(filename: str | None, content_type: str | None) -> str:
+    """Returns "pdf" or "text" for a supported upload."""
+    extension = os.path.splitext(filename or "")[1].lower()
+    if extension == ".pdf" or content_type == "application/pdf":
+        if PdfReader is None:
+            raise UnsupportedDocumentError("PDF uploads need the optional 'pypdf' package on the server.")
+        return "pdf"
+    if extension in TEXT_EXTENSIONS or (content_type or "").startswith("text/"):
+        return "text"
+    raise UnsupportedDocumentError("Only PDF and plain-text uploads are supported.")
+
+
+def iter_text_blocks(file: BinaryIO, kind: str) -> Iterator[str]:
+    """Yields the document text a block (text) or a page (PDF) at a time."""
+    file.seek(0)
+    if kind == "pdf":
+        for page in PdfReader(file).pages:
+            yield (page.extract_text() or "") + "\n\n"
+        return
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    while block := file.read(READ_BLOCK_BYTES):
+        yield decoder.decode(block)
+    yield decoder.decode(b"", final=True)
+
+
+def _boundary(text: str, limit: int) -> int:
+    """Latest paragraph, sentence or word break in the second half of text[:limit]."""
+    for separator in ("\n\n", ". ", "\n", " "):
+        cut = text.rfind(separator, limit // 2, limit)
+        if cut != -1:
+            return cut + len(separator)
+    return limit
+
+
+def split_chunks(blocks: Iterable[str], max_tokens: int) -> Iterator[str]:
+    """Re-cuts a stream of text blocks into chunks of at most max_tokens, preferring natural breaks."""
+    limit = max_tokens * CHARS_PER_TOKEN
+    buffer = ""
+    for block in blocks:
+        buffer += block
+        while len(buffer) >= limit:
+            cut = _boundary(buffer, limit)
+            chunk, buffer = buffer[:cut].strip(), buffer[cut:]
+            if chunk:
+                yield chunk
+    tail = buffer.strip()
+    if tail:
+        yield tail
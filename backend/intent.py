@@ -0,0 +1,156 @@
+"""In-process intent classifier for EduMentor chat messages.
+
+A small multinomial Naive Bayes model trained on seed phrases at import time
+scores every message. Keyword/regex rules for command phrasing ("give me a
+test", "make notes on") add evidence for their intent but never decide on
+their own, so every answer goes through the calibrated threshold. Only when
+the model is not confident does the chatbot fall back to the LLM.
+"""
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Tuple
+
+INTENTS = ["EXPLANATION", "VIDEO", "NOTES", "TEST", "DOUBT_SOLVING", "MOTIVATION", "SYLLABUS", "DEFAULT"]
+
+# Command phrasing per intent. A match adds RULE_WEIGHT to that intent's model score; bare topic words such as
+# "test", "notes" or "motivation" are left out because they also appear in ordinary subject questions.
+INTENT_RULES = {
+    "VIDEO": [r"\bvideos?\b", r"\banimat(ed|ion)\b", r"\bvisuali[sz]e\b", r"\blecture clip\b"],
+    "NOTES": [r"\b(make|give|write|prepare|need|want)( me)?( some| short| quick| revision| study)? notes\b",
+              r"\b(short|revision|study|class) notes\b", r"\bcheat ?sheet\b", r"\bformula sheet\b",
+              r"\brevision sheet\b", r"\bsummari[sz]e\b"],
+    "TEST": [r"\b(mock|practice) (test|exam|paper)\b", r"\bquiz( me)?\b", r"\bmcqs?\b", r"\bpyqs?\b", r"\btest (me|my)\b",
+             r"\b(give|make|set|prepare|take)( me)?( a| an| some)?( \w+)? (test|quiz)\b",
+             r"\b(ask|give) me( \d+| some)? questions\b"],
+    "SYLLABUS": [r"\bsyllabus\b", r"\bcurriculum\b", r"\bcourse (plan|outline|structure)\b", r"\bstudy plan\b"],
+    "MOTIVATION": [r"\b(de|un)motivated\b", r"\bmotivate me\b", r"\b(need|want|give me)( some)? motivation\b",
+                   r"\bno motivation\b", r"\bgive up\b", r"\banxious\b", r"\bcan'?t focus\b",
+                   r"\bfeel(ing)? (sad|low|tired|lazy|hopeless|stressed)\b", r"\bpadhai me mann nahi\b"],
+    "EXPLANATION": [r"^\s*(explain|describe|define)\b", r"\bwhat (is|are) (a |an |the )?\w+", r"\bsamjhao\b",
+                    r"\bsamjha do\b", r"\bmeaning of\b"],
+    "DOUBT_SOLVING": [r"\bsolve\b", r"\bdoubt\b", r"\bstuck\b", r"\bhow (do|can|to) (i )?(solve|calculate|find)\b",
+                      r"\bwhy (is|does|do|did)\b", r"\bhelp me with\b", r"[0-9]\s*[-+*/^=]\s*[0-9x]"],
+    "DEFAULT": [r"^\s*(hi|hello|hey|namaste|thanks|thank you|ok|okay|bye)\b[\s!.]*$"],
+}
+
+# Seed phrases for the lexical model, in the same languages students write in.
+TRAINING_EXAMPLES = {
+    "EXPLANATION": [
+        "explain newton's first law", "what is photosynthesis", "define momentum", "describe the water cycle",
+        "what are prime numbers", "tell me about the french revolution", "how does electricity work",
+        "photosynthesis samjhao", "what does osmosis mean", "teach me about fractions", "concept of gravity",
+        "what is an adjective", "how do plants make food", "meaning of democracy",
+    ],
+    "VIDEO": [
+        "show me a video on cells", "make a video lesson about fractions", "animated explanation of the heart",
+        "video lecture on world war 2", "can you make an animation for atoms", "i want to watch a lesson on algebra",
+        "visual lesson on the solar system", "video chahiye trigonometry par",
+    ],
+    "NOTES": [
+        "give me notes on calculus", "short notes for chemical bonding", "make revision notes on mughal empire",
+        "notes for english grammar", "summary notes of the chapter", "formula sheet for trigonometry",
+        "write study notes on genetics", "quick revision of periodic table", "notes de do algebra ke",
+    ],
+    "TEST": [
+        "give me a practice test in math", "quiz me on science", "mock test for physics", "5 mcqs on history",
+        "test my knowledge of algebra", "previous year questions for chemistry", "ask me questions on biology",
+        "i want to take a test", "check my preparation with questions", "mera test lo",
+    ],
+    "DOUBT_SOLVING": [
+        "solve 2x + 3 = 7", "i have a doubt in integration", "i am stuck on this problem", "how do i solve quadratic equations",
+        "why is the sky blue", "help me with this question", "find the derivative of x^2", "what is the answer to 5 factorial",
+        "calculate the area of a circle with radius 3", "my doubt is about ohm's law", "ye sawal kaise karein",
+        "can you check my answer", "where did i go wrong in this sum",
+    ],
+    "MOTIVATION": [
+        "i feel like giving up", "i am so stressed about exams", "i can't focus on studying", "motivate me",
+        "i failed my test and feel sad", "i am not good at math", "i feel lazy today", "exams are scaring me",
+        "i am tired of studying", "padhai me mann nahi lag raha", "i am anxious about results", "cheer me up",
+    ],
+    "SYLLABUS": [
+        "create a syllabus for beginner math", "course outline for advanced science", "curriculum for history",
+        "make a study plan for 8 weeks", "what topics should i study in chemistry this term", "weekly plan for languages",
+        "design a course for intermediate physics", "plan my learning for biology",
+    ],
+    "DEFAULT": [
+        "hi", "hello", "hey there", "thanks", "thank you so much", "who are you", "good morning", "namaste",
+        "what can you do", "ok", "bye", "how are you",
+    ],
+}
+
+# Log-odds a rule match adds to its intent, i.e. a matching intent is e^RULE_WEIGHT times more likely.
+RULE_WEIGHT = 4.0
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9']+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercases the text and returns unigram plus bigram features."""
+    words = TOKEN_PATTERN.findall(text.lower())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+class LocalIntentClassifier:
+    """Rule + Naive Bayes classifier that resolves intents without an upstream call."""
+    def __init__(self, threshold: float = 0.75, examples: Dict[str, List[str]] | None = None):
+        self.threshold = threshold
+        self.rules = {intent: [re.compile(p, re.IGNORECASE) for p in patterns] for intent, patterns in INTENT_RULES.items()}
+        self.hits = 0
+        self.misses = 0
+        self._train(examples or TRAINING_EXAMPLES)
+
+    def _train(self, examples: Dict[str, List[str]]):
+        """Fits per-intent log priors and Laplace-smoothed log likelihoods."""
+        total_docs = sum(len(texts) for texts in examples.values())
+        counts = {intent: Counter(f for text in texts for f in tokenize(text)) for intent, texts in examples.items()}
+        self.vocabulary = set().union(*counts.values())
+        vocab_size = len(self.vocabulary)
+        self.log_priors = {intent: math.log(len(texts) / total_docs) for intent, texts in examples.items()}
+        self.log_likelihoods: Dict[str, Dict[str, float]] = {}
+        self.log_unseen: Dict[str, float] = {}
+        for intent, counter in counts.items():
+            denominator = sum(counter.values()) + vocab_size
+            self.log_likelihoods[intent] = {f: math.log((c + 1) / denominator) for f, c in counter.items()}
+            self.log_unseen[intent] = math.log(1 / denominator)
+
+    def _match_rules(self, text: str) -> List[str]:
+        return [intent for intent, patterns in self.rules.items() if any(p.search(text) for p in patterns)]
+
+    def _score(self, text: str, matched: List[str]) -> Tuple[str, float]:
+        """Returns the most probable intent and its posterior probability, with matched rules as extra evidence."""
+        features = [f for f in tokenize(text) if f in self.vocabulary]
+        scores = {}
+        for intent in self.log_priors:
+            likelihoods = self.log_likelihoods[intent]
+            unseen = self.log_unseen[intent]
+            scores[intent] = self.log_priors[intent] + sum(likelihoods.get(f, unseen) for f in features)
+            if intent in matched:
+                scores[intent] += RULE_WEIGHT
+        best = max(scores, key=scores.get)
+        normalizer = sum(math.exp(s - scores[best]) for s in scores.values())
+        confidence = 1 / normalizer if features or matched else 0.0
+        return best, confidence
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        """Classifies text, returning (intent, confidence in [0, 1])."""
+        return self._score(text, self._match_rules(text))
+
+    def classify(self, text: str) -> str | None:
+        """Returns the intent when confident enough, otherwise None so the caller can ask the LLM."""
+        intent, confidence = self.predict(text)
+        if confidence >= self.threshold:
+            self.hits += 1
+            return intent
+        self.misses += 1
+        return None
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters; every hit is one upstream round-trip saved."""
+        total = self.hits + self.misses
+        return {
+            "local_hits": self.hits,
+            "llm_fallbacks": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "threshold": self.threshold,
+        }
@@ -0,0 +1,419 @@
+"""Background job queue for long generations.
+
+Jobs are persisted in SQLite as soon as they are submitted, so anything
+still queued (or interrupted while running) is picked up again after a
+restart. A fixed pool of asyncio workers runs them. Dispatch is by priority
+first; within a priority, students are served round-robin so one student
+queueing many jobs cannot starve the others. Results stay in the table for
+result_ttl seconds and can be polled, long-polled or delivered to a webhook.
+
+Several server processes can share one queue database. A job is claimed
+atomically before it runs and holds a lease that its process renews; jobs
+whose lease lapses (their process died) and jobs queued by another process
+are picked up by the periodic sweep, so no job runs twice or is stranded.
+
+Webhook URLs come from unauthenticated clients, so the server only POSTs to
+hosts on webhook_allowed_hosts or, without an allowlist, to hosts that
+resolve to public addresses only. The check runs on submit and again right
+before delivery, and redirects are not followed.
+"""
+import asyncio
+import ipaddress
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Deque, Dict, Iterable, List
+
+import httpx
+
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+FINISHED = ("done", "failed", "cancelled")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    params TEXT NOT NULL,
+    student_id TEXT,
+    priority INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    webhook_url TEXT,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    lease_expires REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+"""
+
+COLUMNS = ("job_id", "kind", "params", "student_id", "priority", "status", "webhook_url", "result", "error",
+           "created_at", "started_at", "finished_at")
+
+Runner = Callable[[Dict], Awaitable[Dict]]
+
+
+logger = logging.getLogger("edumentor")
+
+
+class JobQueueFullError(Exception):
+    """Raised when a student already has the maximum number of pending jobs."""
+
+
+class UnsafeWebhookError(ValueError):
+    """Raised for webhook URLs the server must not call, e.g. ones pointing into its own network."""
+
+
+def _public_address(address: str) -> bool:
+    ip = ipaddress.ip_address(address.split("%", 1)[0])
+    return ip.is_global and not ip.is_multicast
+
+
+async def check_webhook_url(url: str, allowed_hosts: Iterable[str] = ()):
+    """Raises UnsafeWebhookError unless url is http(s) to an allowlisted host or one with only public addresses."""
+    try:
+        parsed = httpx.URL(url)
+    except httpx.InvalidURL as e:
+        raise UnsafeWebhookError(f"Invalid webhook URL: {e}") from e
+    if parsed.scheme not in ("http", "https") or not parsed.host:
+        raise UnsafeWebhookError("Webhook URL must be http or https")
+    allowed_hosts = set(allowed_hosts)
+    if allowed_hosts:
+        if parsed.host not in allowed_hosts:
+            raise UnsafeWebhookError(f"Webhook host must be one of: {', '.join(sorted(allowed_hosts))}")
+        return
+    try:
+        addresses = await asyncio.get_running_loop().getaddrinfo(parsed.host, parsed.port or 443)
+    except OSError as e:
+        raise UnsafeWebhookError(f"Webhook host {parsed.host} does not resolve") from e
+    if not all(_public_address(info[4][0]) for info in addresses):
+        raise UnsafeWebhookError("Webhook URL must not point at a private, loopback or link-local address")
+
+
+class JobQueue:
+    """SQLite-persisted priority queue with per-student round-robin and a local worker pool."""
+    def __init__(self, path: str, workers: int = 4, max_pending_per_student: int = 20, result_ttl: float = 86400.0,
+                 webhook_timeout: float = 10.0, webhook_attempts: int = 3, lease: float = 30.0,
+                 webhook_allowed_hosts: Iterable[str] = ()):
+        self.path = path
+        self.workers = workers
+        self.max_pending_per_student = max_pending_per_student
+        self.result_ttl = result_ttl
+        self.webhook_timeout = webhook_timeout
+        self.webhook_attempts = webhook_attempts
+        self.webhook_allowed_hosts = frozenset(webhook_allowed_hosts)
+        self.lease = lease
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA busy_timeout=5000")
+        self._db.executescript(SCHEMA)
+        if "lease_expires" not in {row[1] for row in self._db.execute("PRAGMA table_info(jobs)")}:
+            self._db.execute("ALTER TABLE jobs ADD COLUMN lease_expires REAL")
+        self._db_lock = threading.Lock()
+        # priority -> student -> job ids; the OrderedDict's order is the round-robin order.
+        self._pending: Dict[int, "OrderedDict[str, Deque[str]]"] = {
+            priority: OrderedDict() for priority in PRIORITIES.values()
+        }
+        self._pending_by_student: Dict[str, int] = {}
+        self._queued: set = set()
+        self._finished: Dict[str, asyncio.Event] = {}
+        self._wakeup: asyncio.Event | None = None
+        self._tasks: List[asyncio.Task] = []
+        self._maintenance: asyncio.Task | None = None
+        self._stopping = False
+        self._running: Dict[str, asyncio.Task] = {}
+        self._deliveries: set = set()
+        self.completed = 0
+        self.failed = 0
+
+    def _execute(self, sql: str, params: Iterable = ()) -> sqlite3.Cursor:
+        with self._db_lock:
+            return self._db.execute(sql, tuple(params))
+
+    def _query(self, sql: str, params: Iterable = ()) -> List[tuple]:
+        with self._db_lock:
+            return self._db.execute(sql, tuple(params)).fetchall()
+
+    def _push(self, job_id: str, student_id: str | None, priority: int):
+        self._queued.add(job_id)
+        self._pending[priority].setdefault(student_id or "", deque()).append(job_id)
+        self._pending_by_student[student_id or ""] = self._pending_by_student.get(student_id or "", 0) + 1
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _pop(self) -> str | None:
+        """Next job id: highest priority first, then the student whose turn it is."""
+        for priority in sorted(self._pending):
+            students = self._pending[priority]
+            if not students:
+                continue
+            student, queue = students.popitem(last=False)
+            job_id = queue.popleft()
+            self._queued.discard(job_id)
+            if queue:
+                students[student] = queue
+            self._pending_by_student[student] -= 1
+            if not self._pending_by_student[student]:
+                del self._pending_by_student[student]
+            return job_id
+        return None
+
+    def _discard_pending(self, job_id: str, student_id: str | None, priority: int) -> bool:
+        student = student_id or ""
+        queue = self._pending[priority].get(student)
+        if queue is None or job_id not in queue:
+            return False
+        queue.remove(job_id)
+        self._queued.discard(job_id)
+        if not queue:
+            del self._pending[priority][student]
+        self._pending_by_student[student] -= 1
+        if not self._pending_by_student[student]:
+            del self._pending_by_student[student]
+        return True
+
+    async def start(self, runner: Runner):
+        """Reloads unfinished jobs from disk and starts the workers."""
+        self._wakeup = asyncio.Event()
+        await asyncio.to_thread(self._prune, time.time())
+        await self._sweep()
+        self._tasks = [asyncio.create_task(self._work(runner)) for _ in range(self.workers)]
+        self._maintenance = asyncio.create_task(self._maintain())
+
+    async def _sweep(self):
+        """Requeues jobs whose lease lapsed and adopts queued jobs this process does not know about yet."""
+        def sweep() -> List[tuple]:
+            with self._db_lock:
+                # A lapsed lease means the process running the job stopped mid-generation; run it again.
+                self._db.execute(
+                    "UPDATE jobs SET status = 'queued', started_at = NULL, lease_expires = NULL "
+                    "WHERE status = 'running' AND lease_expires < ?", (time.time(),)
+                )
+                return self._db.execute(
+                    "SELECT job_id, student_id, priority FROM jobs WHERE status = 'queued' ORDER BY created_at"
+                ).fetchall()
+
+        for job_id, student_id, priority in await asyncio.to_thread(sweep):
+            if job_id not in self._queued:
+                self._push(job_id, student_id, priority)
+
+    async def _maintain(self):
+        """Renews the leases of running jobs every lease/3 seconds and sweeps once per lease."""
+        renewals = 0
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            running = list(self._running)
+            if running:
+                await asyncio.to_thread(
+                    self._execute,
+                    "UPDATE jobs SET lease_expires = ? "
+                    f"WHERE status = 'running' AND job_id IN ({', '.join('?' * len(running))})",
+                    [time.time() + self.lease, *running],
+                )
+            renewals += 1
+            if renewals % 3 == 0:
+                await self._sweep()
+
+    def _prune(self, now: float):
+        self._execute("DELETE FROM jobs WHERE status IN ('done', 'failed', 'cancelled') AND finished_at < ?",
+                      (now - self.result_ttl,))
+
+    async def stop(self, drain: float = 0.0):
+        """Stops taking jobs, lets running ones finish for up to drain seconds, then requeues the rest."""
+        self._stopping = True
+        if self._maintenance is not None:
+            self._maintenance.cancel()
+        if self._wakeup is not None:
+            self._wakeup.set()
+        if self._tasks and drain > 0:
+            await asyncio.wait(self._tasks, timeout=drain)
+        abandoned = list(self._running)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if abandoned:
+            # Hand interrupted jobs straight back to the queue rather than waiting for their leases to lapse.
+            self._execute(
+                "UPDATE jobs SET status = 'queued', started_at = NULL, lease_expires = NULL "
+                f"WHERE status = 'running' AND job_id IN ({', '.join('?' * len(abandoned))})",
+                abandoned,
+            )
+        with self._db_lock:
+            self._db.close()
+
+    async def submit(self, kind: str, params: Dict, student_id: str | None = None, priority: str = "normal",
+                     webhook_url: str | None = None) -> Dict:
+        if self._pending_by_student.get(student_id or "", 0) >= self.max_pending_per_student:
+            raise JobQueueFullError(f"at most {self.max_pending_per_student} pending jobs per student")
+        if webhook_url is not None:
+            await check_webhook_url(webhook_url, self.webhook_allowed_hosts)
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "kind": kind,
+            "params": json.dumps(params),
+            "student_id": student_id,
+            "priority": PRIORITIES[priority],
+            "status": "queued",
+            "webhook_url": webhook_url,
+            "result": None,
+            "error": None,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+        }
+        await asyncio.to_thread(
+            self._execute, f"INSERT INTO jobs ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+            [job[column] for column in COLUMNS],
+        )
+        self._push(job["job_id"], student_id, job["priority"])
+        return self._public(job)
+
+    async def get(self, job_id: str, wait: float = 0.0) -> Dict | None:
+        """The job's state; with wait > 0, blocks up to that long for an unfinished job to finish."""
+        job = await self._load(job_id)
+        deadline = time.monotonic() + wait
+        while job is not None and job["status"] not in FINISHED and time.monotonic() < deadline:
+            # Jobs finished here set the event; re-reading every second catches those another process ran.
+            finished = self._finished.setdefault(job_id, asyncio.Event())
+            try:
+                await asyncio.wait_for(finished.wait(), min(1.0, deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                pass
+            job = await self._load(job_id)
+        if job is not None and job["status"] in FINISHED:
+            self._finished.pop(job_id, None)
+        return self._public(job) if job is not None else None
+
+    async def cancel(self, job_id: str) -> Dict | None:
+        """Cancels a queued or running job; finished jobs are returned unchanged."""
+        job = await self._load(job_id)
+        if job is None or job["status"] in FINISHED:
+            return self._public(job) if job is not None else None
+        self._discard_pending(job_id, job["student_id"], job["priority"])
+        running = self._running.get(job_id)
+        if running is not None:
+            running.cancel()
+        await self._finish(job, "cancelled")
+        return self._public(job)
+
+    async def _load(self, job_id: str) -> Dict | None:
+        rows = await asyncio.to_thread(
+            self._query, f"SELECT {', '.join(COLUMNS)} FROM jobs WHERE job_id = ?", (job_id,)
+        )
+        return dict(zip(COLUMNS, rows[0])) if rows else None
+
+    async def _claim(self, job_id: str) -> Dict | None:
+        """Marks a queued job running; None if it was cancelled (or claimed elsewhere) meanwhile."""
+        claimed = await asyncio.to_thread(
+            self._execute,
+            "UPDATE jobs SET status = 'running', started_at = ?, lease_expires = ? "
+            "WHERE job_id = ? AND status = 'queued'",
+            (time.time(), time.time() + self.lease, job_id),
+        )
+        return await self._load(job_id) if claimed.rowcount else None
+
+    async def _finish(self, job: Dict, status: str, result: Dict | None = None, error: str | None = None):
+        job.update(status=status, result=json.dumps(result) if result is not None else None, error=error,
+                   finished_at=time.time())
+        await asyncio.to_thread(
+            self._execute,
+            "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? "
+            "WHERE job_id = ? AND status IN ('queued', 'running')",
+            (status, job["result"], error, job["finished_at"], job["job_id"]),
+        )
+        finished = self._finished.pop(job["job_id"], None)
+        if finished is not None:
+            finished.set()
+        if job["webhook_url"]:
+            delivery = asyncio.create_task(self._deliver(job["webhook_url"], self._public(job)))
+            self._deliveries.add(delivery)
+            delivery.add_done_callback(self._deliveries.discard)
+        if (self.completed + self.failed) % 256 == 0:
+            await asyncio.to_thread(self._prune, job["finished_at"])
+
+    async def _work(self, runner: Runner):
+        while not self._stopping:
+            job_id = self._pop()
+            if job_id is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            job = await self._claim(job_id)
+            if job is None:
+                continue
+            task = asyncio.create_task(runner(self._public(job)))
+            self._running[job_id] = task
+            try:
+                result = await asyncio.shield(task)
+            except asyncio.CancelledError:
+                if not task.cancelled():
+                    # The worker itself is being cancelled: stop() requeues the job.
+                    task.cancel()
+                    raise
+                continue
+            except Exception as e:
+                self.failed += 1
+                await self._finish(job, "failed", error=f"{type(e).__name__}: {e}")
+            else:
+                self.completed += 1
+                await self._finish(job, "done", result=result)
+            finally:
+                self._running.pop(job_id, None)
+
+    async def _deliver(self, url: str, payload: Dict):
+        """POSTs the finished job to its webhook, retrying with backoff; delivery is best effort."""
+        try:
+            # Checked again: the host may resolve differently now than at submit time.
+            await check_webhook_url(url, self.webhook_allowed_hosts)
+        except UnsafeWebhookError as e:
+            logger.warning("Not delivering job %s to its webhook: %s", payload["job_id"], e)
+            return
+        async with httpx.AsyncClient(timeout=self.webhook_timeout, follow_redirects=False) as client:
+            for attempt in range(self.webhook_attempts):
+                try:
+                    response = await client.post(url, json=payload)
+                    if response.status_code < 500:
+                        return
+                except httpx.HTTPError:
+                    pass
+                await asyncio.sleep(2 ** attempt)
+
+    @staticmethod
+    def _public(job: Dict) -> Dict:
+        status = {
+            "job_id": job["job_id"],
+            "type": job["kind"],
+            "status": job["status"],
+            "priority": next(name for name, value in PRIORITIES.items() if value == job["priority"]),
+            "student_id": job["student_id"],
+            "params": json.loads(job["params"]),
+            "created_at": job["created_at"],
+            "started_at": job["started_at"],
+            "finished_at": job["finished_at"],
+        }
+        if job["result"] is not None:
+            status["result"] = json.loads(job["result"])
+        if job["error"] is not None:
+            status["error"] = job["error"]
+        return status
+
+    def depth(self) -> Dict[str, int]:
+        """Queued jobs per priority name."""
+        return {name: sum(len(queue) for queue in self._pending[value].values()) for name, value in PRIORITIES.items()}
+
+    def stats(self) -> Dict:
+        return {
+            "workers": self.workers,
+            "queued": self.depth(),
+            "running": len(self._running),
+            "students_waiting": len(self._pending_by_student),
+            "completed": self.completed,
+            "failed": self.failed,
+        }
@@ -0,0 +1,210 @@
+"""LLM backends behind EduMentorChatbot.
+
+LLMBackend is the small interface the chatbot needs: a buffered
+completion, a streamed completion and a credentials/health check.
+GroqBackend wraps the Groq async client. StubBackend answers locally with
+deterministic text after a simulated latency, streams at a configurable
+token rate and can inject the same error types the Groq SDK raises, so the
+retry, breaker and error-reply paths behave exactly as they do in
+production. Use it for load tests and CI benchmarks that must not touch the
+network.
+"""
+import asyncio
+import hashlib
+import json
+import math
+import random
+from typing import AsyncIterator, Dict, List, Tuple
+
+import httpx
+from groq import APITimeoutError, AsyncGroq, InternalServerError, RateLimitError
+
+Message = Dict[str, str]
+StreamItem = Tuple[str | None, "Usage | None"]
+
+
+class Usage:
+    """Token usage of one completion; mirrors the fields of Groq's usage object."""
+    __slots__ = ("prompt_tokens", "completion_tokens", "total_tokens")
+
+    def __init__(self, prompt_tokens: int, completion_tokens: int):
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.total_tokens = prompt_tokens + completion_tokens
+
+
+class Completion:
+    __slots__ = ("text", "usage")
+
+    def __init__(self, text: str, usage: Usage | None):
+        self.text = text
+        self.usage = usage
+
+
+class LLMBackend:
+    """Interface for chat-completion providers."""
+    name = "base"
+
+    async def complete(self, model: str, messages: List[Message], temperature: float, max_tokens: int) -> Completion:
+        raise NotImplementedError
+
+    async def open_stream(self, model: str, messages: List[Message], temperature: float,
+                          max_tokens: int) -> AsyncIterator[StreamItem]:
+        """Opens a streamed completion and returns an iterator of (token, usage) pairs.
+
+        Errors raised while opening the stream surface here, so callers can retry this call alone.
+        Closing the iterator (aclose) aborts the request.
+        """
+        raise NotImplementedError
+
+    async def validate(self):
+        """Raises if the backend cannot serve requests (e.g. an invalid API key)."""
+
+
+class GroqBackend(LLMBackend):
+    name = "groq"
+
+    def __init__(self, client: AsyncGroq):
+        self.client = client
+
+    async def complete(self, model: str, messages: List[Message], temperature: float, max_tokens: int) -> Completion:
+        response = await self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens
+        )
+        usage = response.usage
+        return Completion(
+            response.choices[0].message.content,
+            Usage(usage.prompt_tokens or 0, usage.completion_tokens or 0) if usage else None,
+        )
+
+    async def open_stream(self, model: str, messages: List[Message], temperature: float,
+                          max_tokens: int) -> AsyncIterator[StreamItem]:
+        stream = await self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True
+        )
+        return self._iterate(stream)
+
+    @staticmethod
+    async def _iterate(stream) -> AsyncIterator[StreamItem]:
+        try:
+            async for chunk in stream:
+                token = chunk.choices[0].delta.content if chunk.choices else None
+                # Groq reports usage on the final chunk under x_groq.
+                usage = chunk.x_groq.usage if chunk.x_groq else chunk.usage
+                yield token, Usage(usage.prompt_tokens or 0, usage.completion_tokens or 0) if usage else None
+        finally:
+            await stream.close()
+
+    async def validate(self):
+        await self.client.models.list()
+
+
+def parse_latency(spec: str) -> Tuple[str, Tuple[float, ...]]:
+    """Parses "fixed:0.2", "uniform:0.1:0.5", "normal:0.3:0.05", "lognormal:0.3:0.5" (median, sigma) or "exponential:0.3"."""
+    kind, *params = spec.split(":")
+    arity = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2, "exponential": 1}
+    if kind not in arity or len(params) != arity[kind]:
+        raise ValueError(f"invalid latency spec {spec!r}")
+    return kind, tuple(float(param) for param in params)
+
+
+class StubBackend(LLMBackend):
+    """Offline backend with seeded latency, token-rate and error simulation."""
+    name = "stub"
+    STUB_WORDS = ("Let", "us", "work", "through", "this", "step", "by", "step", "and", "check", "each", "idea", "with",
+                  "a", "short", "example", "before", "moving", "on", "to", "practice.")
+
+    def __init__(self, latency: str = "fixed:0.2", tokens_per_second: float = 200.0, completion_tokens: int = 120,
+                 rate_429: float = 0.0, rate_5xx: float = 0.0, rate_timeout: float = 0.0, seed: int = 0):
+        self.latency = parse_latency(latency)
+        self.tokens_per_second = tokens_per_second
+        self.completion_tokens = completion_tokens
+        self.rates = {"429": rate_429, "5xx": rate_5xx, "timeout": rate_timeout}
+        self.random = random.Random(seed)
+        self.completions = 0
+        self.injected = {"429": 0, "5xx": 0, "timeout": 0}
+
+    def _first_token_delay(self) -> float:
+        kind, params = self.latency
+        if kind == "fixed":
+            return params[0]
+        if kind == "uniform":
+            return self.random.uniform(*params)
+        if kind == "normal":
+            return max(0.0, self.random.gauss(*params))
+        if kind == "lognormal":
+            return self.random.lognormvariate(math.log(params[0]), params[1])
+        return self.random.expovariate(1 / params[0])
+
+    def _maybe_fail(self):
+        """Raises the Groq SDK error for an injected fault, so resilience code sees real error types."""
+        request = httpx.Request("POST", "http://stub.local/openai/v1/chat/completions")
+        roll = self.random.random()
+        for fault, rate in self.rates.items():
+            if roll < rate:
+                self.injected[fault] += 1
+                if fault == "timeout":
+                    raise APITimeoutError(request=request)
+                status = 429 if fault == "429" else 503
+                error = RateLimitError if fault == "429" else InternalServerError
+                raise error(f"stub {fault}", response=httpx.Response(status, request=request), body=None)
+            roll -= rate
+
+    def _reply(self, messages: List[Message], max_tokens: int) -> List[str]:
+        """Deterministic reply for a prompt: the same messages always produce the same words."""
+        digest = hashlib.sha256(messages[-1]["content"].encode("utf-8")).digest()
+        if '"questions"' in messages[-1]["content"]:
+            return self._structured_test(digest)
+        words = self.STUB_WORDS
+        count = min(max_tokens, self.completion_tokens)
+        return [words[(digest[i % len(digest)] + i) % len(words)] + " " for i in range(count)]
+
+    def _structured_test(self, digest: bytes, questions: int = 5) -> List[str]:
+        """A well-formed JSON practice test, for prompts that ask for one, split into word tokens."""
+        words = self.STUB_WORDS
+        test = {"questions": [
+            {
+                "topic": f"{words[digest[i] % len(words)]} {words[digest[i + 1] % len(words)]}".rstrip("."),
+                "question": f"Which statement about step {i + 1} is correct?",
+                "options": [f"Option {letter} for step {i + 1}" for letter in "ABCD"],
+                "answer": "ABCD"[digest[i] % 4],
+                "explanation": "Check each idea with a short example before moving on.",
+            }
+            for i in range(questions)
+        ]}
+        return [word + " " for word in json.dumps(test).split(" ")]
+
+    @staticmethod
+    def _prompt_tokens(messages: List[Message]) -> int:
+        return sum(len(message["content"]) for message in messages) // 4
+
+    async def complete(self, model: str, messages: List[Message], temperature: float, max_tokens: int) -> Completion:
+        self._maybe_fail()
+        words = self._reply(messages, max_tokens)
+        await asyncio.sleep(self._first_token_delay() + len(words) / self.tokens_per_second)
+        self.completions += 1
+        return Completion("".join(words).strip(), Usage(self._prompt_tokens(messages), len(words)))
+
+    async def open_stream(self, model: str, messages: List[Message], temperature: float,
+                          max_tokens: int) -> AsyncIterator[StreamItem]:
+        self._maybe_fail()
+        await asyncio.sleep(self._first_token_delay())
+        self.completions += 1
+        return self._iterate(self._reply(messages, max_tokens), self._prompt_tokens(messages))
+
+    async def _iterate(self, words: List[str], prompt_tokens: int) -> AsyncIterator[StreamItem]:
+        interval = 1 / self.tokens_per_second
+        for word in words:
+            yield word, None
+            await asyncio.sleep(interval)
+        yield None, Usage(prompt_tokens, len(words))
+
+    def stats(self) -> Dict:
+        return {"completions": self.completions, "injected": dict(self.injected)}
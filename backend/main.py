@@ -1,19 +1,42 @@
 import os
 import json
 import random
-from typing import Dict, List
-from fastapi import FastAPI, HTTPException, Request
+import asyncio
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+from contextvars import ContextVar
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from pydantic import BaseModel, validator
+from starlette.formparsers import MultiPartException
+from pydantic import BaseModel, ValidationError, validator
 from dotenv import load_dotenv
-from groq import Groq, APIConnectionError, AuthenticationError, RateLimitError, APIError
+from groq import AsyncGroq, APIConnectionError, AuthenticationError, RateLimitError, APIError
 import uvicorn
 from pydantic import BaseModel
 
-from fastapi import File, UploadFile
+from cache import ResponseCache, template_hash
+from ingest import (
+    CHARS_PER_TOKEN, UnsupportedDocumentError, UploadTooLargeError, document_kind, form_file, iter_text_blocks,
+    read_upload_form, split_chunks,
+)
+from intent import INTENTS, LocalIntentClassifier
+from jobs import PRIORITIES, JobQueue, JobQueueFullError, UnsafeWebhookError
+from llm import Completion, GroqBackend, LLMBackend, StubBackend
+from progress import ProgressStore, RedisProgressStore, SQLiteProgressStore
+from quiz import InvalidTestError, grade, parse_test, public_test, weak_areas
+from observability import REGISTRY, TRACE_ID, configure_logging, new_trace_id
+from retrieval import RetrievalIndex, format_passages
+from resilience import CircuitBreaker, CircuitOpenError, LocalRateLimitError, RateLimiter, UpstreamGuard, is_transient
+from semantic_cache import SemanticAnswerCache
+from sessions import SessionManager, StudentSession
+from shared_state import RedisSharedState, SharedState, open_shared_state
+from singleflight import SingleFlight, StreamGroup
 
 
 
@@ -21,11 +44,34 @@ from fastapi import File, UploadFile
 # Load environment variables
 load_dotenv()
 
+logger = configure_logging(os.getenv("LOG_LEVEL", "INFO"))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Validates the API key at startup (bounded by a timeout) and keeps re-validating in the background."""
+    await validate_api_key()
+    revalidation = asyncio.create_task(revalidate_api_key_forever())
+    await get_job_queue().start(run_queued_job)
+    warmup = asyncio.create_task(warm_catalogue_forever())
+    yield
+    revalidation.cancel()
+    warmup.cancel()
+    # In-flight requests have already finished (uvicorn waits for them); let background generations finish too.
+    await get_job_queue().stop(drain=DRAIN_TIMEOUT)
+    if _assistant is not None:
+        summaries = _assistant.sessions.summary_tasks()
+        if summaries:
+            await asyncio.wait(summaries, timeout=DRAIN_TIMEOUT)
+        await _assistant.progress.close()
+    if _shared_state is not None:
+        await _shared_state.close()
+
 # FastAPI App Initialization
 app = FastAPI(
     title="AI-Powered Learning Assistant for Students",
     description="An AI-driven web app to automate study materials, generate courses, and teach students through AI-powered explanations, videos, and study notes.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Mount static files
@@ -92,29 +138,7 @@ async def get_online_resources():
     }
 
 
-@app.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
-    return {"message": f"Received file: {file.filename}"}
-
-
-
-
-class SyllabusRequest(BaseModel):
-    subject: str
-
-@app.post("/syllabus")
-async def get_syllabus(data: SyllabusRequest):
-    return {"syllabus": f"Syllabus for {data.subject}"}
-
-@app.post("/syllabus")
-async def debug_syllabus(request: dict):
-    return {"received": request}
-
 
-@app.post("/syllabus")
-async def generate_syllabus(request: SyllabusRequest):
-    # Generate syllabus (using AI / Groq)
-    return {"syllabus": f"Syllabus for {request.subject}, Grade {request.grade}"}
 
 
 
@@ -130,12 +154,52 @@ app.add_middleware(
     expose_headers=["*"],
 )
 
+class ObservabilityMiddleware:
+    """Plain ASGI middleware: assigns a trace ID and records per-route latency without buffering the response."""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        trace_id = next((value.decode("latin-1") for name, value in scope["headers"] if name == b"x-trace-id"), None)
+        trace_id = trace_id or new_trace_id()
+        token = TRACE_ID.set(trace_id)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_trace(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = [*message.get("headers", []), (b"x-trace-id", trace_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_trace)
+        finally:
+            # Label by route template, not raw path, to keep metric cardinality bounded.
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_LATENCY.observe(time.perf_counter() - started, scope["method"], route, str(status))
+            TRACE_ID.reset(token)
+
+app.add_middleware(ObservabilityMiddleware)
+
 # Pydantic Models
 class ChatPayload(BaseModel):
     message: str
+    session_id: str | None = None
+    course_id: str | None = None
+
+    @validator('course_id')
+    def course_id_must_be_valid(cls, v):
+        if v is not None and not RetrievalIndex.valid_course_id(v):
+            raise ValueError("Course IDs may only contain letters, digits, '-' and '_'")
+        return v
 
 class ChatResponse(BaseModel):
     reply: str
+    session_id: str | None = None
 
 class SyllabusPayload(BaseModel):
     subject: str
@@ -167,12 +231,201 @@ class TestPayload(BaseModel):
             raise ValueError('Subject must be math or science for tests')
         return v.lower()
 
+class TestSubmission(BaseModel):
+    answers: List[str | None]
+    student_id: str | None = None
+
+    @validator('answers', each_item=True)
+    def answer_must_be_option(cls, v):
+        if v is not None and v.strip().upper() not in ['A', 'B', 'C', 'D']:
+            raise ValueError('Each answer must be A, B, C, D, or null')
+        return v
+
 class VideoPayload(BaseModel):
     topic: str
     student_id: str | None = None
 
+class BatchJob(BaseModel):
+    type: str
+    topic: str | None = None
+    subject: str | None = None
+    level: str | None = None
+    student_id: str | None = None
+
+    @validator('type')
+    def type_must_exist(cls, v):
+        if v.lower() not in ['notes', 'syllabus', 'test', 'video']:
+            raise ValueError('Job type must be notes, syllabus, test, or video')
+        return v.lower()
+
+class BatchPayload(BaseModel):
+    jobs: List[BatchJob]
+    max_concurrency: int | None = None
+
+    @validator('jobs')
+    def jobs_must_fit(cls, v):
+        if not v:
+            raise ValueError('Provide at least one job')
+        if len(v) > BATCH_MAX_JOBS:
+            raise ValueError(f'A batch can contain at most {BATCH_MAX_JOBS} jobs')
+        return v
+
+class JobPayload(BatchJob):
+    priority: str = "normal"
+    webhook_url: str | None = None
+
+    @validator('priority')
+    def priority_must_exist(cls, v):
+        if v.lower() not in PRIORITIES:
+            raise ValueError('Priority must be high, normal, or low')
+        return v.lower()
+
+    @validator('webhook_url')
+    def webhook_must_be_http(cls, v):
+        # Only the scheme is checked here; JobQueue.submit refuses private and loopback targets.
+        if v is not None and not v.startswith(("http://", "https://")):
+            raise ValueError('Webhook URL must be http or https')
+        return v
+
 # Resource Database
-LLM_MODEL = "llama3-70b-8192"
+LLM_MODEL = os.getenv("LLM_MODEL", "llama3-70b-8192")
+# Smaller model for short answers, and the fallback when the large one is rate-limited, failing or slow.
+LLM_FAST_MODEL = os.getenv("LLM_FAST_MODEL", "llama3-8b-8192")
+# A primary call that has a fallback is abandoned after this many seconds (time to first token when streaming).
+# Buffered calls also get max_tokens / LLM_FALLBACK_TOKENS_PER_SECOND on top, so long generations are not cut
+# short; a route can set its own "fallback_after" instead.
+LLM_FALLBACK_AFTER = float(os.getenv("LLM_FALLBACK_AFTER", "8"))
+LLM_FALLBACK_TOKENS_PER_SECOND = float(os.getenv("LLM_FALLBACK_TOKENS_PER_SECOND", "100"))
+# "groq" for the real API, "stub" for the offline simulator used by load tests and CI benchmarks.
+LLM_BACKEND = os.getenv("LLM_BACKEND", "groq")
+LLM_STUB_LATENCY = os.getenv("LLM_STUB_LATENCY", "lognormal:0.3:0.4")
+LLM_STUB_TOKENS_PER_SECOND = float(os.getenv("LLM_STUB_TOKENS_PER_SECOND", "250"))
+LLM_STUB_COMPLETION_TOKENS = int(os.getenv("LLM_STUB_COMPLETION_TOKENS", "120"))
+LLM_STUB_ERROR_RATE_429 = float(os.getenv("LLM_STUB_ERROR_RATE_429", "0"))
+LLM_STUB_ERROR_RATE_5XX = float(os.getenv("LLM_STUB_ERROR_RATE_5XX", "0"))
+LLM_STUB_ERROR_RATE_TIMEOUT = float(os.getenv("LLM_STUB_ERROR_RATE_TIMEOUT", "0"))
+LLM_STUB_SEED = int(os.getenv("LLM_STUB_SEED", "0"))
+# Upper bound on concurrent upstream completions per worker.
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+# Below this confidence the local intent classifier defers to the LLM. Calibrated with benchmarks/bench_intent.py.
+INTENT_CONFIDENCE_THRESHOLD = float(os.getenv("INTENT_CONFIDENCE_THRESHOLD", "0.7"))
+# Response cache limits; RESPONSE_CACHE_DB enables the persistent SQLite tier.
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "2048"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", str(7 * 24 * 3600)))
+RESPONSE_CACHE_DB = os.getenv("RESPONSE_CACHE_DB")
+# Catalogue warm-up: pre-generate syllabi, notes and tests for load_resources() at startup and then every
+# CATALOGUE_WARMUP_INTERVAL seconds (0 disables the schedule), at most CATALOGUE_WARMUP_CONCURRENCY at a time.
+# On by default for a single worker or a persistent/shared cache tier. Off for several workers with memory-only
+# caches, where each worker would warm its own copy of the catalogue and spend upstream quota on duplicates.
+_CATALOGUE_WARMUP_DEFAULT = bool(
+    RESPONSE_CACHE_DB or os.getenv("SHARED_STATE_URL") or int(os.getenv("WEB_CONCURRENCY", "1")) <= 1
+)
+CATALOGUE_WARMUP_ON_STARTUP = os.getenv("CATALOGUE_WARMUP_ON_STARTUP", "1" if _CATALOGUE_WARMUP_DEFAULT else "0") == "1"
+CATALOGUE_WARMUP_INTERVAL = float(os.getenv("CATALOGUE_WARMUP_INTERVAL", str(6 * 3600) if _CATALOGUE_WARMUP_DEFAULT else "0"))
+CATALOGUE_WARMUP_CONCURRENCY = int(os.getenv("CATALOGUE_WARMUP_CONCURRENCY", "2"))
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+# Near-duplicate answers are reused only for these intents, and only for the first question of a session.
+SEMANTIC_CACHE_INTENTS = {i.strip() for i in os.getenv("SEMANTIC_CACHE_INTENTS", "DOUBT_SOLVING,EXPLANATION").split(",") if i.strip()}
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.85"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "2000"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", str(24 * 3600)))
+
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(25 * 1024 * 1024)))
+UPLOAD_CHUNK_TOKENS = int(os.getenv("UPLOAD_CHUNK_TOKENS", "1500"))
+UPLOAD_MAX_CHUNKS = int(os.getenv("UPLOAD_MAX_CHUNKS", "40"))
+UPLOAD_MAX_CONCURRENCY = int(os.getenv("UPLOAD_MAX_CONCURRENCY", "4"))
+
+RETRIEVAL_DIR = os.getenv("RETRIEVAL_DIR", "course_index")
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "4"))
+RETRIEVAL_PASSAGE_TOKENS = int(os.getenv("RETRIEVAL_PASSAGE_TOKENS", "200"))
+# Teacher batch limits: jobs per request and concurrent generations per batch.
+BATCH_MAX_JOBS = int(os.getenv("BATCH_MAX_JOBS", "200"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+# Background jobs: queue database, worker pool size, per-student pending cap, result retention and long-poll cap.
+JOBS_DB = os.getenv("JOBS_DB", "edumentor_jobs.db")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_MAX_PENDING_PER_STUDENT = int(os.getenv("JOB_MAX_PENDING_PER_STUDENT", "20"))
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", "86400"))
+JOB_MAX_WAIT = float(os.getenv("JOB_MAX_WAIT", "30"))
+# Comma-separated hosts job webhooks may call. Unset: any host that resolves only to public addresses.
+JOB_WEBHOOK_ALLOWED_HOSTS = [h.strip() for h in os.getenv("JOB_WEBHOOK_ALLOWED_HOSTS", "").split(",") if h.strip()]
+# A running job whose process stops renewing its lease for this long is handed to another worker.
+JOB_LEASE = float(os.getenv("JOB_LEASE", "30"))
+
+# Unset: one process keeps sessions and cached responses in memory. Set (sqlite:///path or redis://host:port/db)
+# when running several workers, so they all see the same sessions, cache and leases. With redis://, student
+# progress and served tests live there too instead of PROGRESS_DB. See serve.py.
+SHARED_STATE_URL = os.getenv("SHARED_STATE_URL")
+WORKER_ID = os.getenv("WORKER_ID") or f"{os.uname().nodename}:{os.getpid()}"
+# With several workers, each trusts its in-memory copy of a cached response for at most this long before
+# re-reading the shared tier, so DELETE /admin/cache on one worker reaches the others within this time.
+RESPONSE_CACHE_MEMORY_TTL = float(os.getenv(
+    "RESPONSE_CACHE_MEMORY_TTL", "30" if SHARED_STATE_URL or int(os.getenv("WEB_CONCURRENCY", "1")) > 1 else "0"
+))
+# Seconds shutdown waits for queued-job generations and history summaries before giving up on them.
+DRAIN_TIMEOUT = float(os.getenv("DRAIN_TIMEOUT", "20"))
+# Upstream resilience: local quota, retry policy and circuit breaker.
+GROQ_REQUESTS_PER_MINUTE = float(os.getenv("GROQ_REQUESTS_PER_MINUTE", "30"))
+GROQ_TOKENS_PER_MINUTE = float(os.getenv("GROQ_TOKENS_PER_MINUTE", "6000"))
+# The Groq quota belongs to the API key, so every worker gets an equal share of it.
+# Defaults to this host's worker count; set it to the total across hosts in a multi-node deployment.
+GROQ_QUOTA_WORKERS = max(1, int(os.getenv("GROQ_QUOTA_WORKERS", os.getenv("WEB_CONCURRENCY", "1"))))
+RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", "10"))
+UPSTREAM_MAX_RETRIES = int(os.getenv("UPSTREAM_MAX_RETRIES", "3"))
+UPSTREAM_BACKOFF_BASE = float(os.getenv("UPSTREAM_BACKOFF_BASE", "0.5"))
+UPSTREAM_BACKOFF_MAX = float(os.getenv("UPSTREAM_BACKOFF_MAX", "8"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", "30"))
+# Student progress persistence without a redis:// SHARED_STATE_URL; PROGRESS_WRITE_MODE is "sync" (group commit)
+# or "write_behind".
+PROGRESS_DB = os.getenv("PROGRESS_DB", "edumentor_progress.db")
+PROGRESS_WRITE_MODE = os.getenv("PROGRESS_WRITE_MODE", "sync")
+PROGRESS_FLUSH_INTERVAL = float(os.getenv("PROGRESS_FLUSH_INTERVAL", "0.05"))
+# Per-session chat state limits; together they cap the memory held for chat history.
+SESSION_MAX_COUNT = int(os.getenv("SESSION_MAX_COUNT", "10000"))
+SESSION_IDLE_TIMEOUT = float(os.getenv("SESSION_IDLE_TIMEOUT", "1800"))
+SESSION_HISTORY_MESSAGES = int(os.getenv("SESSION_HISTORY_MESSAGES", "16"))
+SESSION_MAX_MESSAGE_CHARS = int(os.getenv("SESSION_MAX_MESSAGE_CHARS", "4000"))
+# Prompt budget for the summary plus recent turns; older turns are folded into the summary in the background.
+SESSION_HISTORY_TOKENS = int(os.getenv("SESSION_HISTORY_TOKENS", "1500"))
+SESSION_SUMMARY_MIN_TOKENS = int(os.getenv("SESSION_SUMMARY_MIN_TOKENS", "300"))
+SESSION_SUMMARY_MAX_TOKENS = int(os.getenv("SESSION_SUMMARY_MAX_TOKENS", "250"))
+
+# Model profile per route: an endpoint/generation method, "chat:<INTENT>", or an internal call.
+# "chat:<INTENT>" falls back to "chat", anything else unknown to "default".
+MODEL_ROUTES = {
+    "default": {"model": LLM_MODEL, "temperature": 0.4, "max_tokens": 1000, "fallback": LLM_FAST_MODEL},
+    "intent": {"model": LLM_FAST_MODEL, "temperature": 0.0, "max_tokens": 20},
+    "summary": {"model": LLM_FAST_MODEL, "temperature": 0.2, "max_tokens": SESSION_SUMMARY_MAX_TOKENS},
+    "chat": {"model": LLM_MODEL, "temperature": 0.4, "max_tokens": 1000, "fallback": LLM_FAST_MODEL},
+    "chat:MOTIVATION": {"model": LLM_FAST_MODEL, "temperature": 0.7, "max_tokens": 150},
+    "chat:VIDEO": {"model": LLM_FAST_MODEL, "temperature": 0.4, "max_tokens": 400},
+    "chat:DEFAULT": {"model": LLM_FAST_MODEL, "temperature": 0.4, "max_tokens": 400, "fallback": LLM_MODEL},
+    "syllabus": {"model": LLM_MODEL, "temperature": 0.4, "max_tokens": 1500, "fallback": LLM_FAST_MODEL},
+    "video": {"model": LLM_FAST_MODEL, "temperature": 0.5, "max_tokens": 600, "fallback": LLM_MODEL},
+    "notes": {"model": LLM_MODEL, "temperature": 0.4, "max_tokens": 1200, "fallback": LLM_FAST_MODEL},
+    "test": {"model": LLM_MODEL, "temperature": 0.4, "max_tokens": 1200, "fallback": LLM_FAST_MODEL},
+    "document_notes": {"model": LLM_MODEL, "temperature": 0.3, "max_tokens": 800, "fallback": LLM_FAST_MODEL},
+    "document_test": {"model": LLM_MODEL, "temperature": 0.3, "max_tokens": 800, "fallback": LLM_FAST_MODEL},
+}
+# JSON overrides merged per route, e.g. {"chat:EXPLANATION": {"model": "llama3-8b-8192"}}.
+for _route, _override in json.loads(os.getenv("LLM_ROUTES", "{}")).items():
+    MODEL_ROUTES[_route] = {**MODEL_ROUTES.get(_route, MODEL_ROUTES["default"]), **_override}
+
+# USD per million (prompt, completion) tokens, for the per-route cost counter.
+MODEL_PRICES = {
+    "llama3-70b-8192": (0.59, 0.79),
+    "llama3-8b-8192": (0.05, 0.08),
+}
+
+def model_route(route: str) -> Dict:
+    """The profile for route, resolving "chat:<INTENT>" to "chat" and unknown routes to "default"."""
+    return MODEL_ROUTES.get(route) or MODEL_ROUTES.get(route.split(":", 1)[0]) or MODEL_ROUTES["default"]
+
+def fallback_after(profile: Dict) -> float:
+    """Seconds a buffered primary call may take, including the local quota wait, before the fallback takes over."""
+    return profile.get("fallback_after") or LLM_FALLBACK_AFTER + profile["max_tokens"] / LLM_FALLBACK_TOKENS_PER_SECOND
 
 def load_resources():
     """Loads static resources for the learning assistant."""
@@ -206,6 +459,26 @@ def load_resources():
 
 RESOURCES = load_resources()
 
+def catalogue_generations(resources: Dict) -> List[tuple]:
+    """(method, arguments) for every generation the static catalogue offers, normalized as the endpoints normalize them."""
+    generations = [
+        ("syllabus", {"subject": subject, "level": level})
+        for subject, details in resources["subjects"].items() for level in details["levels"]
+    ]
+    # "Mathematics: Algebra, Calculus, Geometry" -> notes on "Algebra", "Calculus" and "Geometry".
+    generations += [
+        ("notes", {"topic": topic.strip()})
+        for details in resources["subjects"].values() for topic in details["content"].split(":", 1)[-1].split(",")
+    ]
+    generations += [("test", {"subject": subject}) for subject in resources["quiz_topics"]]
+    return generations
+
+# XP and badge granted per action
+BADGE_REWARDS = {
+    "quiz_completed": (50, "Beginner Badge"),
+    "test_completed": (100, "Mock Test Ace"),
+}
+
 # Master System Prompts
 MASTER_SYSTEM_PROMPTS = {
     "DEFAULT": {
@@ -293,82 +566,62 @@ MASTER_SYSTEM_PROMPTS = {
     },
 }
 
-# EduMentor Chatbot Class
-class EduMentorChatbot:
-    """The main class for the EduMentor Chatbot, managing state, intent, and responses."""
-    def __init__(self, client: Groq):
-        """Initializes the chatbot's state."""
-        self.client = client
-        self.chat_history: List[Dict] = []
-        self.study_status = "active"
-        self.current_subject = None
-        self.student_progress = {}
-        self.xp = 0
-        self.achievements = []
-
-    def _call_groq_api(self, messages: list, temperature: float = 0.4, max_tokens: int = 1000) -> str:
-        """Helper function to call the Groq API with robust error handling."""
-        try:
-            response = self.client.chat.completions.create(
-                model=LLM_MODEL,
-                messages=messages,
-                temperature=temperature,
-                max_tokens=max_tokens
-            )
-            return response.choices[0].message.content
-        except RateLimitError:
-            return "⚠️ Too many requests. Please try again later."
-        except AuthenticationError:
-            return "⚠️ Invalid API key. Please contact the administrator."
-        except APIError as e:
-            print(f"API Error: {e}")
-            return "⚠️ Technical issue. Please try again."
-        except Exception as e:
-            print(f"Unexpected error: {e}")
-            return "⚠️ An error occurred. Please try again."
-
-    def classify_intent(self, user_input: str) -> str:
-        """Classifies the user's intent."""
-        intents = ["EXPLANATION", "VIDEO", "NOTES", "TEST", "DOUBT_SOLVING", "MOTIVATION", "SYLLABUS", "DEFAULT"]
-        classification_prompt = f"""
-        Analyze the user's message and classify its primary intent into ONE of the following categories: {', '.join(intents)}.
-        User's message: "{user_input}"
-        Classification:
+def _compile_system_prompt(prompt_data: Dict[str, str]) -> str:
+    """Bakes the static persona and rules into a format string with only the per-turn slots left open."""
+    persona = prompt_data["persona"].replace("{", "{{").replace("}", "}}")
+    rules = prompt_data["rules"].replace("{", "{{").replace("}", "}}")
+    contextual_info = """
+        CURRENT CONTEXT:
+        - Study Status: {study_status}
+        - Current Subject: {current_subject}
+        - Resources: {resources}
+        - XP: {xp}
+        - Achievements: {achievements}
         """
-        messages = [{"role": "user", "content": classification_prompt}]
-        response = self._call_groq_api(messages, temperature=0.0, max_tokens=20)
-        intent = response.strip().upper().replace("'", "").replace('"', "")
-        return intent if intent in intents else "DEFAULT"
-
-    def _handle_special_commands(self, user_input: str) -> str | None:
-        """Handles special slash commands."""
-        if user_input.lower().startswith("/subject"):
-            try:
-                self.current_subject = user_input.split(" ", 1)[1].strip().lower()
-                if self.current_subject not in RESOURCES["subjects"]:
-                    return "Invalid subject. Use math, science, history, or languages."
-                return f"Great! Subject set to {self.current_subject}."
-            except IndexError:
-                return "Please provide a subject, e.g., /subject math."
-        return None
+    anti_repetition_rule = "CRITICAL: Do NOT repeat or translate the user's question. Answer directly."
+    return f"{persona}\n{contextual_info}\nRULES:\n{rules}\n{anti_repetition_rule}"
+
+def _compile_resource_context(subject: str | None) -> str:
+    """Serializes only the resources relevant to one subject (or a compact overview when none is set)."""
+    if subject is None:
+        context = {
+            "subjects": list(RESOURCES["subjects"]),
+            "study_tips": RESOURCES["study_tips"],
+            "online_resources": RESOURCES["online_resources"]["general"],
+        }
+    else:
+        context = {
+            "subject": RESOURCES["subjects"][subject],
+            "study_tips": RESOURCES["study_tips"],
+            "online_resources": RESOURCES["online_resources"].get(subject, RESOURCES["online_resources"]["general"]),
+        }
+        if subject in RESOURCES["quiz_topics"]:
+            context["quiz_topics"] = RESOURCES["quiz_topics"][subject]
+    return json.dumps(context, separators=(",", ":"))
+
+# Compiled once at startup; process_message only fills the dynamic slots.
+COMPILED_SYSTEM_PROMPTS = {intent: _compile_system_prompt(data) for intent, data in MASTER_SYSTEM_PROMPTS.items()}
+RESOURCE_CONTEXT = {subject: _compile_resource_context(subject) for subject in [None, *RESOURCES["subjects"]]}
+
+def build_system_prompt(intent: str, session: StudentSession, resources: str | None = None) -> str:
+    """Fills the compiled system prompt for intent with the session's current context.
+
+    resources replaces the static per-subject resource blob, e.g. with passages retrieved from course material.
+    """
+    template = COMPILED_SYSTEM_PROMPTS.get(intent, COMPILED_SYSTEM_PROMPTS["DEFAULT"])
+    return template.format(
+        study_status=session.study_status,
+        current_subject=session.current_subject or "Not Set",
+        resources=resources or RESOURCE_CONTEXT.get(session.current_subject, RESOURCE_CONTEXT[None]),
+        xp=session.xp,
+        achievements=json.dumps(session.achievements),
+    )
 
-    def award_badge(self, action: str, student_id: str | None = None):
-        """Awards badges and XP based on actions."""
-        if action == "quiz_completed":
-            self.xp += 50
-            if "Beginner Badge" not in self.achievements:
-                self.achievements.append("Beginner Badge")
-        elif action == "test_completed":
-            self.xp += 100
-            if "Mock Test Ace" not in self.achievements:
-                self.achievements.append("Mock Test Ace")
-        if student_id:
-            self.student_progress[student_id] = self.student_progress.get(student_id, {})
-            self.student_progress[student_id]["xp"] = self.student_progress.get(student_id, {}).get("xp", 0) + (50 if action == "quiz_completed" else 100)
-
-    def generate_syllabus(self, subject: str, level: str) -> str:
-        """Generates a structured syllabus using LLM."""
-        prompt = f"""
+# Generation Prompt Templates
+GENERATION_PROMPTS = {
+    "syllabus": {
+        "system": "SYLLABUS",
+        "template": """
         Create a comprehensive, university-level syllabus for a course titled "{level} {subject}".
         Follow this structure:
         - Course Description
@@ -377,15 +630,10 @@ class EduMentorChatbot:
         - Suggested Readings
         - Final Assessment
         """
-        messages = [
-            {"role": "system", "content": MASTER_SYSTEM_PROMPTS["SYLLABUS"]["persona"] + "\n" + MASTER_SYSTEM_PROMPTS["SYLLABUS"]["rules"]},
-            {"role": "user", "content": prompt}
-        ]
-        return self._call_groq_api(messages)
-
-    def generate_video_description(self, topic: str) -> str:
-        """Generates a video lesson description using LLM."""
-        prompt = f"""
+    },
+    "video": {
+        "system": "VIDEO",
+        "template": """
         Describe an animated video lesson for the topic "{topic}".
         Include:
         - A brief introduction to the topic
@@ -394,15 +642,10 @@ class EduMentorChatbot:
         - A closing summary
         Keep it concise and engaging.
         """
-        messages = [
-            {"role": "system", "content": MASTER_SYSTEM_PROMPTS["VIDEO"]["persona"] + "\n" + MASTER_SYSTEM_PROMPTS["VIDEO"]["rules"]},
-            {"role": "user", "content": prompt}
-        ]
-        return self._call_groq_api(messages)
-
-    def generate_notes(self, topic: str) -> str:
-        """Generates detailed study notes using LLM."""
-        prompt = f"""
+    },
+    "notes": {
+        "system": "NOTES",
+        "template": """
         Generate detailed study notes for the topic "{topic}".
         Structure the notes as follows:
         - Introduction: Brief overview of the topic
@@ -410,164 +653,1398 @@ class EduMentorChatbot:
         - Summary: Concise recap of main points
         - Formulas/Shortcuts: Include if applicable
         """
-        messages = [
-            {"role": "system", "content": MASTER_SYSTEM_PROMPTS["NOTES"]["persona"] + "\n" + MASTER_SYSTEM_PROMPTS["NOTES"]["rules"]},
-            {"role": "user", "content": prompt}
-        ]
-        return self._call_groq_api(messages)
-
-    def generate_test(self, subject: str, student_id: str | None = None) -> str:
-        """Generates practice test with MCQs using LLM."""
-        prompt = f"""
+    },
+    "test": {
+        "system": "TEST",
+        "template": """
         Generate a practice test for {subject} with 5 multiple-choice questions.
+        Respond with only a JSON object, no other text, in exactly this form:
+        {{"questions": [{{"topic": "...", "question": "...", "options": ["...", "...", "...", "..."], "answer": "A", "explanation": "..."}}]}}
+        For each question:
+        - "topic": the short name of the sub-topic it tests (e.g. "linear equations")
+        - "options": exactly four answer options, in order A, B, C, D
+        - "answer": the letter of the correct option
+        - "explanation": a brief explanation of the correct answer
+        """
+    },
+    "document_notes": {
+        "system": "NOTES",
+        "template": """
+        Generate study notes for the following excerpt from a student's uploaded material.
+        Structure the notes as follows:
+        - Key Concepts: Explanation of the ideas in the excerpt
+        - Summary: Concise recap of main points
+        - Formulas/Shortcuts: Include if the excerpt has any
+
+        Excerpt:
+        {text}
+        """
+    },
+    "document_test": {
+        "system": "TEST",
+        "template": """
+        Generate a practice test with 3 multiple-choice questions on the following excerpt from a student's uploaded material.
         For each question, provide:
         - The question
         - Four answer options (A, B, C, D)
         - The correct answer
         - A brief explanation of the correct answer
-        Suggest one weak area for improvement based on the subject.
+
+        Excerpt:
+        {text}
         """
-        messages = [
-            {"role": "system", "content": MASTER_SYSTEM_PROMPTS["TEST"]["persona"] + "\n" + MASTER_SYSTEM_PROMPTS["TEST"]["rules"]},
-            {"role": "user", "content": prompt}
+    },
+}
+
+# A cached response is only valid for the exact prompt text that produced it.
+GENERATION_TEMPLATE_HASHES = {
+    method: template_hash(
+        generation["template"],
+        MASTER_SYSTEM_PROMPTS[generation["system"]]["persona"],
+        MASTER_SYSTEM_PROMPTS[generation["system"]]["rules"],
+    )
+    for method, generation in GENERATION_PROMPTS.items()
+}
+
+TEST_QUESTIONS = 5
+# Topics a student answers correctly less often than this (over all their attempts) are reported as weak areas.
+WEAK_AREA_THRESHOLD = float(os.getenv("WEAK_AREA_THRESHOLD", "0.6"))
+# Compiled tests kept in memory for grading; the progress store holds every test ever served.
+TEST_MEMORY_ENTRIES = int(os.getenv("TEST_MEMORY_ENTRIES", "4096"))
+
+def _canonical_test(reply: str, arguments: Dict) -> str:
+    return json.dumps(parse_test(reply, arguments["subject"], TEST_QUESTIONS), separators=(",", ":"))
+
+# Structured generations are validated once, before caching, and cached in canonical form.
+# A validator raises ValueError for a reply that does not fit; the call is retried once.
+GENERATION_VALIDATORS = {
+    "test": _canonical_test,
+}
+
+class GenerationFailedError(Exception):
+    """A generation ended in a user-facing error reply instead of content."""
+
+# Replies starting with this are user-facing error messages and must never be cached.
+ERROR_REPLY_PREFIX = "⚠️"
+
+# Set by each generation call so endpoints can report X-Cache: HIT/MISS.
+CACHE_STATUS: ContextVar[str] = ContextVar("cache_status", default="MISS")
+
+# Metrics
+HTTP_LATENCY = REGISTRY.histogram("edumentor_http_request_duration_seconds", "HTTP request latency by route.", ["method", "route", "status"])
+UPSTREAM_LATENCY = REGISTRY.histogram("edumentor_upstream_request_duration_seconds", "Groq call latency including retries.", ["model", "kind", "outcome"])
+UPSTREAM_TOKENS = REGISTRY.counter("edumentor_upstream_tokens_total", "Tokens reported by Groq usage.", ["model", "type"])
+INTENT_DECISIONS = REGISTRY.counter("edumentor_intent_total", "Chat intents chosen, by classifier source.", ["intent", "source"])
+CHAT_LATENCY = REGISTRY.histogram("edumentor_chat_duration_seconds", "End-to-end process_message latency by intent.", ["intent"])
+CACHE_LOOKUPS = REGISTRY.counter("edumentor_cache_lookups_total", "Response cache lookups.", ["method", "result"])
+COALESCED = REGISTRY.counter("edumentor_coalesced_requests_total", "Generations that joined an identical in-flight call.", ["method", "kind"])
+RETRIEVAL_LATENCY = REGISTRY.histogram("edumentor_retrieval_duration_seconds", "Course passage retrieval latency.", ["outcome"])
+SEMANTIC_LOOKUPS = REGISTRY.counter("edumentor_semantic_cache_lookups_total", "Semantic chat cache lookups.", ["intent", "result"])
+HISTORY_SUMMARIES = REGISTRY.counter("edumentor_history_summaries_total", "Background conversation summaries by outcome.", ["outcome"])
+ROUTE_LATENCY = REGISTRY.histogram("edumentor_route_duration_seconds", "LLM call latency by route and model actually used.", ["route", "model", "outcome"])
+ROUTE_COST = REGISTRY.counter("edumentor_route_cost_usd_total", "Estimated LLM spend by route and model.", ["route", "model"])
+ROUTE_FALLBACKS = REGISTRY.counter("edumentor_route_fallbacks_total", "Calls moved to the fallback model, by reason.", ["route", "reason"])
+INVALID_GENERATIONS = REGISTRY.counter("edumentor_invalid_generations_total", "Structured generations discarded by validation.", ["method"])
+TEST_SUBMISSIONS = REGISTRY.counter("edumentor_test_submissions_total", "Practice tests graded.", ["subject"])
+CATALOGUE_WARMUPS = REGISTRY.counter("edumentor_catalogue_warmup_total", "Catalogue warm-up generations by outcome.", ["method", "outcome"])
+JOBS_FINISHED = REGISTRY.counter("edumentor_jobs_total", "Background jobs run, by type and outcome.", ["type", "status"])
+JOB_QUEUE_WAIT = REGISTRY.histogram("edumentor_job_queue_wait_seconds", "Time background jobs spent queued.", ["type"],
+                                    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900))
+STREAM_TTFT = REGISTRY.histogram("edumentor_stream_ttft_seconds", "Time to first streamed token.", ["endpoint"])
+STREAM_OUTCOMES = REGISTRY.counter("edumentor_stream_total", "Streams by outcome.", ["endpoint", "outcome"])
+
+def record_token_usage(model: str, usage):
+    UPSTREAM_TOKENS.inc(model, "prompt", amount=usage.prompt_tokens or 0)
+    UPSTREAM_TOKENS.inc(model, "completion", amount=usage.completion_tokens or 0)
+
+def record_route_cost(route: str, model: str, usage):
+    prompt_price, completion_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    cost = ((usage.prompt_tokens or 0) * prompt_price + (usage.completion_tokens or 0) * completion_price) / 1e6
+    if cost:
+        ROUTE_COST.inc(route, model, amount=cost)
+
+def should_fall_back(error: BaseException) -> bool:
+    """Rate limits, local quota, an open breaker, transient upstream errors and our own slow-call timeout."""
+    return isinstance(error, (LocalRateLimitError, CircuitOpenError, asyncio.TimeoutError)) or is_transient(error)
+
+def estimate_request_tokens(messages: list, max_tokens: int) -> int:
+    """Rough token cost of a completion for the local quota: ~4 characters per prompt token plus a share of max_tokens."""
+    return sum(len(message["content"]) for message in messages) // 4 + max_tokens // 4
+
+# EduMentor Chatbot Class
+class EduMentorChatbot:
+    """The main class for the EduMentor Chatbot, managing state, intent, and responses."""
+    def __init__(self, backend: LLMBackend, max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 response_cache: ResponseCache | None = None, upstream_guard: UpstreamGuard | None = None,
+                 progress_store: ProgressStore | None = None, semantic_cache: SemanticAnswerCache | None = None,
+                 retrieval_index: RetrievalIndex | None = None, shared_state: SharedState | None = None):
+        """Initializes the chatbot's state."""
+        self.backend = backend
+        self.response_cache = response_cache or ResponseCache()
+        self.upstream_guard = upstream_guard or self._build_guard()
+        # Groq quotas and outages are per model, so every other model gets its own limiter and breaker.
+        self.model_guards = {LLM_MODEL: self.upstream_guard}
+        self.upstream_limiter = asyncio.Semaphore(max_concurrency)
+        self.intent_classifier = LocalIntentClassifier(threshold=INTENT_CONFIDENCE_THRESHOLD)
+        self.sessions = SessionManager(
+            max_sessions=SESSION_MAX_COUNT,
+            idle_timeout=SESSION_IDLE_TIMEOUT,
+            history_messages=SESSION_HISTORY_MESSAGES,
+            max_message_chars=SESSION_MAX_MESSAGE_CHARS,
+            store=shared_state,
+        )
+        self.progress = progress_store or open_progress_store(shared_state)
+        self.semantic_cache = semantic_cache or SemanticAnswerCache(
+            capacity=SEMANTIC_CACHE_MAX_ENTRIES, threshold=SEMANTIC_CACHE_THRESHOLD, ttl=SEMANTIC_CACHE_TTL
+        )
+        self.retrieval = retrieval_index or RetrievalIndex(RETRIEVAL_DIR)
+        # Identical generations running at the same time share one upstream call.
+        self.inflight = SingleFlight()
+        self.inflight_streams = StreamGroup()
+        # test_id -> test with answer key, most recently used last.
+        self.tests: "OrderedDict[str, Dict]" = OrderedDict()
+
+    @staticmethod
+    def _build_guard() -> UpstreamGuard:
+        return UpstreamGuard(
+            RateLimiter(GROQ_REQUESTS_PER_MINUTE / GROQ_QUOTA_WORKERS, GROQ_TOKENS_PER_MINUTE / GROQ_QUOTA_WORKERS,
+                        max_wait=RATE_LIMIT_MAX_WAIT),
+            CircuitBreaker(failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT),
+            max_retries=UPSTREAM_MAX_RETRIES,
+            backoff_base=UPSTREAM_BACKOFF_BASE,
+            backoff_max=UPSTREAM_BACKOFF_MAX,
+        )
+
+    def _guard(self, model: str) -> UpstreamGuard:
+        guard = self.model_guards.get(model)
+        if guard is None:
+            guard = self.model_guards[model] = self._build_guard()
+        return guard
+
+    async def _call_llm(self, messages: list, route: str = "default", result: Dict | None = None) -> str:
+        """Runs one completion for a MODEL_ROUTES route with robust error handling.
+
+        If the route has a fallback model, the primary model gets a single attempt bounded by fallback_after,
+        and rate limits, outages and slow responses move the call to the fallback instead of retrying.
+        If result is given, result["model"] is set to the model that answered.
+        """
+        profile = model_route(route)
+        fallback = profile.get("fallback")
+        model = profile["model"]
+        try:
+            response = await self._complete(route, model, messages, profile, has_fallback=bool(fallback))
+        except Exception as e:
+            if not (fallback and should_fall_back(e)):
+                return self._error_reply(e)
+            ROUTE_FALLBACKS.inc(route, type(e).__name__)
+            model = fallback
+            try:
+                response = await self._complete(route, fallback, messages, profile)
+            except Exception as fallback_error:
+                return self._error_reply(fallback_error)
+        finally:
+            if result is not None:
+                result["model"] = model
+        return response.text
+
+    async def _complete(self, route: str, model: str, messages: list, profile: Dict, has_fallback: bool = False) -> Completion:
+        estimated_tokens = estimate_request_tokens(messages, profile["max_tokens"])
+        guard = self._guard(model)
+
+        async def create():
+            async with self.upstream_limiter:
+                return await self.backend.complete(model, messages, profile["temperature"], profile["max_tokens"])
+
+        started = time.perf_counter()
+        try:
+            call = guard.run(create, estimated_tokens, max_retries=0 if has_fallback else None)
+            response = await (asyncio.wait_for(call, fallback_after(profile)) if has_fallback else call)
+        except Exception as e:
+            elapsed = time.perf_counter() - started
+            UPSTREAM_LATENCY.observe(elapsed, model, "completion", type(e).__name__)
+            ROUTE_LATENCY.observe(elapsed, route, model, type(e).__name__)
+            raise
+        elapsed = time.perf_counter() - started
+        UPSTREAM_LATENCY.observe(elapsed, model, "completion", "ok")
+        ROUTE_LATENCY.observe(elapsed, route, model, "ok")
+        if response.usage:
+            guard.rate_limiter.settle(estimated_tokens, response.usage.total_tokens)
+            record_token_usage(model, response.usage)
+            record_route_cost(route, model, response.usage)
+        return response
+
+    async def _open_stream(self, model: str, messages: list, profile: Dict, has_fallback: bool = False) -> AsyncIterator:
+        # Only opening the stream is retried; once tokens have been forwarded a retry would duplicate them.
+        call = self._guard(model).run(
+            lambda: self.backend.open_stream(model, messages, profile["temperature"], profile["max_tokens"]),
+            estimate_request_tokens(messages, profile["max_tokens"]),
+            max_retries=0 if has_fallback else None,
+        )
+        return await (asyncio.wait_for(call, LLM_FALLBACK_AFTER) if has_fallback else call)
+
+    async def _stream_llm(self, messages: list, route: str = "default", result: Dict | None = None) -> AsyncIterator[str]:
+        """Streams completion tokens as they arrive. Closing the generator aborts the upstream request.
+
+        Falls back like _call_llm, but only while opening the stream, before any token has been sent.
+        An upstream failure ends the stream with an error reply, possibly after some content; result["outcome"]
+        is "ok" only for a stream that ran to completion, so callers know whether the text is safe to keep, and
+        result["model"] is the model that answered.
+        """
+        profile = model_route(route)
+        fallback = profile.get("fallback")
+        model = profile["model"]
+        started = time.perf_counter()
+        outcome = "cancelled"
+        try:
+            async with self.upstream_limiter:
+                try:
+                    stream = await self._open_stream(model, messages, profile, has_fallback=bool(fallback))
+                except Exception as e:
+                    if not (fallback and should_fall_back(e)):
+                        raise
+                    ROUTE_FALLBACKS.inc(route, type(e).__name__)
+                    model = fallback
+                    stream = await self._open_stream(model, messages, profile)
+                try:
+                    async for token, usage in stream:
+                        if token:
+                            yield token
+                        if usage:
+                            record_token_usage(model, usage)
+                            record_route_cost(route, model, usage)
+                    outcome = "ok"
+                finally:
+                    await stream.aclose()
+        except Exception as e:
+            outcome = type(e).__name__
+            yield self._error_reply(e)
+        finally:
+            elapsed = time.perf_counter() - started
+            UPSTREAM_LATENCY.observe(elapsed, model, "stream", outcome)
+            ROUTE_LATENCY.observe(elapsed, route, model, outcome)
+            if result is not None:
+                result.update(outcome=outcome, model=model)
+
+    @staticmethod
+    def _error_reply(error: Exception) -> str:
+        """Maps an upstream exception to the user-facing error message."""
+        if isinstance(error, CircuitOpenError):
+            return "⚠️ EduMentor is temporarily unavailable. Please try again in a minute."
+        if isinstance(error, (RateLimitError, LocalRateLimitError)):
+            return "⚠️ Too many requests. Please try again later."
+        if isinstance(error, AuthenticationError):
+            return "⚠️ Invalid API key. Please contact the administrator."
+        if isinstance(error, APIError):
+            logger.error("API Error: %s", error, extra={"error_type": type(error).__name__})
+            return "⚠️ Technical issue. Please try again."
+        logger.exception("Unexpected error: %s", error, exc_info=error)
+        return "⚠️ An error occurred. Please try again."
+
+    async def classify_intent(self, user_input: str) -> str:
+        """Classifies the user's intent, locally when confident and via the LLM otherwise."""
+        local_intent = self.intent_classifier.classify(user_input)
+        if local_intent:
+            INTENT_DECISIONS.inc(local_intent, "local")
+            return local_intent
+        intent = await self.classify_intent_with_llm(user_input)
+        INTENT_DECISIONS.inc(intent, "llm")
+        return intent
+
+    async def classify_intent_with_llm(self, user_input: str) -> str:
+        """The upstream classification that local misses fall back to; DEFAULT when the reply is not an intent."""
+        intents = INTENTS
+        classification_prompt = f"""
+        Analyze the user's message and classify its primary intent into ONE of the following categories: {', '.join(intents)}.
+        User's message: "{user_input}"
+        Classification:
+        """
+        messages = [{"role": "user", "content": classification_prompt}]
+        response = await self._call_llm(messages, route="intent")
+        intent = response.strip().upper().replace("'", "").replace('"', "")
+        return intent if intent in intents else "DEFAULT"
+
+    def _handle_special_commands(self, user_input: str, session: StudentSession) -> str | None:
+        """Handles special slash commands."""
+        if user_input.lower().startswith("/subject"):
+            try:
+                session.current_subject = user_input.split(" ", 1)[1].strip().lower()
+                if session.current_subject not in RESOURCES["subjects"]:
+                    return "Invalid subject. Use math, science, history, or languages."
+                return f"Great! Subject set to {session.current_subject}."
+            except IndexError:
+                return "Please provide a subject, e.g., /subject math."
+        return None
+
+    async def award_badge(self, action: str, student_id: str | None = None):
+        """Awards badges and XP based on actions."""
+        if not student_id:
+            return
+        xp, badge = BADGE_REWARDS.get(action, (100, None))
+        await self.progress.award(student_id, xp, badge)
+        # The progress store is the record. A chat session under the same ID only mirrors it for the prompt
+        # context; awards never create one.
+        session = self.sessions.peek(student_id)
+        if session is not None:
+            session.xp += xp
+            if badge and badge not in session.achievements:
+                session.achievements.append(badge)
+            await self.sessions.save(session)
+
+    @staticmethod
+    def _generation_messages(method: str, arguments: Dict) -> list:
+        """Builds the system + user messages for a GENERATION_PROMPTS template."""
+        generation = GENERATION_PROMPTS[method]
+        prompt_data = MASTER_SYSTEM_PROMPTS[generation["system"]]
+        return [
+            {"role": "system", "content": prompt_data["persona"] + "\n" + prompt_data["rules"]},
+            {"role": "user", "content": generation["template"].format(**arguments)}
         ]
-        test = self._call_groq_api(messages)
-        self.award_badge("test_completed", student_id)
-        if student_id:
-            self.student_progress[student_id] = self.student_progress.get(student_id, {})
-            self.student_progress[student_id][subject] = self.student_progress.get(student_id, {}).get(subject, {})
-            self.student_progress[student_id][subject]["attempts"] = self.student_progress[student_id][subject].get("attempts", 0) + 1
-            self.student_progress[student_id][subject]["weak_areas"] = f"{subject} fundamentals"
+
+    async def _generate(self, method: str, **arguments) -> str:
+        """Runs a GENERATION_PROMPTS template through the LLM, serving repeats from the response cache."""
+        profile = model_route(method)
+        key = ResponseCache.make_key(method, arguments, GENERATION_TEMPLATE_HASHES[method], profile["model"], profile["temperature"])
+        cached = await self.response_cache.get(key)
+        if cached is not None:
+            CACHE_STATUS.set("HIT")
+            CACHE_LOOKUPS.inc(method, "hit")
+            return cached
+        CACHE_STATUS.set("MISS")
+        CACHE_LOOKUPS.inc(method, "miss")
+
+        validate = GENERATION_VALIDATORS.get(method)
+
+        async def generate() -> str:
+            result = {}
+            for attempt in range(2 if validate else 1):
+                response = await self._call_llm(self._generation_messages(method, arguments), route=method, result=result)
+                if response.startswith(ERROR_REPLY_PREFIX):
+                    return response
+                if validate is None:
+                    break
+                try:
+                    response = validate(response, arguments)
+                    break
+                except ValueError as e:
+                    INVALID_GENERATIONS.inc(method)
+                    logger.warning("Discarding invalid %s generation (attempt %d): %s", method, attempt + 1, e)
+                    if attempt:
+                        raise
+            # The key names the primary model; a fallback answer is served once but never cached under it.
+            if result["model"] == profile["model"]:
+                await self.response_cache.set(key, response, method, GENERATION_TEMPLATE_HASHES[method])
+            return response
+
+        response, shared = await self.inflight.run(key, generate)
+        if shared:
+            COALESCED.inc(method, "completion")
+        return response
+
+    async def open_generation_stream(self, method: str, **arguments) -> AsyncIterator[str]:
+        """Like _generate, but returns a token stream. The cache is consulted up front so CACHE_STATUS is set on return."""
+        profile = model_route(method)
+        key = ResponseCache.make_key(method, arguments, GENERATION_TEMPLATE_HASHES[method], profile["model"], profile["temperature"])
+        cached = await self.response_cache.get(key)
+        CACHE_STATUS.set("MISS" if cached is None else "HIT")
+        CACHE_LOOKUPS.inc(method, "miss" if cached is None else "hit")
+
+        async def cached_tokens():
+            yield cached
+
+        async def tokens():
+            parts, result = [], {}
+            async for token in self._stream_llm(self._generation_messages(method, arguments), route=method, result=result):
+                parts.append(token)
+                yield token
+            # Only a generation that ran to completion is cached; failed streams may hold partial text plus the error.
+            if result.get("outcome") == "ok" and result["model"] == profile["model"]:
+                await self.response_cache.set(key, "".join(parts), method, GENERATION_TEMPLATE_HASHES[method])
+
+        if cached is not None:
+            return cached_tokens()
+        # Concurrent identical streams subscribe to one upstream stream; late joiners get the tokens so far replayed.
+        subscription, shared = self.inflight_streams.subscribe(key, tokens)
+        if shared:
+            COALESCED.inc(method, "stream")
+        return subscription
+
+    async def warm_cache(self, generations: List[tuple], concurrency: int) -> Dict[str, int]:
+        """Generates any (method, arguments) pair not already in the response cache, concurrency at a time.
+
+        Entries are keyed by the current template hash, so after a prompt edit the next warm-up regenerates them.
+        """
+        limit = asyncio.Semaphore(max(1, concurrency))
+        outcomes = {"cached": 0, "generated": 0, "failed": 0}
+
+        async def warm(method: str, arguments: Dict):
+            async with limit:
+                try:
+                    response = await self._generate(method, **arguments)
+                    outcome = "cached" if CACHE_STATUS.get() == "HIT" else "generated"
+                    if response.startswith(ERROR_REPLY_PREFIX):
+                        outcome = "failed"
+                except Exception as e:
+                    logger.warning("Catalogue warm-up of %s %s failed: %s", method, arguments, e)
+                    outcome = "failed"
+            outcomes[outcome] += 1
+            CATALOGUE_WARMUPS.inc(method, outcome)
+
+        await asyncio.gather(*(warm(method, arguments) for method, arguments in generations))
+        return outcomes
+
+    async def generate_syllabus(self, subject: str, level: str) -> str:
+        """Generates a structured syllabus using LLM."""
+        return await self._generate("syllabus", subject=subject, level=level)
+
+    async def generate_video_description(self, topic: str) -> str:
+        """Generates a video lesson description using LLM."""
+        return await self._generate("video", topic=topic)
+
+    async def generate_notes(self, topic: str) -> str:
+        """Generates detailed study notes using LLM."""
+        return await self._generate("notes", topic=topic)
+
+    async def generate_test(self, subject: str) -> Dict:
+        """Generates a structured MCQ practice test and returns it without the answer key."""
+        body = await self._generate("test", subject=subject)
+        if body.startswith(ERROR_REPLY_PREFIX):
+            raise GenerationFailedError(body)
+        test = json.loads(body)
+        if test["test_id"] not in self.tests:
+            await self.progress.save_test(test["test_id"], subject, body)
+            self._remember_test(test)
+        return public_test(test)
+
+    def _remember_test(self, test: Dict):
+        self.tests[test["test_id"]] = test
+        self.tests.move_to_end(test["test_id"])
+        while len(self.tests) > TEST_MEMORY_ENTRIES:
+            self.tests.popitem(last=False)
+
+    async def get_test(self, test_id: str) -> Dict | None:
+        """A served test with its answer key, from memory or the progress store."""
+        test = self.tests.get(test_id)
+        if test is None:
+            body = await self.progress.get_test(test_id)
+            if body is None:
+                return None
+            test = json.loads(body)
+        self._remember_test(test)
         return test
 
-    def process_message(self, user_input: str) -> str:
-        """Processes user input and generates response."""
-        command_response = self._handle_special_commands(user_input)
+    async def submit_test(self, test: Dict, answers: List[str | None], student_id: str | None = None) -> Dict:
+        """Grades a submission locally (no LLM call), records per-topic accuracy and awards the test badge.
+
+        Only a student's first submission of a test that answers something is recorded and earns XP and the badge:
+        the graded reply reveals the answer key, so later submissions would only inflate the student's accuracy.
+        """
+        result = grade(test, answers)
+        subject = test["subject"]
+        TEST_SUBMISSIONS.inc(subject)
+        scores = {
+            topic: (stats["correct"], stats["answered"], stats["attempted"]) for topic, stats in result["topics"].items()
+        }
+        answered = any(question["selected"] is not None for question in result["results"])
+        first = bool(student_id) and answered and await self.progress.claim_test_reward(student_id, test["test_id"])
+        if first:
+            # Weak areas come from the student's accuracy over all recorded tests, not just this one.
+            scores = await self.progress.record_topic_results(student_id, subject, scores)
+        result["weak_areas"] = weak_areas(scores, WEAK_AREA_THRESHOLD)
+        if not student_id:
+            return result
+        if first:
+            await asyncio.gather(
+                self.progress.record_attempt(student_id, subject, ", ".join(result["weak_areas"])),
+                self.award_badge("test_completed", student_id),
+            )
+        result["xp_awarded"] = BADGE_REWARDS["test_completed"][0] if first else 0
+        return result
+
+    async def generate_document_notes(self, text: str) -> str:
+        """Generates study notes for one chunk of an uploaded document."""
+        return await self._generate("document_notes", text=text)
+
+    async def generate_document_test(self, text: str) -> str:
+        """Generates a short practice test for one chunk of an uploaded document."""
+        return await self._generate("document_test", text=text)
+
+    async def process_message(self, user_input: str, session_id: str, course_id: str | None = None) -> str:
+        """Processes user input within the student's session and generates response."""
+        session = await self.sessions.load(session_id)
+        command_response = self._handle_special_commands(user_input, session)
         if command_response:
+            await self.sessions.save(session)
             return command_response
 
-        intent = self.classify_intent(user_input)
-        prompt_data = MASTER_SYSTEM_PROMPTS.get(intent, MASTER_SYSTEM_PROMPTS["DEFAULT"])
-        contextual_info = f"""
-        CURRENT CONTEXT:
-        - Study Status: {self.study_status}
-        - Current Subject: {self.current_subject or 'Not Set'}
-        - Resources: {json.dumps(RESOURCES)}
-        - XP: {self.xp}
-        - Achievements: {json.dumps(self.achievements)}
+        started = time.perf_counter()
+        cached, intent = self._semantic_lookup(user_input, session, course_id)
+        if cached is not None:
+            session.add_turn(user_input, cached, self.sessions.max_message_chars)
+            await self.sessions.save(session)
+            CHAT_LATENCY.observe(time.perf_counter() - started, intent)
+            return cached
+        intent, course_context = await asyncio.gather(self.classify_intent(user_input), self._course_context(course_id, user_input))
+        messages = self._build_chat_messages(intent, user_input, session, course_context)
+        context_free = not session.has_context
+        response_text = await self._call_llm(messages, route=f"chat:{intent}")
+        if context_free:
+            self._semantic_store(user_input, session, course_id, intent, response_text)
+        session.add_turn(user_input, response_text, self.sessions.max_message_chars)
+        await self.sessions.save(session)
+        CHAT_LATENCY.observe(time.perf_counter() - started, intent)
+        return response_text
+
+    def _semantic_lookup(self, user_input: str, session: StudentSession, course_id: str | None) -> tuple[str | None, str | None]:
+        """Looks for an answer to a near-identical question. Runs before intent classification, so a hit costs no Groq call.
+
+        Only context-free turns (empty history) are eligible; the partition is the current subject and course
+        because both change the system prompt.
         """
-        anti_repetition_rule = "CRITICAL: Do NOT repeat or translate the user's question. Answer directly."
-        full_system_prompt = f"{prompt_data['persona']}\n{contextual_info}\nRULES:\n{prompt_data['rules']}\n{anti_repetition_rule}"
+        if session.has_context:
+            return None, None
+        answer, intent, _ = self.semantic_cache.lookup(user_input, f"{session.current_subject or ''}|{course_id or ''}")
+        if answer is not None:
+            SEMANTIC_LOOKUPS.inc(intent, "hit")
+        return answer, intent
+
+    def _semantic_store(self, user_input: str, session: StudentSession, course_id: str | None, intent: str, reply: str):
+        SEMANTIC_LOOKUPS.inc(intent, "miss")
+        if intent in SEMANTIC_CACHE_INTENTS and not reply.startswith(ERROR_REPLY_PREFIX):
+            self.semantic_cache.add(user_input, f"{session.current_subject or ''}|{course_id or ''}", reply, intent)
+
+    async def _course_context(self, course_id: str | None, user_input: str) -> str | None:
+        """Top-k passages from the course's retrieval index, formatted for the system prompt."""
+        if not course_id:
+            return None
+        started = time.perf_counter()
+        try:
+            passages = await asyncio.to_thread(self.retrieval.search, course_id, user_input, RETRIEVAL_TOP_K)
+        except Exception as e:
+            RETRIEVAL_LATENCY.observe(time.perf_counter() - started, "error")
+            logger.exception("Error searching course %s: %s", course_id, e)
+            return None
+        RETRIEVAL_LATENCY.observe(time.perf_counter() - started, "hit" if passages else "empty")
+        return format_passages(passages) if passages else None
+
+    def _build_chat_messages(self, intent: str, user_input: str, session: StudentSession,
+                             resources: str | None = None) -> list:
+        """Assembles the system prompt for intent, the history that fits SESSION_HISTORY_TOKENS and the user turn.
 
-        messages = [
-            {"role": "system", "content": full_system_prompt},
-            *self.chat_history[-6:],
+        Turns that no longer fit are handed to a background summarization task.
+        """
+        history, overflow = session.context_messages(SESSION_HISTORY_TOKENS)
+        if overflow:
+            self._schedule_summary(session, overflow)
+        return [
+            {"role": "system", "content": build_system_prompt(intent, session, resources)},
+            *history,
             {"role": "user", "content": user_input}
         ]
 
-        response_text = self._call_groq_api(messages)
-        self.chat_history.extend([{"role": "user", "content": user_input}, {"role": "assistant", "content": response_text}])
-        return response_text
+    def _schedule_summary(self, session: StudentSession, overflow: int):
+        """Starts folding the oldest `overflow` messages into the summary once they are worth a call."""
+        if session.summary_task is not None and not session.summary_task.done():
+            return
+        # A nearly full buffer is summarized regardless of size; waiting would let the oldest turns fall off.
+        if not session.near_capacity and sum(list(session.history_tokens)[:overflow]) < SESSION_SUMMARY_MIN_TOKENS:
+            return
+        older = list(session.chat_history)[:overflow]
+        session.summary_task = asyncio.create_task(self._summarize(session, older))
+
+    async def _summarize(self, session: StudentSession, older: list):
+        """Runs off the request path; on failure the messages stay in history and are retried on a later turn."""
+        transcript = "\n".join(f"{message['role']}: {message['content']}" for message in older)
+        prompt = f"""
+        Update the summary of a tutoring conversation between a student and EduMentor.
+        Keep the subjects and topics discussed, what the student struggled with, and any answers they still need.
+        Reply with the summary only, in at most {SESSION_SUMMARY_MAX_TOKENS * 3 // 4} words.
+        Current summary: {session.summary or "None"}
+        New messages:
+        {transcript}
+        """
+        summary = await self._call_llm([{"role": "user", "content": prompt}], route="summary")
+        if summary.startswith(ERROR_REPLY_PREFIX):
+            HISTORY_SUMMARIES.inc("error")
+            return
+        session.apply_summary(summary.strip(), older)
+        await self.sessions.save(session)
+        HISTORY_SUMMARIES.inc("ok")
+
+    async def stream_message(self, user_input: str, session_id: str, course_id: str | None = None) -> AsyncIterator[str]:
+        """Streaming counterpart of process_message; the turn is saved to history only if the stream completes."""
+        session = await self.sessions.load(session_id)
+        command_response = self._handle_special_commands(user_input, session)
+        if command_response:
+            await self.sessions.save(session)
+            yield command_response
+            return
+        cached, _ = self._semantic_lookup(user_input, session, course_id)
+        if cached is not None:
+            session.add_turn(user_input, cached, self.sessions.max_message_chars)
+            await self.sessions.save(session)
+            yield cached
+            return
+        intent, course_context = await asyncio.gather(self.classify_intent(user_input), self._course_context(course_id, user_input))
+        messages = self._build_chat_messages(intent, user_input, session, course_context)
+        context_free = not session.has_context
+        parts, result = [], {}
+        async for token in self._stream_llm(messages, route=f"chat:{intent}", result=result):
+            parts.append(token)
+            yield token
+        if result.get("outcome") != "ok":
+            return
+        reply = "".join(parts)
+        if context_free:
+            self._semantic_store(user_input, session, course_id, intent, reply)
+        session.add_turn(user_input, reply, self.sessions.max_message_chars)
+        await self.sessions.save(session)
 
 # Initialize the Assistant
-try:
-    groq_api_key = "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"
-    if not groq_api_key:
-        raise ValueError("GROQ_API_KEY not found. Set it in a .env file.")
-
-    client = Groq(api_key=groq_api_key)
-    # The call to client.models.list() validates the key.
-    client.models.list()
-    print("✅ Groq API key validated.")
-
-    assistant = EduMentorChatbot(client)
-    print("📚 EduMentor - Your AI Learning Assistant is ready. 📚")
-
-except (ValueError, AuthenticationError, APIConnectionError, APIError) as e:
-    print(f"❌ Fatal Error: {e}")
-    print("EduMentor cannot start. Check your Groq API key.")
-    assistant = None
-except Exception as e:
-    print(f"❌ Critical Error: {type(e).__name__} - {e}")
-    print("EduMentor cannot start due to an unforeseen issue.")
-    assistant = None
+# No default: without a key the readiness probe reports "invalid" and endpoints answer 503.
+GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+# Startup waits at most this long on the network; validation then continues in the background.
+KEY_VALIDATION_TIMEOUT = float(os.getenv("KEY_VALIDATION_TIMEOUT", "5"))
+KEY_REVALIDATE_INTERVAL = float(os.getenv("KEY_REVALIDATE_INTERVAL", "600"))
+
+class Readiness:
+    """API key validation state reported by the readiness probe."""
+    def __init__(self):
+        self.key_status = "pending"  # pending | valid | invalid | unreachable
+        self.detail: str | None = None
+        self.started_at = time.monotonic()
+        self.validated_at: float | None = None
+        self.ready_after: float | None = None
+
+    def mark(self, key_status: str, detail: str | None = None):
+        self.key_status = key_status
+        self.detail = detail
+        if key_status == "valid":
+            self.validated_at = time.monotonic()
+            if self.ready_after is None:
+                self.ready_after = self.validated_at - self.started_at
+
+readiness = Readiness()
+_assistant: EduMentorChatbot | None = None
+_job_queue: JobQueue | None = None
+_shared_state: SharedState | None = None
+
+def build_llm_backend() -> LLMBackend:
+    """The backend selected by LLM_BACKEND."""
+    if LLM_BACKEND == "stub":
+        return StubBackend(
+            latency=LLM_STUB_LATENCY,
+            tokens_per_second=LLM_STUB_TOKENS_PER_SECOND,
+            completion_tokens=LLM_STUB_COMPLETION_TOKENS,
+            rate_429=LLM_STUB_ERROR_RATE_429,
+            rate_5xx=LLM_STUB_ERROR_RATE_5XX,
+            rate_timeout=LLM_STUB_ERROR_RATE_TIMEOUT,
+            seed=LLM_STUB_SEED,
+        )
+    if LLM_BACKEND != "groq":
+        raise ValueError(f"Unknown LLM_BACKEND {LLM_BACKEND!r}; use 'groq' or 'stub'.")
+    # Completions go through the async client so a slow generation never blocks the event loop.
+    # Retries are handled by UpstreamGuard, so the SDK's own retry loop is turned off.
+    return GroqBackend(AsyncGroq(api_key=GROQ_API_KEY, max_retries=0))
+
+def open_progress_store(shared_state: SharedState | None) -> ProgressStore:
+    """Progress in Redis when workers share a Redis server (they may be on several hosts), else in PROGRESS_DB."""
+    if isinstance(shared_state, RedisSharedState):
+        return RedisProgressStore(shared_state.client)
+    return SQLiteProgressStore(
+        PROGRESS_DB, write_behind=PROGRESS_WRITE_MODE == "write_behind", flush_interval=PROGRESS_FLUSH_INTERVAL
+    )
+
+def get_shared_state() -> SharedState | None:
+    """The SHARED_STATE_URL backend, or None when this process runs on its own."""
+    global _shared_state
+    if _shared_state is None and SHARED_STATE_URL:
+        _shared_state = open_shared_state(SHARED_STATE_URL)
+        logger.info("Sharing sessions and cached responses through %s state as worker %s", _shared_state.name, WORKER_ID)
+    return _shared_state
+
+def get_assistant() -> EduMentorChatbot:
+    """Builds the chatbot on first use. Construction is local only; nothing here touches the network."""
+    global _assistant
+    if _assistant is None:
+        shared_state = get_shared_state()
+        response_cache = ResponseCache(
+            max_entries=RESPONSE_CACHE_MAX_ENTRIES,
+            max_bytes=RESPONSE_CACHE_MAX_BYTES,
+            ttl=RESPONSE_CACHE_TTL,
+            db_path=RESPONSE_CACHE_DB,
+            # A RESPONSE_CACHE_DB file is already shared by the workers of one host.
+            shared=shared_state if not RESPONSE_CACHE_DB else None,
+            memory_ttl=RESPONSE_CACHE_MEMORY_TTL or None,
+        )
+        # Drop persisted responses produced by prompt templates that have since been edited.
+        response_cache.retain_templates(GENERATION_TEMPLATE_HASHES)
+
+        _assistant = EduMentorChatbot(build_llm_backend(), response_cache=response_cache, shared_state=shared_state)
+        logger.info("📚 EduMentor - Your AI Learning Assistant is ready. 📚")
+    return _assistant
+
+def get_job_queue() -> JobQueue:
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = JobQueue(JOBS_DB, workers=JOB_WORKERS, max_pending_per_student=JOB_MAX_PENDING_PER_STUDENT,
+                              result_ttl=JOB_RESULT_TTL, lease=JOB_LEASE, webhook_allowed_hosts=JOB_WEBHOOK_ALLOWED_HOSTS)
+    return _job_queue
+
+def require_assistant() -> EduMentorChatbot:
+    """Returns the chatbot for an endpoint, or 503 if the API key is known to be unusable."""
+    if readiness.key_status == "invalid":
+        raise HTTPException(status_code=503, detail="Chatbot not available. Please check server logs.")
+    return get_assistant()
+
+def _assistant_gauge(read) -> Dict[tuple, float]:
+    return {(): read(_assistant)} if _assistant is not None else {}
+
+BREAKER_STATES = {"closed": 0, "half_open": 1, "open": 2}
+REGISTRY.gauge("edumentor_upstream_breaker_state", "Circuit breaker state (0 closed, 1 half-open, 2 open).",
+               callback=lambda: _assistant_gauge(lambda a: BREAKER_STATES[a.upstream_guard.breaker.state]))
+REGISTRY.gauge("edumentor_upstream_retries", "Upstream retries since start.",
+               callback=lambda: _assistant_gauge(lambda a: a.upstream_guard.retries))
+REGISTRY.gauge("edumentor_upstream_breaker_rejected", "Calls rejected by the open breaker since start.",
+               callback=lambda: _assistant_gauge(lambda a: a.upstream_guard.breaker.rejected))
+REGISTRY.gauge("edumentor_active_sessions", "Chat sessions held in memory.",
+               callback=lambda: _assistant_gauge(lambda a: len(a.sessions)))
+REGISTRY.gauge("edumentor_cache_entries", "Response cache entries in the memory tier.",
+               callback=lambda: _assistant_gauge(lambda a: a.response_cache.stats()["entries"]))
+REGISTRY.gauge("edumentor_semantic_cache_entries", "Answers held by the semantic chat cache.",
+               callback=lambda: _assistant_gauge(lambda a: a.semantic_cache.size))
+REGISTRY.gauge("edumentor_semantic_cache_hit_ratio", "Semantic chat cache hit ratio since start.",
+               callback=lambda: _assistant_gauge(lambda a: a.semantic_cache.stats()["hit_rate"]))
+REGISTRY.gauge("edumentor_job_queue_depth", "Background jobs waiting for a worker.", ["priority"],
+               callback=lambda: {(priority,): depth for priority, depth in _job_queue.depth().items()}
+               if _job_queue is not None else {})
+REGISTRY.gauge("edumentor_jobs_running", "Background jobs being generated.",
+               callback=lambda: {(): _job_queue.stats()["running"]} if _job_queue is not None else {})
+REGISTRY.gauge("edumentor_api_key_valid", "1 when the Groq API key has been validated.",
+               callback=lambda: {(): 1 if readiness.key_status == "valid" else 0})
+
+async def validate_api_key() -> bool:
+    """Validates the backend's credentials (models.list() for Groq), bounded by KEY_VALIDATION_TIMEOUT."""
+    if LLM_BACKEND == "groq" and not GROQ_API_KEY:
+        readiness.mark("invalid", "GROQ_API_KEY not found. Set it in a .env file.")
+        logger.critical("❌ Fatal Error: %s", readiness.detail)
+        return False
+    try:
+        await asyncio.wait_for(get_assistant().backend.validate(), KEY_VALIDATION_TIMEOUT)
+    except AuthenticationError as e:
+        readiness.mark("invalid", str(e))
+        logger.critical("❌ Fatal Error: %s. EduMentor cannot serve requests. Check your Groq API key.", e)
+    except (asyncio.TimeoutError, APIConnectionError, APIError) as e:
+        # Transient: keep serving and let the background task retry.
+        readiness.mark("unreachable", f"{type(e).__name__}: {e}")
+        logger.warning("⚠️ Could not validate Groq API key yet: %s", readiness.detail)
+    else:
+        readiness.mark("valid")
+        logger.info("✅ Groq API key validated.")
+    return readiness.key_status == "valid"
+
+async def revalidate_api_key_forever():
+    """Re-checks the key periodically, and with capped exponential backoff while it is not valid."""
+    delay = 1.0
+    while True:
+        if readiness.key_status == "valid":
+            delay = 1.0
+            await asyncio.sleep(KEY_REVALIDATE_INTERVAL)
+        else:
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 60.0)
+        try:
+            await validate_api_key()
+        except Exception as e:
+            logger.exception("❌ Critical Error: %s - %s", type(e).__name__, e)
+
+# Outcome of the latest catalogue warm-up, reported under /admin/cache.
+catalogue_warmup: Dict = {"runs": 0, "running": False, "last_started": None, "last_duration_s": None, "last_outcomes": None}
+
+async def warm_catalogue(exclusive: bool = False) -> Dict:
+    """Fills the response cache with every catalogue generation that is missing (one run at a time).
+
+    With exclusive and a SHARED_STATE_URL backend, the run is skipped unless this worker takes the shared warm-up
+    lease, so a multi-worker deployment warms the shared cache once per interval instead of once per worker. A
+    process without shared state has no one to coordinate with and always runs.
+    """
+    if catalogue_warmup["running"]:
+        return catalogue_warmup
+    shared_state = get_shared_state()
+    if exclusive and shared_state is not None:
+        lease = CATALOGUE_WARMUP_INTERVAL if CATALOGUE_WARMUP_INTERVAL > 0 else 3600
+        if not await shared_state.acquire("lease:catalogue-warmup", WORKER_ID, lease):
+            logger.info("Catalogue warm-up skipped: another worker holds the lease")
+            return catalogue_warmup
+    catalogue_warmup.update(running=True, last_started=time.time())
+    started = time.perf_counter()
+    try:
+        outcomes = await get_assistant().warm_cache(catalogue_generations(RESOURCES), CATALOGUE_WARMUP_CONCURRENCY)
+    finally:
+        catalogue_warmup["running"] = False
+    catalogue_warmup.update(runs=catalogue_warmup["runs"] + 1, last_duration_s=round(time.perf_counter() - started, 2),
+                            last_outcomes=outcomes)
+    logger.info("Catalogue warm-up finished: %s", outcomes)
+    return catalogue_warmup
+
+async def warm_catalogue_forever():
+    """Warms the catalogue once the API key is valid, then on CATALOGUE_WARMUP_INTERVAL."""
+    if not CATALOGUE_WARMUP_ON_STARTUP and CATALOGUE_WARMUP_INTERVAL <= 0:
+        return
+    if not CATALOGUE_WARMUP_ON_STARTUP:
+        await asyncio.sleep(CATALOGUE_WARMUP_INTERVAL)
+    while True:
+        while readiness.key_status != "valid":
+            await asyncio.sleep(5)
+        try:
+            await warm_catalogue(exclusive=True)
+        except Exception as e:
+            logger.exception("❌ Catalogue warm-up failed: %s", e)
+        if CATALOGUE_WARMUP_INTERVAL <= 0:
+            return
+        await asyncio.sleep(CATALOGUE_WARMUP_INTERVAL)
 
 # API Endpoints
 @app.get("/")
 def root():
     return {"message": "📚 EduMentor API is running! 🚀"}
 
+@app.get("/healthz")
+def liveness():
+    return {"status": "alive"}
+
+@app.get("/readyz")
+def readiness_probe(response: Response):
+    ready = readiness.key_status == "valid" and _assistant is not None
+    response.status_code = 200 if ready else 503
+    return {
+        "ready": ready,
+        "key_status": readiness.key_status,
+        "detail": readiness.detail,
+        "ready_after_s": round(readiness.ready_after, 3) if readiness.ready_after is not None else None,
+    }
+
+# Reply to an empty chat message, from /chat and /chat/stream alike.
+EMPTY_MESSAGE_REPLY = "Please ask something."
+
 @app.post("/chat")
 async def chat(payload: ChatPayload):
-    if not assistant:
-        raise HTTPException(status_code=500, detail="Chatbot not initialized. Please check server logs.")
+    assistant = require_assistant()
     user_input = payload.message
+    session_id = payload.session_id or uuid.uuid4().hex
     if not user_input.strip():
-        return ChatResponse(reply="Please ask something.")
+        return ChatResponse(reply=EMPTY_MESSAGE_REPLY, session_id=session_id)
     try:
-        response = assistant.process_message(user_input)
-        return ChatResponse(reply=response)
+        response = await assistant.process_message(user_input, session_id, payload.course_id)
+        return ChatResponse(reply=response, session_id=session_id)
     except Exception as e:
-        print(f"Error processing chat message: {e}")
+        logger.exception("Error processing chat message: %s", e)
         raise HTTPException(status_code=500, detail="Internal error during chat processing.")
 
+def _sse_response(request: Request, endpoint: str, tokens: AsyncIterator[str], headers: Dict[str, str] | None = None) -> StreamingResponse:
+    """Wraps a token stream as Server-Sent Events.
+
+    StreamingResponse only pulls the next token once the previous one is sent, which gives natural
+    backpressure. When the client goes away the generator is closed, which closes the upstream stream.
+    """
+    async def events():
+        started = time.perf_counter()
+        first_token = True
+        finished = False
+        try:
+            async for token in tokens:
+                if first_token:
+                    STREAM_TTFT.observe(time.perf_counter() - started, endpoint)
+                    first_token = False
+                if await request.is_disconnected():
+                    break
+                yield f"data: {json.dumps({'token': token})}\n\n"
+            else:
+                finished = True
+                yield "event: done\ndata: {}\n\n"
+        finally:
+            STREAM_OUTCOMES.inc(endpoint, "completed" if finished else "cancelled")
+            await tokens.aclose()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", **(headers or {})},
+    )
+
+async def _single_token(text: str) -> AsyncIterator[str]:
+    yield text
+
+@app.post("/chat/stream")
+async def chat_stream(payload: ChatPayload, request: Request):
+    assistant = require_assistant()
+    session_id = payload.session_id or uuid.uuid4().hex
+    if payload.message.strip():
+        tokens = assistant.stream_message(payload.message, session_id, payload.course_id)
+    else:
+        tokens = _single_token(EMPTY_MESSAGE_REPLY)
+    return _sse_response(request, "/chat/stream", tokens, headers={"X-Session-Id": session_id})
+
+@app.post("/notes/stream")
+async def notes_stream(payload: NotesPayload, request: Request):
+    assistant = require_assistant()
+    tokens = await assistant.open_generation_stream("notes", topic=payload.topic)
+    return _sse_response(request, "/notes/stream", tokens, headers={"X-Cache": CACHE_STATUS.get()})
+
+@app.post("/syllabus/stream")
+async def syllabus_stream(payload: SyllabusPayload, request: Request):
+    assistant = require_assistant()
+    tokens = await assistant.open_generation_stream("syllabus", subject=payload.subject, level=payload.level)
+    return _sse_response(request, "/syllabus/stream", tokens, headers={"X-Cache": CACHE_STATUS.get()})
+
+@app.get("/health/upstream")
+def get_upstream_health():
+    assistant = require_assistant()
+    return {
+        **assistant.upstream_guard.stats(),
+        "models": {model: guard.stats() for model, guard in assistant.model_guards.items()},
+        "routes": MODEL_ROUTES,
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 @app.post("/syllabus")
-async def generate_syllabus_endpoint(payload: SyllabusPayload):
-    if not assistant:
-        raise HTTPException(status_code=500, detail="Chatbot not initialized. Please check server logs.")
+async def generate_syllabus_endpoint(payload: SyllabusPayload, response: Response,
+                                     run_async: bool = Query(default=False, alias="async"),
+                                     priority: str = "normal", webhook_url: str | None = None):
+    """With ?async=true, queues the syllabus as a background job and answers 202 with its job ID."""
+    assistant = require_assistant()
+    if run_async:
+        return await _submit_job(_job_payload(type="syllabus", subject=payload.subject, level=payload.level,
+                                              priority=priority, webhook_url=webhook_url), response)
     try:
-        return {"syllabus": assistant.generate_syllabus(payload.subject, payload.level)}
+        syllabus = await assistant.generate_syllabus(payload.subject, payload.level)
+        response.headers["X-Cache"] = CACHE_STATUS.get()
+        return {"syllabus": syllabus}
     except Exception as e:
-        print(f"Error generating syllabus: {e}")
+        logger.exception("Error generating syllabus: %s", e)
         raise HTTPException(status_code=500, detail="Failed to generate syllabus.")
 
 @app.post("/video")
-async def generate_video(payload: VideoPayload):
-    if not assistant:
-        raise HTTPException(status_code=500, detail="Chatbot not initialized. Please check server logs.")
+async def generate_video(payload: VideoPayload, response: Response):
+    assistant = require_assistant()
     try:
-        return {"video_description": assistant.generate_video_description(payload.topic)}
+        video_description = await assistant.generate_video_description(payload.topic)
+        response.headers["X-Cache"] = CACHE_STATUS.get()
+        return {"video_description": video_description}
     except Exception as e:
-        print(f"Error generating video: {e}")
+        logger.exception("Error generating video: %s", e)
         raise HTTPException(status_code=500, detail="Failed to generate video description.")
 
 @app.post("/notes")
-async def generate_notes(payload: NotesPayload):
-    if not assistant:
-        raise HTTPException(status_code=500, detail="Chatbot not initialized. Please check server logs.")
+async def generate_notes(payload: NotesPayload, response: Response):
+    assistant = require_assistant()
     try:
-        return {"notes": assistant.generate_notes(payload.topic)}
+        notes = await assistant.generate_notes(payload.topic)
+        response.headers["X-Cache"] = CACHE_STATUS.get()
+        return {"notes": notes}
     except Exception as e:
-        print(f"Error generating notes: {e}")
+        logger.exception("Error generating notes: %s", e)
         raise HTTPException(status_code=500, detail="Failed to generate notes.")
 
 @app.post("/test")
-async def generate_test_endpoint(payload: TestPayload):
-    if not assistant:
-        raise HTTPException(status_code=500, detail="Chatbot not initialized. Please check server logs.")
+async def generate_test_endpoint(payload: TestPayload, response: Response,
+                                 run_async: bool = Query(default=False, alias="async"),
+                                 priority: str = "normal", webhook_url: str | None = None):
+    """With ?async=true, queues the test as a background job and answers 202 with its job ID."""
+    assistant = require_assistant()
+    if run_async:
+        return await _submit_job(_job_payload(type="test", subject=payload.subject,
+                                              student_id=payload.student_id, priority=priority,
+                                              webhook_url=webhook_url), response)
     try:
-        return {"test": assistant.generate_test(payload.subject, payload.student_id)}
+        test = await assistant.generate_test(payload.subject)
+        response.headers["X-Cache"] = CACHE_STATUS.get()
+        return {"test": test}
+    except GenerationFailedError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except InvalidTestError as e:
+        logger.error("Generated test failed validation: %s", e)
+        raise HTTPException(status_code=502, detail="The generated test was malformed. Please try again.")
     except Exception as e:
-        print(f"Error generating test: {e}")
+        logger.exception("Error generating test: %s", e)
         raise HTTPException(status_code=500, detail="Failed to generate test.")
 
+def _job_endpoint_payload(job: BatchJob) -> BaseModel:
+    """Validates a batch job against its endpoint's payload model (raises ValidationError)."""
+    if job.type == "notes":
+        return NotesPayload(topic=job.topic, student_id=job.student_id)
+    if job.type == "syllabus":
+        return SyllabusPayload(subject=job.subject, level=job.level)
+    if job.type == "test":
+        return TestPayload(subject=job.subject, student_id=job.student_id)
+    return VideoPayload(topic=job.topic, student_id=job.student_id)
+
+@app.get("/test/{test_id}")
+async def get_test(test_id: str):
+    """A previously served test, without its answer key."""
+    test = await require_assistant().get_test(test_id)
+    if test is None:
+        raise HTTPException(status_code=404, detail="Test not found.")
+    return {"test": public_test(test)}
+
+@app.post("/test/{test_id}/submit")
+async def submit_test(test_id: str, payload: TestSubmission):
+    """Grades answers against the stored answer key (no LLM call) and updates the student's progress."""
+    assistant = require_assistant()
+    test = await assistant.get_test(test_id)
+    if test is None:
+        raise HTTPException(status_code=404, detail="Test not found.")
+    if len(payload.answers) > len(test["questions"]):
+        raise HTTPException(status_code=422, detail=f"This test has {len(test['questions'])} questions.")
+    return await assistant.submit_test(test, payload.answers, payload.student_id)
+
+async def _run_batch_job(assistant: EduMentorChatbot, job: BatchJob) -> Dict[str, str]:
+    """Validates a batch job and runs the matching generator."""
+    payload = _job_endpoint_payload(job)
+    if job.type == "notes":
+        return {"notes": await assistant.generate_notes(payload.topic)}
+    if job.type == "syllabus":
+        return {"syllabus": await assistant.generate_syllabus(payload.subject, payload.level)}
+    if job.type == "test":
+        return {"test": await assistant.generate_test(payload.subject)}
+    return {"video_description": await assistant.generate_video_description(payload.topic)}
+
+@app.post("/batch")
+async def batch_generate(payload: BatchPayload, request: Request):
+    """Runs many generation jobs concurrently and streams one NDJSON line per job as it finishes.
+
+    Identical jobs within a batch run once; every index that asked for it is listed in the result line.
+    """
+    assistant = require_assistant()
+    unique_jobs: Dict[str, BatchJob] = {}
+    indices: Dict[str, List[int]] = defaultdict(list)
+    for index, job in enumerate(payload.jobs):
+        key = json.dumps(job.dict(), sort_keys=True).lower()
+        unique_jobs.setdefault(key, job)
+        indices[key].append(index)
+    limit = asyncio.Semaphore(max(1, min(payload.max_concurrency or BATCH_MAX_CONCURRENCY, BATCH_MAX_CONCURRENCY)))
+
+    async def run(key: str, job: BatchJob) -> Dict:
+        started = time.perf_counter()
+        async with limit:
+            try:
+                result = await _run_batch_job(assistant, job)
+                line = {"status": "ok", "result": result, "cache": CACHE_STATUS.get()}
+            except ValidationError as e:
+                line = {"status": "invalid", "detail": "; ".join(error["msg"] for error in e.errors())}
+            except Exception as e:
+                logger.exception("Error running batch job %s: %s", job.type, e)
+                line = {"status": "error", "detail": str(e)}
+        return {"indices": indices[key], "type": job.type, **line,
+                "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)}
+
+    async def results():
+        tasks = [asyncio.create_task(run(key, job)) for key, job in unique_jobs.items()]
+        try:
+            yield json.dumps({"jobs": len(payload.jobs), "unique_jobs": len(tasks)}) + "\n"
+            for finished in asyncio.as_completed(tasks):
+                yield json.dumps(await finished) + "\n"
+                if await request.is_disconnected():
+                    break
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+async def run_queued_job(job: Dict) -> Dict:
+    """Runs a background job from the queue with the same generators as /batch."""
+    JOB_QUEUE_WAIT.observe(job["started_at"] - job["created_at"], job["type"])
+    try:
+        result = await _run_batch_job(require_assistant(), BatchJob(**job["params"]))
+    except Exception:
+        JOBS_FINISHED.inc(job["type"], "failed")
+        raise
+    JOBS_FINISHED.inc(job["type"], "done")
+    return result
+
+def _job_payload(**fields) -> JobPayload:
+    try:
+        return JobPayload(**fields)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail="; ".join(error["msg"] for error in e.errors()))
+
+async def _submit_job(payload: JobPayload, response: Response) -> Dict:
+    """Queues a validated job and answers 202 with its ID; 429 once the student has too many pending."""
+    try:
+        _job_endpoint_payload(payload)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail="; ".join(error["msg"] for error in e.errors()))
+    params = payload.dict(exclude={"priority", "webhook_url"})
+    try:
+        job = await get_job_queue().submit(payload.type, params, payload.student_id, payload.priority,
+                                           payload.webhook_url)
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except UnsafeWebhookError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    response.status_code = 202
+    response.headers["Location"] = f"/jobs/{job['job_id']}"
+    return job
+
+@app.post("/jobs")
+async def submit_job(payload: JobPayload, response: Response):
+    """Queues a notes, syllabus, test or video generation and returns its job ID immediately.
+
+    Poll GET /jobs/{job_id} (optionally long-polling with ?wait=), or pass webhook_url to have the
+    finished job POSTed back.
+    """
+    require_assistant()
+    return await _submit_job(payload, response)
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = Query(default=0, ge=0)):
+    job = await get_job_queue().get(job_id, wait=min(wait, JOB_MAX_WAIT))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    job = await get_job_queue().cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
+
+@app.get("/jobs")
+def get_job_stats():
+    return get_job_queue().stats()
+
+UPLOAD_MODES = {"notes": ("notes",), "test": ("test",), "both": ("notes", "test")}
+
+@app.post("/upload")
+async def upload_document(request: Request, mode: str = "both"):
+    """Turns an uploaded PDF or text file (multipart field "file") into notes and/or practice tests.
+
+    The document is cut into UPLOAD_CHUNK_TOKENS-sized chunks that are generated concurrently. The response is
+    NDJSON: a "received" line, one "chunk" line per chunk as it finishes (with running progress), then "done".
+    A new chunk is only extracted once an earlier one has been written out, which bounds memory use.
+    """
+    assistant = require_assistant()
+    if mode not in UPLOAD_MODES:
+        raise HTTPException(status_code=400, detail=f"Unknown mode. Use one of: {', '.join(UPLOAD_MODES)}.")
+    try:
+        form = await read_upload_form(request, UPLOAD_MAX_BYTES)
+    except UploadTooLargeError:
+        raise HTTPException(status_code=413, detail=f"File too large. The limit is {UPLOAD_MAX_BYTES // (1024 * 1024)} MB.")
+    except MultiPartException as e:
+        raise HTTPException(status_code=400, detail=e.message)
+    upload = form_file(form, "file")
+    try:
+        if upload is None:
+            raise HTTPException(status_code=400, detail="Send the document as the multipart field 'file'.")
+        kind = document_kind(upload.filename, upload.content_type)
+    except UnsupportedDocumentError as e:
+        await form.close()
+        raise HTTPException(status_code=415, detail=str(e))
+    except HTTPException:
+        await form.close()
+        raise
+
+    generators = {"notes": assistant.generate_document_notes, "test": assistant.generate_document_test}
+    outputs = UPLOAD_MODES[mode]
+    chunks = split_chunks(iter_text_blocks(upload.file, kind), UPLOAD_CHUNK_TOKENS)
+    slots = asyncio.Semaphore(UPLOAD_MAX_CONCURRENCY)
+    lines: asyncio.Queue = asyncio.Queue()
+    progress = {"extracted": 0, "completed": 0, "truncated": False}
+
+    async def process(index: int, text: str):
+        started = time.perf_counter()
+        try:
+            results = await asyncio.gather(*(generators[output](text) for output in outputs))
+            line = {"event": "chunk", "index": index, "status": "ok", **dict(zip(outputs, results))}
+        except Exception as e:
+            logger.exception("Error processing upload chunk %s: %s", index, e)
+            line = {"event": "chunk", "index": index, "status": "error", "detail": str(e)}
+        line.update(tokens=len(text) // CHARS_PER_TOKEN, elapsed_ms=round((time.perf_counter() - started) * 1000, 1))
+        await lines.put(line)
+
+    async def produce():
+        tasks = []
+        try:
+            while True:
+                await slots.acquire()
+                # Extraction (PDF parsing especially) is CPU-bound, so it runs off the event loop.
+                text = await asyncio.to_thread(next, chunks, None)
+                if text is None:
+                    break
+                if progress["extracted"] == UPLOAD_MAX_CHUNKS:
+                    progress["truncated"] = True
+                    break
+                progress["extracted"] += 1
+                tasks.append(asyncio.create_task(process(progress["extracted"] - 1, text)))
+            await asyncio.gather(*tasks)
+        except Exception as e:
+            logger.exception("Error extracting text from %s: %s", upload.filename, e)
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await lines.put({"event": "error", "detail": "Could not read the document."})
+        finally:
+            for task in tasks:
+                task.cancel()
+            await lines.put(None)
+
+    async def events():
+        started = time.perf_counter()
+        producer = asyncio.create_task(produce())
+        try:
+            yield json.dumps({"event": "received", "filename": upload.filename, "bytes": upload.size, "mode": mode}) + "\n"
+            while (line := await lines.get()) is not None:
+                if line["event"] == "chunk":
+                    progress["completed"] += 1
+                    line.update(completed=progress["completed"], extracted=progress["extracted"])
+                    slots.release()
+                yield json.dumps(line) + "\n"
+                if await request.is_disconnected():
+                    break
+            else:
+                yield json.dumps({
+                    "event": "done",
+                    "chunks": progress["completed"],
+                    "truncated": progress["truncated"],
+                    "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+                }) + "\n"
+        finally:
+            producer.cancel()
+            await form.close()
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+def _course_index(assistant: EduMentorChatbot, course_id: str, create: bool = False):
+    if not RetrievalIndex.valid_course_id(course_id):
+        raise HTTPException(status_code=400, detail="Course IDs may only contain letters, digits, '-' and '_'.")
+    if not create and not assistant.retrieval.exists(course_id):
+        raise HTTPException(status_code=404, detail="Course not found.")
+    return assistant.retrieval.course(course_id)
+
+@app.post("/courses/{course_id}/documents")
+async def add_course_document(course_id: str, request: Request):
+    """Indexes an uploaded PDF or text file (multipart field "file") for retrieval in /chat with this course_id."""
+    assistant = require_assistant()
+    index = _course_index(assistant, course_id, create=True)
+    try:
+        form = await read_upload_form(request, UPLOAD_MAX_BYTES)
+    except UploadTooLargeError:
+        raise HTTPException(status_code=413, detail=f"File too large. The limit is {UPLOAD_MAX_BYTES // (1024 * 1024)} MB.")
+    except MultiPartException as e:
+        raise HTTPException(status_code=400, detail=e.message)
+    try:
+        upload = form_file(form, "file")
+        if upload is None:
+            raise HTTPException(status_code=400, detail="Send the document as the multipart field 'file'.")
+        kind = document_kind(upload.filename, upload.content_type)
+
+        def index_document():
+            passages = list(split_chunks(iter_text_blocks(upload.file, kind), RETRIEVAL_PASSAGE_TOKENS))
+            return index.add_document(passages, upload.filename), len(passages)
+
+        document_id, passages = await asyncio.to_thread(index_document)
+    except UnsupportedDocumentError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Error indexing document for course %s: %s", course_id, e)
+        raise HTTPException(status_code=500, detail="Failed to index document.")
+    finally:
+        await form.close()
+    return {"course_id": course_id, "document_id": document_id, "passages": passages}
+
+@app.delete("/courses/{course_id}/documents/{document_id}")
+async def delete_course_document(course_id: str, document_id: str):
+    assistant = require_assistant()
+    index = _course_index(assistant, course_id)
+    if not await asyncio.to_thread(index.delete_document, document_id):
+        raise HTTPException(status_code=404, detail="Document not found.")
+    return {"deleted": document_id}
+
+@app.get("/courses/{course_id}")
+def get_course(course_id: str):
+    assistant = require_assistant()
+    index = _course_index(assistant, course_id)
+    return {"course_id": course_id, **index.stats(), "documents": index.manifest["documents"]}
+
 @app.get("/achievements")
-def get_achievements():
-    if not assistant:
-        raise HTTPException(status_code=500, detail="Chatbot not initialized. Please check server logs.")
-    return {"achievements": assistant.achievements, "xp": assistant.xp}
+async def get_achievements(student_id: str | None = None, session_id: str | None = None):
+    """Badges and XP from the progress store. session_id is the older name of the parameter."""
+    assistant = require_assistant()
+    student_id = student_id or session_id
+    if not student_id:
+        raise HTTPException(status_code=422, detail="student_id is required.")
+    progress = await assistant.progress.get_progress(student_id)
+    return {"achievements": progress.get("achievements", []), "xp": progress.get("xp", 0)}
+
+@app.get("/sessions/stats")
+def get_session_stats():
+    assistant = require_assistant()
+    return assistant.sessions.stats()
+
+@app.get("/intent/stats")
+def get_intent_stats():
+    assistant = require_assistant()
+    return assistant.intent_classifier.stats()
+
+@app.get("/admin/cache")
+def get_cache_stats(x_admin_token: str | None = Header(default=None)):
+    assistant = require_assistant()
+    if not ADMIN_TOKEN or x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin token required.")
+    return {
+        "stats": assistant.response_cache.stats(),
+        "semantic": assistant.semantic_cache.stats(),
+        "coalescing": {
+            "in_flight": len(assistant.inflight) + len(assistant.inflight_streams),
+            "leaders": assistant.inflight.leaders + assistant.inflight_streams.leaders,
+            "followers": assistant.inflight.followers + assistant.inflight_streams.followers,
+        },
+        "template_hashes": GENERATION_TEMPLATE_HASHES,
+        "catalogue_warmup": catalogue_warmup,
+    }
+
+@app.post("/admin/cache/warm")
+async def warm_cache(x_admin_token: str | None = Header(default=None)):
+    """Runs a catalogue warm-up now and returns its outcome."""
+    require_assistant()
+    if not ADMIN_TOKEN or x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin token required.")
+    return await warm_catalogue()
+
+@app.delete("/admin/cache")
+async def invalidate_cache(method: str | None = None, prompt_hash: str | None = None,
+                           x_admin_token: str | None = Header(default=None)):
+    """Drops matching responses; other workers stop serving their memory copies within RESPONSE_CACHE_MEMORY_TTL."""
+    assistant = require_assistant()
+    if not ADMIN_TOKEN or x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin token required.")
+    if method is not None and method not in GENERATION_PROMPTS:
+        raise HTTPException(status_code=400, detail=f"Unknown method. Use one of: {', '.join(GENERATION_PROMPTS)}.")
+    return {"invalidated": await assistant.response_cache.invalidate(method=method, prompt_hash=prompt_hash)}
 
 @app.get("/challenges")
 def get_challenges():
-    if not assistant:
-        raise HTTPException(status_code=500, detail="Chatbot not initialized. Please check server logs.")
+    assistant = require_assistant()
     return {"daily": random.choice(RESOURCES["daily_challenges"]), "weekly": random.choice(RESOURCES["weekly_challenges"])}
 
 @app.get("/progress/{student_id}")
-def get_progress(student_id: str):
-    if not assistant:
-        raise HTTPException(status_code=500, detail="Chatbot not initialized. Please check server logs.")
-    return {"progress": assistant.student_progress.get(student_id, {})}
+async def get_progress(student_id: str):
+    assistant = require_assistant()
+    return {"progress": await assistant.progress.get_progress(student_id)}
+
+@app.get("/leaderboard")
+async def get_leaderboard(limit: int = 10):
+    assistant = require_assistant()
+    return {"leaderboard": await assistant.progress.leaderboard(max(1, min(limit, 100)))}
+
+@app.get("/class-report")
+async def get_class_report(student_id: List[str] = Query(default=[]), subject: str | None = None):
+    assistant = require_assistant()
+    return await assistant.progress.class_report(student_id or None, subject.lower() if subject else None)
 
 # Server Startup
 if __name__ == "__main__":
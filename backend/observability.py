@@ -0,0 +1,171 @@
+"""Metrics, structured logging and trace IDs for the EduMentor backend.
+
+The metric types are a deliberately small subset of the Prometheus client:
+label values are plain tuples, histograms use fixed buckets and a bisect per
+observation, and rendering happens only when /metrics is scraped, so the
+per-request overhead stays in the low microseconds.
+"""
+import json
+import logging
+import sys
+import uuid
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# Trace ID of the request being handled; attached to every log line.
+TRACE_ID: ContextVar[str] = ContextVar("trace_id", default="-")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], le: str | None = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if le is not None:
+        pairs.append(f'le="{le}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1.0):
+        self.values[label_values] = self.values.get(label_values, 0.0) + amount
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labels, key)} {value}" for key, value in self.values.items()]
+
+
+class Gauge:
+    """Gauge that is either set directly or read from a callback at scrape time."""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = (),
+                 callback: Callable[[], Dict[Tuple[str, ...], float]] | None = None):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.callback = callback
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, *label_values: str):
+        self.values[label_values] = value
+
+    def samples(self) -> List[str]:
+        values = self.callback() if self.callback else self.values
+        return [f"{self.name}{_format_labels(self.labels, key)} {value}" for key, value in values.items()]
+
+
+class Histogram:
+    """Fixed-bucket histogram; buckets are stored non-cumulatively and summed when rendered."""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [bucket counts..., +Inf count, sum]
+        self.values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *label_values: str):
+        series = self.values.get(label_values)
+        if series is None:
+            series = self.values[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, series in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, str(bound))} {cumulative}")
+            cumulative += series[len(self.buckets)]
+            lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, '+Inf')} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {series[-1]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Holds every metric and renders the Prometheus text exposition format."""
+    def __init__(self):
+        self.metrics: Dict[str, Counter | Gauge | Histogram] = {}
+
+    def _register(self, metric):
+        if metric.name in self.metrics:
+            return self.metrics[metric.name]
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labels))
+
+    def gauge(self, name: str, documentation: str, labels: Iterable[str] = (), callback=None) -> Gauge:
+        return self._register(Gauge(name, documentation, labels, callback))
+
+    def histogram(self, name: str, documentation: str, labels: Iterable[str] = (),
+                  buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labels, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+_RESERVED_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with the current trace ID and any `extra` fields."""
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "trace_id": TRACE_ID.get(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED_RECORD_FIELDS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def configure_logging(level: str = "INFO") -> logging.Logger:
+    """Installs the JSON formatter on the `edumentor` logger and returns it."""
+    logger = logging.getLogger("edumentor")
+    if not logger.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(JsonFormatter())
+        logger.addHandler(handler)
+        logger.propagate = False
+    logger.setLevel(level.upper())
+    return logger
+
@@ -0,0 +1,455 @@
+"""Persistent student progress (XP, badges, attempts, per-topic accuracy) and generated tests.
+
+ProgressStore is the interface the chatbot talks to; SQLiteProgressStore is
+the local default. Writes are queued and applied in batches: in "sync" mode
+every caller waits for the transaction that contains its write (group
+commit), in "write_behind" mode callers return immediately and the batch is
+flushed every flush_interval seconds. Increments are applied with UPSERTs,
+so several uvicorn workers can share one database file safely.
+
+RedisProgressStore keeps the same data in the Redis server behind a
+redis:// SHARED_STATE_URL, for workers spread over several hosts. Every
+increment is a single atomic Redis command, and the writes of one call are
+sent as one MULTI/EXEC transaction.
+"""
+import asyncio
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Tuple
+
+Operation = Tuple[str, tuple]
+# (correct, answered, attempted) questions of one topic.
+TopicResult = Tuple[int, int, int]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS students (
+    student_id TEXT PRIMARY KEY,
+    xp INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS students_xp ON students (xp DESC);
+CREATE TABLE IF NOT EXISTS achievements (
+    student_id TEXT NOT NULL,
+    badge TEXT NOT NULL,
+    awarded_at REAL NOT NULL,
+    PRIMARY KEY (student_id, badge)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS subject_progress (
+    student_id TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    weak_areas TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (student_id, subject)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS subject_progress_subject ON subject_progress (subject);
+CREATE TABLE IF NOT EXISTS topic_progress (
+    student_id TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    correct INTEGER NOT NULL DEFAULT 0,
+    answered INTEGER NOT NULL DEFAULT 0,
+    attempted INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (student_id, subject, topic)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS tests (
+    test_id TEXT PRIMARY KEY,
+    subject TEXT NOT NULL,
+    body TEXT NOT NULL,
+    created_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS test_rewards (
+    student_id TEXT NOT NULL,
+    test_id TEXT NOT NULL,
+    awarded_at REAL NOT NULL,
+    PRIMARY KEY (student_id, test_id)
+) WITHOUT ROWID;
+"""
+
+ADD_XP = (
+    "INSERT INTO students (student_id, xp, updated_at) VALUES (?, ?, ?) "
+    "ON CONFLICT (student_id) DO UPDATE SET xp = xp + excluded.xp, updated_at = excluded.updated_at"
+)
+ADD_BADGE = "INSERT OR IGNORE INTO achievements (student_id, badge, awarded_at) VALUES (?, ?, ?)"
+ADD_ATTEMPT = (
+    "INSERT INTO subject_progress (student_id, subject, attempts, weak_areas, updated_at) VALUES (?, ?, 1, ?, ?) "
+    "ON CONFLICT (student_id, subject) DO UPDATE SET attempts = attempts + 1, "
+    "weak_areas = excluded.weak_areas, updated_at = excluded.updated_at"
+)
+
+ADD_TOPIC_RESULT = (
+    "INSERT INTO topic_progress (student_id, subject, topic, correct, answered, attempted) VALUES (?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT (student_id, subject, topic) DO UPDATE SET correct = correct + excluded.correct, "
+    "answered = answered + excluded.answered, attempted = attempted + excluded.attempted"
+)
+ADD_TEST = "INSERT OR IGNORE INTO tests (test_id, subject, body, created_at) VALUES (?, ?, ?, ?)"
+CLAIM_TEST_REWARD = "INSERT OR IGNORE INTO test_rewards (student_id, test_id, awarded_at) VALUES (?, ?, ?)"
+
+
+class ProgressStore:
+    """Interface for progress backends."""
+    async def award(self, student_id: str, xp: int, badge: str | None = None):
+        raise NotImplementedError
+
+    async def record_attempt(self, student_id: str, subject: str, weak_areas: str):
+        raise NotImplementedError
+
+    async def record_topic_results(self, student_id: str, subject: str,
+                                   results: Dict[str, TopicResult]) -> Dict[str, TopicResult]:
+        """Adds (correct, answered, attempted) per topic and returns the student's cumulative totals for the subject."""
+        raise NotImplementedError
+
+    async def claim_test_reward(self, student_id: str, test_id: str) -> bool:
+        """True the first time student_id submits test_id, False on every later submission."""
+        raise NotImplementedError
+
+    async def save_test(self, test_id: str, subject: str, body: str):
+        raise NotImplementedError
+
+    async def get_test(self, test_id: str) -> str | None:
+        raise NotImplementedError
+
+    async def get_progress(self, student_id: str) -> Dict:
+        raise NotImplementedError
+
+    async def leaderboard(self, limit: int = 10) -> List[Dict]:
+        raise NotImplementedError
+
+    async def class_report(self, student_ids: List[str] | None = None, subject: str | None = None) -> Dict:
+        raise NotImplementedError
+
+    async def flush(self):
+        """Writes out anything buffered."""
+
+    async def close(self):
+        await self.flush()
+
+
+class SQLiteProgressStore(ProgressStore):
+    """SQLite-backed store with group-commit or write-behind batching."""
+    def __init__(self, path: str, write_behind: bool = False, flush_interval: float = 0.05, max_batch: int = 1000):
+        self.path = path
+        self.write_behind = write_behind
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA busy_timeout=5000")
+        self._db.executescript(SCHEMA)
+        if "attempted" not in {row[1] for row in self._db.execute("PRAGMA table_info(topic_progress)")}:
+            self._db.execute("ALTER TABLE topic_progress ADD COLUMN attempted INTEGER NOT NULL DEFAULT 0")
+        self._db_lock = threading.Lock()
+        self._pending: List[Operation] = []
+        self._waiters: List[asyncio.Future] = []
+        self._flush_lock: asyncio.Lock | None = None
+        self._flush_task: asyncio.Task | None = None
+        self.batches = 0
+        self.operations = 0
+
+    def _apply(self, operations: List[Operation]):
+        """Applies a batch of writes in one transaction."""
+        with self._db_lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                for sql, params in operations:
+                    self._db.execute(sql, params)
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def _query(self, sql: str, params: Iterable = ()) -> List[tuple]:
+        with self._db_lock:
+            return self._db.execute(sql, tuple(params)).fetchall()
+
+    async def _enqueue(self, operations: List[Operation]):
+        self._pending.extend(operations)
+        waiter = None
+        if not self.write_behind:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_soon())
+        if waiter is not None:
+            await waiter
+
+    async def _flush_soon(self):
+        if self.write_behind and len(self._pending) < self.max_batch:
+            await asyncio.sleep(self.flush_interval)
+        else:
+            # Yield once so writers arriving in the same tick share the transaction.
+            await asyncio.sleep(0)
+        await self.flush()
+
+    async def flush(self):
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            operations, waiters = self._pending, self._waiters
+            self._pending, self._waiters = [], []
+            if not operations:
+                return
+            try:
+                await asyncio.to_thread(self._apply, operations)
+            except Exception as e:
+                if not waiters:
+                    # Write-behind callers are gone; keep the operations for the next flush.
+                    self._pending[:0] = operations
+                    raise
+                for waiter in waiters:
+                    if not waiter.done():
+                        waiter.set_exception(e)
+                return
+            self.batches += 1
+            self.operations += len(operations)
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_result(None)
+
+    async def award(self, student_id: str, xp: int, badge: str | None = None):
+        now = time.time()
+        operations = [(ADD_XP, (student_id, xp, now))]
+        if badge:
+            operations.append((ADD_BADGE, (student_id, badge, now)))
+        await self._enqueue(operations)
+
+    async def record_attempt(self, student_id: str, subject: str, weak_areas: str):
+        await self._enqueue([(ADD_ATTEMPT, (student_id, subject, weak_areas, time.time()))])
+
+    async def record_topic_results(self, student_id: str, subject: str,
+                                   results: Dict[str, TopicResult]) -> Dict[str, TopicResult]:
+        operations = [(ADD_TOPIC_RESULT, (student_id, subject, topic, *counts)) for topic, counts in results.items()]
+
+        async def committed_totals() -> Dict[str, TopicResult]:
+            rows = await asyncio.to_thread(
+                self._query,
+                "SELECT topic, correct, answered, attempted FROM topic_progress WHERE student_id = ? AND subject = ?",
+                (student_id, subject),
+            )
+            return {topic: tuple(counts) for topic, *counts in rows}
+
+        if not self.write_behind:
+            await self._enqueue(operations)
+            return await committed_totals()
+        # Write-behind: read before queueing, then add this result, so the totals never count it twice.
+        totals = await committed_totals()
+        await self._enqueue(operations)
+        for topic, counts in results.items():
+            previous = totals.get(topic, (0, 0, 0))
+            totals[topic] = tuple(total + count for total, count in zip(previous, counts))
+        return totals
+
+    async def claim_test_reward(self, student_id: str, test_id: str) -> bool:
+        # Not batched: the caller needs the outcome, and the primary key makes the claim atomic across workers.
+        def claim() -> bool:
+            with self._db_lock:
+                return self._db.execute(CLAIM_TEST_REWARD, (student_id, test_id, time.time())).rowcount == 1
+
+        return await asyncio.to_thread(claim)
+
+    async def save_test(self, test_id: str, subject: str, body: str):
+        await self._enqueue([(ADD_TEST, (test_id, subject, body, time.time()))])
+
+    async def get_test(self, test_id: str) -> str | None:
+        if self._pending:
+            await self.flush()
+        rows = await asyncio.to_thread(self._query, "SELECT body FROM tests WHERE test_id = ?", (test_id,))
+        return rows[0][0] if rows else None
+
+    async def get_progress(self, student_id: str) -> Dict:
+        """Primary-key lookups only, so cost does not grow with the number of students."""
+        if self._pending:
+            await self.flush()
+
+        def read():
+            with self._db_lock:
+                xp = self._db.execute("SELECT xp FROM students WHERE student_id = ?", (student_id,)).fetchone()
+                badges = self._db.execute(
+                    "SELECT badge FROM achievements WHERE student_id = ? ORDER BY awarded_at", (student_id,)
+                ).fetchall()
+                subjects = self._db.execute(
+                    "SELECT subject, attempts, weak_areas FROM subject_progress WHERE student_id = ?", (student_id,)
+                ).fetchall()
+            return xp, badges, subjects
+
+        xp, badges, subjects = await asyncio.to_thread(read)
+        if xp is None and not subjects:
+            return {}
+        progress: Dict = {"xp": xp[0] if xp else 0, "achievements": [badge for (badge,) in badges]}
+        for subject, attempts, weak_areas in subjects:
+            progress[subject] = {"attempts": attempts, "weak_areas": weak_areas}
+        return progress
+
+    async def leaderboard(self, limit: int = 10) -> List[Dict]:
+        if self._pending:
+            await self.flush()
+        rows = await asyncio.to_thread(
+            self._query, "SELECT student_id, xp FROM students ORDER BY xp DESC LIMIT ?", (limit,)
+        )
+        return [{"rank": rank, "student_id": student_id, "xp": xp} for rank, (student_id, xp) in enumerate(rows, 1)]
+
+    async def class_report(self, student_ids: List[str] | None = None, subject: str | None = None) -> Dict:
+        """Per-student XP and attempts plus per-subject aggregates, in one query."""
+        if self._pending:
+            await self.flush()
+        clauses, params = [], []
+        if student_ids:
+            clauses.append(f"s.student_id IN ({', '.join('?' * len(student_ids))})")
+            params.extend(student_ids)
+        subject_join = "LEFT JOIN subject_progress p ON p.student_id = s.student_id"
+        if subject:
+            subject_join += " AND p.subject = ?"
+            params.insert(0, subject)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = await asyncio.to_thread(
+            self._query,
+            f"SELECT s.student_id, s.xp, p.subject, p.attempts, p.weak_areas FROM students s {subject_join} {where} "
+            "ORDER BY s.student_id",
+            params,
+        )
+        students: Dict[str, Dict] = {}
+        subjects: Dict[str, Dict] = {}
+        for student_id, xp, row_subject, attempts, weak_areas in rows:
+            student = students.setdefault(student_id, {"student_id": student_id, "xp": xp, "subjects": {}})
+            if row_subject is None:
+                continue
+            student["subjects"][row_subject] = {"attempts": attempts, "weak_areas": weak_areas}
+            summary = subjects.setdefault(row_subject, {"students": 0, "attempts": 0, "weak_areas": {}})
+            summary["students"] += 1
+            summary["attempts"] += attempts
+            if weak_areas:
+                summary["weak_areas"][weak_areas] = summary["weak_areas"].get(weak_areas, 0) + 1
+        return {"students": list(students.values()), "subjects": subjects}
+
+    async def close(self):
+        await self.flush()
+        with self._db_lock:
+            self._db.close()
+
+    def stats(self) -> Dict:
+        return {
+            "mode": "write_behind" if self.write_behind else "sync",
+            "pending": len(self._pending),
+            "batches": self.batches,
+            "operations": self.operations,
+        }
+
+
+class RedisProgressStore(ProgressStore):
+    """Redis-backed store sharing progress and served tests between hosts.
+
+    Keys (under prefix): "xp" is a sorted set of student IDs by XP, "badges:<student>" a sorted set of badges by
+    award time, "subjects:<student>" a hash of attempts and weak areas per subject, "topics:<student>:<subject>"
+    a hash of correct, answered and attempted counts per topic, "reward:<student>:<test>" marks a recorded test
+    submission, and "test:<test>" holds a served test.
+    """
+    def __init__(self, client, prefix: str = "progress:"):
+        self.client = client
+        self.prefix = prefix
+        self.operations = 0
+
+    def _key(self, *parts: str) -> str:
+        return self.prefix + ":".join(parts)
+
+    async def award(self, student_id: str, xp: int, badge: str | None = None):
+        pipeline = self.client.pipeline(transaction=True)
+        pipeline.zincrby(self._key("xp"), xp, student_id)
+        if badge:
+            pipeline.zadd(self._key("badges", student_id), {badge: time.time()}, nx=True)
+        await pipeline.execute()
+        self.operations += 1
+
+    async def record_attempt(self, student_id: str, subject: str, weak_areas: str):
+        pipeline = self.client.pipeline(transaction=True)
+        pipeline.hincrby(self._key("subjects", student_id), f"{subject}:attempts", 1)
+        pipeline.hset(self._key("subjects", student_id), f"{subject}:weak_areas", weak_areas)
+        await pipeline.execute()
+        self.operations += 1
+
+    async def record_topic_results(self, student_id: str, subject: str,
+                                   results: Dict[str, TopicResult]) -> Dict[str, TopicResult]:
+        key = self._key("topics", student_id, subject)
+        counters = ("correct", "answered", "attempted")
+        pipeline = self.client.pipeline(transaction=True)
+        for topic, counts in results.items():
+            for counter, count in zip(counters, counts):
+                pipeline.hincrby(key, f"{topic}:{counter}", count)
+        pipeline.hgetall(key)
+        fields = (await pipeline.execute())[-1]
+        self.operations += 1
+        totals: Dict[str, list] = {}
+        for field, value in fields.items():
+            topic, _, counter = field.rpartition(":")
+            totals.setdefault(topic, [0, 0, 0])[counters.index(counter)] = int(value)
+        return {topic: tuple(counts) for topic, counts in totals.items()}
+
+    async def claim_test_reward(self, student_id: str, test_id: str) -> bool:
+        return bool(await self.client.set(self._key("reward", student_id, test_id), time.time(), nx=True))
+
+    async def save_test(self, test_id: str, subject: str, body: str):
+        await self.client.set(self._key("test", test_id), body, nx=True)
+
+    async def get_test(self, test_id: str) -> str | None:
+        return await self.client.get(self._key("test", test_id))
+
+    @staticmethod
+    def _subjects(fields: Dict[str, str]) -> Dict[str, Dict]:
+        subjects: Dict[str, Dict] = {}
+        for field, value in fields.items():
+            subject, _, name = field.rpartition(":")
+            progress = subjects.setdefault(subject, {"attempts": 0, "weak_areas": None})
+            progress[name] = int(value) if name == "attempts" else value
+        return subjects
+
+    async def get_progress(self, student_id: str) -> Dict:
+        pipeline = self.client.pipeline(transaction=False)
+        pipeline.zscore(self._key("xp"), student_id)
+        pipeline.zrange(self._key("badges", student_id), 0, -1)
+        pipeline.hgetall(self._key("subjects", student_id))
+        xp, badges, fields = await pipeline.execute()
+        subjects = self._subjects(fields)
+        if xp is None and not subjects:
+            return {}
+        return {"xp": int(xp or 0), "achievements": list(badges), **subjects}
+
+    async def leaderboard(self, limit: int = 10) -> List[Dict]:
+        rows = await self.client.zrevrange(self._key("xp"), 0, limit - 1, withscores=True)
+        return [
+            {"rank": rank, "student_id": student_id, "xp": int(xp)} for rank, (student_id, xp) in enumerate(rows, 1)
+        ]
+
+    async def class_report(self, student_ids: List[str] | None = None, subject: str | None = None) -> Dict:
+        """Per-student XP and attempts plus per-subject aggregates; two round trips whatever the class size."""
+        if student_ids:
+            pipeline = self.client.pipeline(transaction=False)
+            for student_id in student_ids:
+                pipeline.zscore(self._key("xp"), student_id)
+            scores = await pipeline.execute()
+            ranked = [(student_id, xp) for student_id, xp in zip(student_ids, scores) if xp is not None]
+        else:
+            ranked = await self.client.zrange(self._key("xp"), 0, -1, withscores=True)
+        ranked = sorted(ranked)
+        pipeline = self.client.pipeline(transaction=False)
+        for student_id, _ in ranked:
+            pipeline.hgetall(self._key("subjects", student_id))
+        students: List[Dict] = []
+        subjects: Dict[str, Dict] = {}
+        for (student_id, xp), fields in zip(ranked, await pipeline.execute()):
+            student = {"student_id": student_id, "xp": int(xp), "subjects": {}}
+            students.append(student)
+            for row_subject, progress in self._subjects(fields).items():
+                if subject and row_subject != subject:
+                    continue
+                student["subjects"][row_subject] = progress
+                summary = subjects.setdefault(row_subject, {"students": 0, "attempts": 0, "weak_areas": {}})
+                summary["students"] += 1
+                summary["attempts"] += progress["attempts"]
+                if progress["weak_areas"]:
+                    weak = progress["weak_areas"]
+                    summary["weak_areas"][weak] = summary["weak_areas"].get(weak, 0) + 1
+        return {"students": students, "subjects": subjects}
+
+    def stats(self) -> Dict:
+        return {"mode": "redis", "pending": 0, "operations": self.operations}
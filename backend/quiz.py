@@ -0,0 +1,116 @@
+"""Structured practice tests: validation, answer checking and weak areas.
+
+The test generator asks the LLM for JSON. parse_test validates that reply
+once and turns it into a compact canonical form whose hash is the test ID.
+That canonical form is what gets cached and persisted. Students get
+public_test, which has no answer key. grade scores a submission locally,
+so grading never calls the upstream.
+"""
+import hashlib
+import json
+from typing import Dict, List, Sequence
+
+OPTION_LETTERS = "ABCD"
+
+
+class InvalidTestError(ValueError):
+    """Raised when a generated test is not valid structured JSON."""
+
+
+def _text(value, field: str, index: int) -> str:
+    if not isinstance(value, str) or not value.strip():
+        raise InvalidTestError(f"question {index + 1}: {field} must be a non-empty string")
+    return " ".join(value.split())
+
+
+def parse_test(reply: str, subject: str, expected_questions: int) -> Dict:
+    """Validates an LLM reply and returns the canonical test (with test_id), or raises InvalidTestError."""
+    # Models sometimes wrap JSON in a code fence or a sentence; take the outermost object.
+    start, end = reply.find("{"), reply.rfind("}")
+    if start < 0 or end < start:
+        raise InvalidTestError("reply contains no JSON object")
+    try:
+        data = json.loads(reply[start:end + 1])
+    except json.JSONDecodeError as e:
+        raise InvalidTestError(f"reply is not valid JSON: {e}") from e
+    raw_questions = data.get("questions") if isinstance(data, dict) else None
+    if not isinstance(raw_questions, list) or len(raw_questions) != expected_questions:
+        raise InvalidTestError(f"expected {expected_questions} questions")
+
+    questions = []
+    for index, raw in enumerate(raw_questions):
+        if not isinstance(raw, dict):
+            raise InvalidTestError(f"question {index + 1} is not an object")
+        options = raw.get("options")
+        if not isinstance(options, list) or len(options) != len(OPTION_LETTERS):
+            raise InvalidTestError(f"question {index + 1}: expected {len(OPTION_LETTERS)} options")
+        answer = raw.get("answer")
+        letter = answer.strip().upper()[:1] if isinstance(answer, str) else ""
+        if not letter or letter not in OPTION_LETTERS:
+            raise InvalidTestError(f"question {index + 1}: answer must be one of {', '.join(OPTION_LETTERS)}")
+        questions.append({
+            "topic": _text(raw.get("topic"), "topic", index).lower(),
+            "question": _text(raw.get("question"), "question", index),
+            "options": [_text(option, "option", index) for option in options],
+            "answer": letter,
+            "explanation": _text(raw.get("explanation"), "explanation", index),
+        })
+    test = {"subject": subject, "questions": questions}
+    test["test_id"] = test_id(test)
+    return test
+
+
+def test_id(test: Dict) -> str:
+    """Content address of a canonical test, so identical tests share one ID."""
+    canonical = json.dumps({"subject": test["subject"], "questions": test["questions"]}, sort_keys=True)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:20]
+
+
+def public_test(test: Dict) -> Dict:
+    """The test as shown to students: no answers or explanations."""
+    return {
+        "test_id": test["test_id"],
+        "subject": test["subject"],
+        "questions": [
+            {"topic": question["topic"], "question": question["question"],
+             "options": dict(zip(OPTION_LETTERS, question["options"]))}
+            for question in test["questions"]
+        ],
+    }
+
+
+def grade(test: Dict, answers: Sequence[str | None]) -> Dict:
+    """Scores answers (one letter or None per question, in order) and breaks the score down by topic.
+
+    Per topic, "attempted" counts every question and "answered" only those with a selected option.
+    """
+    results: List[Dict] = []
+    topics: Dict[str, List[int]] = {}
+    for index, question in enumerate(test["questions"]):
+        selected = answers[index] if index < len(answers) else None
+        selected = selected.strip().upper()[:1] if isinstance(selected, str) and selected.strip() else None
+        correct = selected == question["answer"]
+        stats = topics.setdefault(question["topic"], [0, 0, 0])
+        stats[0] += correct
+        stats[1] += selected is not None
+        stats[2] += 1
+        results.append({"selected": selected, "answer": question["answer"], "correct": correct,
+                        "explanation": question["explanation"]})
+    score = sum(result["correct"] for result in results)
+    return {
+        "test_id": test["test_id"],
+        "score": score,
+        "total": len(results),
+        "percent": round(100 * score / len(results), 1) if results else 0.0,
+        "results": results,
+        "topics": {
+            topic: {"correct": correct, "answered": answered, "attempted": attempted}
+            for topic, (correct, answered, attempted) in topics.items()
+        },
+    }
+
+
+def weak_areas(topic_stats: Dict[str, tuple], threshold: float, limit: int = 3) -> List[str]:
+    """Topics whose cumulative accuracy (correct / answered) is below threshold, weakest first."""
+    scored = [(stats[0] / stats[1], topic) for topic, stats in topic_stats.items() if stats[1]]
+    return [topic for accuracy, topic in sorted(scored) if accuracy < threshold][:limit]
@@ -0,0 +1,231 @@
+"""Client-side protection around upstream Groq calls.
+
+Three layers, applied in this order for every completion:
+
+- RateLimiter: token buckets sized to the account quota (requests/min and
+  tokens/min), so we queue locally instead of collecting 429s.
+- CircuitBreaker: fails fast while the upstream is down, then lets a single
+  probe through to test recovery.
+- Retries with full-jitter exponential backoff for transient errors,
+  honouring Retry-After when the server sends one.
+"""
+import asyncio
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Dict, TypeVar
+
+from groq import APIConnectionError, APIStatusError, APITimeoutError, RateLimitError
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling upstream while the circuit breaker is open."""
+
+
+class LocalRateLimitError(Exception):
+    """Raised when the local quota would make the caller wait longer than allowed."""
+
+
+class TokenBucket:
+    """Continuously refilling bucket holding up to `capacity` units, refilled at capacity per `period` seconds."""
+    def __init__(self, capacity: float, period: float = 60.0):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.level = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` units are available (0 if they are available now)."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float):
+        self.level -= amount
+
+
+class RateLimiter:
+    """Request and token buckets matching the upstream per-minute quota."""
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float, max_wait: float = 10.0):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_wait = max_wait
+        self._lock = asyncio.Lock()
+        self.throttled = 0
+        self.rejected = 0
+
+    async def acquire(self, estimated_tokens: int):
+        """Waits until both buckets can cover one request of estimated_tokens, then debits them."""
+        async with self._lock:
+            now = time.monotonic()
+            wait = max(self.requests.wait_time(1, now), self.tokens.wait_time(estimated_tokens, now))
+            if wait > self.max_wait:
+                self.rejected += 1
+                raise LocalRateLimitError(f"local quota exhausted for {wait:.1f}s")
+            if wait > 0:
+                self.throttled += 1
+                # Holding the lock while sleeping keeps waiters in FIFO order.
+                await asyncio.sleep(wait)
+                now = time.monotonic()
+                self.requests.wait_time(1, now)
+                self.tokens.wait_time(estimated_tokens, now)
+            self.requests.take(1)
+            self.tokens.take(estimated_tokens)
+
+    def settle(self, estimated_tokens: int, actual_tokens: int):
+        """Corrects the token bucket once the real usage is known."""
+        self.tokens.take(actual_tokens - estimated_tokens)
+
+
+class CircuitBreaker:
+    """Classic closed / open / half-open breaker driven by consecutive upstream failures."""
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.times_opened = 0
+        self.rejected = 0
+
+    def before_call(self):
+        """Raises CircuitOpenError unless a call may go upstream right now."""
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                self.rejected += 1
+                raise CircuitOpenError("upstream circuit is open")
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN:
+            if self.probe_in_flight:
+                self.rejected += 1
+                raise CircuitOpenError("upstream circuit is half-open; probe in flight")
+            self.probe_in_flight = True
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.probe_in_flight = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        self.probe_in_flight = False
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.times_opened += 1
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def record_cancelled(self):
+        """The caller gave up (timeout or disconnect) before the call finished; let another probe through."""
+        self.probe_in_flight = False
+
+    def record_neutral(self):
+        """The call finished without saying anything about upstream health (e.g. a 429 or a 400)."""
+        self.probe_in_flight = False
+        if self.state == self.HALF_OPEN:
+            self.state = self.CLOSED
+
+
+def is_transient(error: Exception) -> bool:
+    """Errors worth retrying: throttling, timeouts, dropped connections and 5xx responses."""
+    if isinstance(error, (RateLimitError, APITimeoutError, APIConnectionError)):
+        return True
+    return isinstance(error, APIStatusError) and error.status_code >= 500
+
+
+def is_upstream_failure(error: Exception) -> bool:
+    """Errors that mean the upstream is unhealthy. A 429 means it is up but busy, so it doesn't trip the breaker."""
+    return is_transient(error) and not isinstance(error, RateLimitError)
+
+
+def retry_after_seconds(error: Exception) -> float | None:
+    """Reads Retry-After (seconds or HTTP date) or retry-after-ms from an API error response."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+class UpstreamGuard:
+    """Runs upstream calls through the rate limiter, circuit breaker and retry policy."""
+    def __init__(self, rate_limiter: RateLimiter, breaker: CircuitBreaker, max_retries: int = 3,
+                 backoff_base: float = 0.5, backoff_max: float = 8.0):
+        self.rate_limiter = rate_limiter
+        self.breaker = breaker
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retries = 0
+        self.failures = 0
+
+    def backoff(self, attempt: int, error: Exception) -> float:
+        """Full-jitter exponential delay, never shorter than the server's Retry-After."""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        retry_after = retry_after_seconds(error)
+        return max(delay, min(retry_after, self.backoff_max * 4)) if retry_after is not None else delay
+
+    async def run(self, call: Callable[[], Awaitable[T]], estimated_tokens: int, max_retries: int | None = None) -> T:
+        """Calls upstream, retrying transient failures. Raises the last error if every attempt fails.
+
+        max_retries overrides the guard's default, e.g. 0 when the caller has a fallback of its own.
+        """
+        max_retries = self.max_retries if max_retries is None else max_retries
+        for attempt in range(max_retries + 1):
+            self.breaker.before_call()
+            try:
+                await self.rate_limiter.acquire(estimated_tokens)
+                result = await call()
+            except (asyncio.CancelledError, LocalRateLimitError):
+                self.breaker.record_cancelled()
+                raise
+            except Exception as e:
+                if is_upstream_failure(e):
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_neutral()
+                if not is_transient(e) or attempt == max_retries:
+                    self.failures += 1
+                    raise
+                self.retries += 1
+                await asyncio.sleep(self.backoff(attempt, e))
+                continue
+            self.breaker.record_success()
+            return result
+
+    def stats(self) -> Dict[str, float | str]:
+        return {
+            "breaker_state": self.breaker.state,
+            "breaker_consecutive_failures": self.breaker.consecutive_failures,
+            "breaker_times_opened": self.breaker.times_opened,
+            "breaker_rejected": self.breaker.rejected,
+            "retries": self.retries,
+            "failures": self.failures,
+            "rate_limit_throttled": self.rate_limiter.throttled,
+            "rate_limit_rejected": self.rate_limiter.rejected,
+            "request_tokens_available": round(self.rate_limiter.requests.level, 2),
+            "token_budget_available": round(self.rate_limiter.tokens.level, 1),
+        }
@@ -0,0 +1,310 @@
+"""Per-course BM25 retrieval over uploaded course material.
+
+Each course lives in its own directory as a set of immutable segments plus a
+JSON manifest. A segment is a handful of .npy arrays (an inverted index
+keyed by CRC32 term hashes, term frequencies and passage lengths) and a flat
+UTF-8 text file; all of them are opened with mmap, so loading an index costs
+a few page faults rather than a parse. Adding a document writes a new
+segment; deleting one only records a tombstone in the manifest. Once there
+are too many segments or too many dead passages, everything is merged into a
+single segment without re-tokenizing.
+"""
+import json
+import math
+import os
+import shutil
+import threading
+import time
+import uuid
+import zlib
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+from semantic_cache import normalize_words
+
+K1 = 1.2
+B = 0.75
+SEGMENT_FILES = ("terms", "offsets", "postings", "tfs", "lengths", "documents", "text_offsets")
+
+
+def term_hashes(text: str) -> List[int]:
+    return [zlib.crc32(word.encode()) for word in normalize_words(text)]
+
+
+def _save(directory: str, name: str, array: np.ndarray):
+    np.save(os.path.join(directory, f"{name}.npy"), array)
+
+
+def write_segment(directory: str, passages: List[str], documents: np.ndarray):
+    """Builds the inverted index for passages (documents[i] is passage i's index in the segment's document list)."""
+    os.makedirs(directory)
+    hashes, ids, tfs, lengths = [], [], [], np.zeros(len(passages), dtype=np.int32)
+    for passage_id, passage in enumerate(passages):
+        counts = Counter(term_hashes(passage))
+        lengths[passage_id] = sum(counts.values())
+        hashes.extend(counts)
+        ids.extend([passage_id] * len(counts))
+        tfs.extend(counts.values())
+    encoded = [passage.encode("utf-8") for passage in passages]
+    text_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(data) for data in encoded], out=text_offsets[1:])
+    with open(os.path.join(directory, "text.bin"), "wb") as text:
+        for data in encoded:
+            text.write(data)
+    _write_postings(directory, np.array(hashes, dtype=np.uint32), np.array(ids, dtype=np.int32),
+                    np.array(tfs, dtype=np.float32), lengths, documents.astype(np.int32), text_offsets)
+
+
+def _write_postings(directory: str, hashes: np.ndarray, ids: np.ndarray, tfs: np.ndarray, lengths: np.ndarray,
+                    documents: np.ndarray, text_offsets: np.ndarray):
+    order = np.lexsort((ids, hashes))
+    hashes = hashes[order]
+    terms, starts = np.unique(hashes, return_index=True)
+    _save(directory, "terms", terms)
+    _save(directory, "offsets", np.append(starts, len(hashes)).astype(np.int64))
+    _save(directory, "postings", ids[order])
+    _save(directory, "tfs", tfs[order])
+    _save(directory, "lengths", lengths)
+    _save(directory, "documents", documents)
+    _save(directory, "text_offsets", text_offsets)
+
+
+class Segment:
+    """Read-only, memory-mapped view of one segment directory."""
+    def __init__(self, directory: str, document_ids: List[str]):
+        self.directory = directory
+        self.document_ids = document_ids
+        for name in SEGMENT_FILES:
+            setattr(self, name, np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r"))
+        size = int(self.text_offsets[-1])
+        self.text = np.memmap(os.path.join(directory, "text.bin"), dtype=np.uint8, mode="r") if size else None
+        self.count = len(self.lengths)
+        self.total_length = int(self.lengths.sum())
+        self.live = np.ones(self.count, dtype=bool)
+
+    def apply_tombstones(self, deleted: set):
+        dead = [index for index, document_id in enumerate(self.document_ids) if document_id in deleted]
+        self.live = ~np.isin(self.documents, dead) if dead else np.ones(self.count, dtype=bool)
+
+    def postings_for(self, term: int) -> Tuple[int, int]:
+        index = int(np.searchsorted(self.terms, term))
+        if index < len(self.terms) and self.terms[index] == term:
+            return int(self.offsets[index]), int(self.offsets[index + 1])
+        return 0, 0
+
+    def passage(self, passage_id: int) -> str:
+        start, end = int(self.text_offsets[passage_id]), int(self.text_offsets[passage_id + 1])
+        return bytes(self.text[start:end]).decode("utf-8")
+
+
+class CourseIndex:
+    """BM25 index for one course, safe to share between threads and, through the manifest, processes."""
+    def __init__(self, directory: str, max_segments: int = 8, max_dead_ratio: float = 0.25):
+        self.directory = directory
+        self.max_segments = max_segments
+        self.max_dead_ratio = max_dead_ratio
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._manifest_mtime = None
+        self.manifest: Dict = {"segments": [], "documents": {}, "deleted": []}
+        self.segments: List[Segment] = []
+        self._reload()
+
+    @property
+    def _manifest_path(self) -> str:
+        return os.path.join(self.directory, "manifest.json")
+
+    def _reload(self):
+        """Re-opens segments if another process (or thread) has rewritten the manifest."""
+        try:
+            mtime = os.stat(self._manifest_path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._manifest_mtime:
+            return
+        with open(self._manifest_path) as manifest_file:
+            manifest = json.load(manifest_file)
+        opened = {segment.directory: segment for segment in self.segments}
+        deleted = set(manifest["deleted"])
+        segments = []
+        for entry in manifest["segments"]:
+            path = os.path.join(self.directory, entry["name"])
+            segment = opened.get(path) or Segment(path, entry["documents"])
+            segment.apply_tombstones(deleted)
+            segments.append(segment)
+        self.manifest, self.segments, self._manifest_mtime = manifest, segments, mtime
+
+    def _commit(self, manifest: Dict):
+        temporary = f"{self._manifest_path}.{uuid.uuid4().hex}.tmp"
+        with open(temporary, "w") as manifest_file:
+            json.dump(manifest, manifest_file)
+        os.replace(temporary, self._manifest_path)
+        self._reload()
+
+    def add_document(self, passages: List[str], name: str | None = None) -> str:
+        """Indexes one document's passages as a new segment and returns its document ID."""
+        document_id = uuid.uuid4().hex[:12]
+        segment_name = f"seg-{uuid.uuid4().hex[:12]}"
+        write_segment(os.path.join(self.directory, segment_name), passages, np.zeros(len(passages)))
+        with self._lock:
+            self._reload()
+            manifest = json.loads(json.dumps(self.manifest))
+            manifest["segments"].append({"name": segment_name, "documents": [document_id]})
+            manifest["documents"][document_id] = {"name": name, "passages": len(passages), "added_at": time.time()}
+            self._commit(manifest)
+        self._maybe_compact()
+        return document_id
+
+    def delete_document(self, document_id: str) -> bool:
+        """Tombstones a document; its passages stop matching immediately and are dropped at the next merge."""
+        with self._lock:
+            self._reload()
+            if document_id not in self.manifest["documents"]:
+                return False
+            manifest = json.loads(json.dumps(self.manifest))
+            del manifest["documents"][document_id]
+            manifest["deleted"].append(document_id)
+            self._commit(manifest)
+        self._maybe_compact()
+        return True
+
+    def _maybe_compact(self):
+        total = sum(segment.count for segment in self.segments)
+        dead = sum(int((~segment.live).sum()) for segment in self.segments)
+        if len(self.segments) > self.max_segments or (total and dead / total > self.max_dead_ratio):
+            self.compact()
+
+    def compact(self):
+        """Merges all segments into one, dropping tombstoned passages. Postings are remapped, not rebuilt."""
+        with self._lock:
+            self._reload()
+            if not self.segments:
+                return
+            document_ids = list(self.manifest["documents"])
+            document_index = {document_id: index for index, document_id in enumerate(document_ids)}
+            hashes, ids, tfs, lengths, documents, texts = [], [], [], [], [], []
+            base = 0
+            for segment in self.segments:
+                live = np.asarray(segment.live)
+                new_ids = np.cumsum(live) - 1 + base
+                counts = np.diff(segment.offsets)
+                posting_terms = np.repeat(np.asarray(segment.terms), counts)
+                keep = live[segment.postings]
+                hashes.append(posting_terms[keep])
+                ids.append(new_ids[segment.postings[keep]].astype(np.int32))
+                tfs.append(np.asarray(segment.tfs)[keep])
+                lengths.append(np.asarray(segment.lengths)[live])
+                remap = np.array([document_index.get(document_id, -1) for document_id in segment.document_ids])
+                documents.append(remap[np.asarray(segment.documents)[live]])
+                texts.extend(segment.passage(passage_id) for passage_id in np.flatnonzero(live))
+                base += int(live.sum())
+            segment_name = f"seg-{uuid.uuid4().hex[:12]}"
+            directory = os.path.join(self.directory, segment_name)
+            os.makedirs(directory)
+            encoded = [text.encode("utf-8") for text in texts]
+            text_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+            np.cumsum([len(data) for data in encoded], out=text_offsets[1:])
+            with open(os.path.join(directory, "text.bin"), "wb") as text_file:
+                text_file.writelines(encoded)
+            _write_postings(directory, np.concatenate(hashes), np.concatenate(ids), np.concatenate(tfs),
+                            np.concatenate(lengths), np.concatenate(documents).astype(np.int32), text_offsets)
+            old = [segment.directory for segment in self.segments]
+            manifest = {"segments": [{"name": segment_name, "documents": document_ids}],
+                        "documents": self.manifest["documents"], "deleted": []}
+            self._commit(manifest)
+        # Other processes may still have the old files mapped; unlinking them is safe on POSIX.
+        for path in old:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def search(self, query: str, k: int = 4) -> List[Dict]:
+        """Top-k passages by BM25 score, best first."""
+        self._reload()
+        segments = self.segments
+        total = sum(segment.count for segment in segments)
+        if not total:
+            return []
+        average_length = max(1.0, sum(segment.total_length for segment in segments) / total)
+        terms = list(dict.fromkeys(term_hashes(query)))
+        ranges = [[segment.postings_for(term) for term in terms] for segment in segments]
+        frequencies = [sum(spans[t][1] - spans[t][0] for spans in ranges) for t in range(len(terms))]
+        idfs = [math.log(1 + (total - df + 0.5) / (df + 0.5)) for df in frequencies]
+
+        candidates: List[Tuple[float, int, int]] = []
+        for segment_index, (segment, spans) in enumerate(zip(segments, ranges)):
+            if not any(end > start for start, end in spans):
+                continue
+            scores = np.zeros(segment.count, dtype=np.float32)
+            for (start, end), idf in zip(spans, idfs):
+                if end == start:
+                    continue
+                ids = segment.postings[start:end]
+                tf = segment.tfs[start:end]
+                norm = K1 * (1 - B + B * segment.lengths[ids] / average_length)
+                scores[ids] += idf * tf * (K1 + 1) / (tf + norm)
+            scores[~segment.live] = 0
+            top = np.argpartition(-scores, k)[:k] if segment.count > k else np.arange(segment.count)
+            candidates.extend((float(scores[i]), segment_index, int(i)) for i in top if scores[i] > 0)
+
+        results = []
+        for score, segment_index, passage_id in sorted(candidates, reverse=True)[:k]:
+            segment = segments[segment_index]
+            results.append({
+                "document_id": segment.document_ids[int(segment.documents[passage_id])],
+                "score": round(score, 4),
+                "text": segment.passage(passage_id),
+            })
+        return results
+
+    def stats(self) -> Dict:
+        self._reload()
+        return {
+            "documents": len(self.manifest["documents"]),
+            "segments": len(self.segments),
+            "passages": sum(int(segment.live.sum()) for segment in self.segments),
+            "dead_passages": sum(int((~segment.live).sum()) for segment in self.segments),
+        }
+
+
+class RetrievalIndex:
+    """Opens CourseIndex objects lazily, one directory per course under root."""
+    def __init__(self, root: str):
+        self.root = root
+        self._courses: Dict[str, CourseIndex] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def valid_course_id(course_id: str) -> bool:
+        return bool(course_id) and len(course_id) <= 64 and all(c.isalnum() or c in "-_" for c in course_id)
+
+    def _directory(self, course_id: str) -> str:
+        # Course IDs become path components, so anything that could leave root ("..", "/abs") is refused.
+        if not self.valid_course_id(course_id):
+            raise ValueError(f"Invalid course ID {course_id!r}")
+        return os.path.join(self.root, course_id)
+
+    def exists(self, course_id: str) -> bool:
+        if not self.valid_course_id(course_id):
+            return False
+        return os.path.exists(os.path.join(self._directory(course_id), "manifest.json"))
+
+    def course(self, course_id: str) -> CourseIndex:
+        directory = self._directory(course_id)
+        with self._lock:
+            index = self._courses.get(course_id)
+            if index is None:
+                index = self._courses[course_id] = CourseIndex(directory)
+            return index
+
+    def search(self, course_id: str, query: str, k: int = 4) -> List[Dict]:
+        if not self.exists(course_id):
+            return []
+        return self.course(course_id).search(query, k)
+
+
+def format_passages(passages: Iterable[Dict]) -> str:
+    """Renders retrieved passages for the Resources slot of the system prompt."""
+    return "Course material (most relevant excerpts):\n" + "\n".join(
+        f"[{number}] {passage['text']}" for number, passage in enumerate(passages, 1)
+    )
@@ -0,0 +1,161 @@
+"""Near-duplicate answer cache for context-free chat questions.
+
+Questions are embedded on the CPU with a hashed bag of normalized words and
+character trigrams (L2-normalized, so a dot product is the cosine
+similarity). All vectors live in one preallocated NumPy matrix, and a lookup
+is a single matrix-vector product restricted to entries of the same
+partition (the caller passes the current subject + course ID). The embedding
+ignores symbols and question words, so a hit also requires the numbers,
+ordinals, operators and question words of both questions to match exactly:
+"what is 2+2" never reuses the answer to "what is 2*2", nor "why is the sky
+blue" the answer to "is the sky blue". Ordinals and number words are
+normalized first, so "Newton's 1st law" and "Newton's first law" agree.
+"""
+import re
+import time
+import zlib
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "what", "whats", "explain", "define", "describe", "tell",
+    "me", "about", "please", "can", "could", "you", "i", "do", "does", "of", "in", "on", "to", "for", "and", "or",
+    "how", "why", "my", "it", "this", "that", "with", "give", "help", "understand", "mean", "meaning", "by",
+}
+ORDINALS = {"1st": "first", "2nd": "second", "3rd": "third", "4th": "fourth", "5th": "fifth"}
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+# Exact tokens: ordinals as "#n", numbers, operators and question words.
+EXACT_PATTERN = re.compile(r"#\d+|\d+(?:\.\d+)?|[-+*/^=<>%!√×÷]|\b(?:why|how|when|where|who|which|whether)\b")
+ORDINAL_PATTERN = re.compile(r"\b(\d+)(?:st|nd|rd|th)\b")
+ORDINAL_WORDS = {
+    word: i + 1 for i, word in enumerate(
+        ["first", "second", "third", "fourth", "fifth", "sixth", "seventh", "eighth", "ninth", "tenth"])
+}
+NUMBER_WORDS = {
+    word: i for i, word in enumerate(
+        ["zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten", "eleven", "twelve"])
+}
+NUMBER_WORD_PATTERN = re.compile(r"\b(" + "|".join([*ORDINAL_WORDS, *NUMBER_WORDS]) + r")\b")
+
+
+def normalize_words(text: str) -> List[str]:
+    """Lowercases, drops possessives and stopwords, spells out ordinals and strips a plural 's'."""
+    words = []
+    for word in WORD_PATTERN.findall(text.lower().replace("'s", "").replace("’s", "")):
+        word = ORDINALS.get(word, word)
+        if word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.append(word)
+    return words
+
+
+def exact_tokens(text: str) -> str:
+    """The numbers, ordinals, operators and question words of text, in order; questions must agree on these."""
+    text = ORDINAL_PATTERN.sub(r"#\1", text.lower())
+    text = NUMBER_WORD_PATTERN.sub(
+        lambda m: f"#{ORDINAL_WORDS[m[1]]}" if m[1] in ORDINAL_WORDS else str(NUMBER_WORDS[m[1]]), text)
+    return " ".join(EXACT_PATTERN.findall(text))
+
+
+class SemanticAnswerCache:
+    """Fixed-capacity cosine-similarity index over answered questions."""
+    def __init__(self, capacity: int = 2000, dimensions: int = 2048, threshold: float = 0.85, ttl: float = 86400.0):
+        self.capacity = capacity
+        self.dimensions = dimensions
+        self.threshold = threshold
+        self.ttl = ttl
+        self.vectors = np.zeros((capacity, dimensions), dtype=np.float32)
+        self.partitions = np.full(capacity, -1, dtype=np.int32)
+        self.last_used = np.zeros(capacity, dtype=np.float64)
+        self.expires_at = np.zeros(capacity, dtype=np.float64)
+        # CRC32 of exact_tokens per entry, to filter candidates; the strings themselves confirm the match.
+        self.signatures = np.zeros(capacity, dtype=np.int64)
+        self.exact: List[str | None] = [None] * capacity
+        self.answers: List[str | None] = [None] * capacity
+        self.labels: List[str | None] = [None] * capacity
+        self._partition_ids: Dict[str, int] = {}
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def embed(self, text: str) -> np.ndarray:
+        """Hashed word + character-trigram vector, L2-normalized."""
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        words = normalize_words(text)
+        for word in words:
+            vector[zlib.crc32(word.encode()) % self.dimensions] += 2.0
+            padded = f"#{word}#"
+            for i in range(len(padded) - 2):
+                vector[zlib.crc32(padded[i:i + 3].encode()) % self.dimensions] += 0.5
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _partition(self, partition: str) -> int:
+        return self._partition_ids.setdefault(partition, len(self._partition_ids))
+
+    def lookup(self, question: str, partition: str) -> Tuple[str | None, str | None, float]:
+        """Returns (answer, label, similarity) for the closest live entry in partition, or (None, None, best score)."""
+        partition_id = self._partition_ids.get(partition)
+        if partition_id is None or not self.size:
+            self.misses += 1
+            return None, None, 0.0
+        now = time.time()
+        query = self.embed(question)
+        exact = exact_tokens(question)
+        live = ((self.partitions[:self.size] == partition_id) & (self.expires_at[:self.size] > now)
+                & (self.signatures[:self.size] == zlib.crc32(exact.encode())))
+        if not live.any():
+            self.misses += 1
+            return None, None, 0.0
+        scores = self.vectors[:self.size] @ query
+        scores[~live] = -1.0
+        best = int(np.argmax(scores))
+        score = float(scores[best])
+        if score < self.threshold or self.exact[best] != exact:
+            self.misses += 1
+            return None, None, score
+        self.last_used[best] = now
+        self.hits += 1
+        return self.answers[best], self.labels[best], score
+
+    def add(self, question: str, partition: str, answer: str, label: str | None = None):
+        """Stores an answer, reusing an expired slot or evicting the least recently used one when full."""
+        now = time.time()
+        if self.size < self.capacity:
+            slot = self.size
+            self.size += 1
+        else:
+            expired = np.flatnonzero(self.expires_at <= now)
+            slot = int(expired[0]) if expired.size else int(np.argmin(self.last_used))
+            self.evictions += 1
+        self.vectors[slot] = self.embed(question)
+        self.exact[slot] = exact_tokens(question)
+        self.signatures[slot] = zlib.crc32(self.exact[slot].encode())
+        self.partitions[slot] = self._partition(partition)
+        self.last_used[slot] = now
+        self.expires_at[slot] = now + self.ttl
+        self.answers[slot] = answer
+        self.labels[slot] = label
+
+    def clear(self):
+        self.size = 0
+        self.partitions[:] = -1
+        self.answers = [None] * self.capacity
+        self.labels = [None] * self.capacity
+        self.exact = [None] * self.capacity
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": self.size,
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "threshold": self.threshold,
+        }
@@ -0,0 +1,43 @@
+"""Production entry point: runs the backend in several worker processes.
+
+`python main.py` starts a single auto-reloading process for development.
+This script starts --workers uvicorn processes on one port instead. The
+workers share state through files next to each other: sessions, cached
+responses and the warm-up lease go through SHARED_STATE_URL, and progress
+and background jobs use their own SQLite files. To spread workers over
+several hosts, point SHARED_STATE_URL at Redis and set GROQ_QUOTA_WORKERS to
+the total worker count; student progress, XP and served tests then live in
+Redis as well. Background jobs stay in each host's JOBS_DB, so a job is
+polled on the host that accepted it (route /jobs with host affinity, or
+have results delivered to a webhook). On SIGTERM each worker stops accepting connections,
+finishes in-flight requests, then drains queued-job generations for up to
+--drain-timeout seconds.
+
+    python serve.py --workers 4 --port 8000
+"""
+import argparse
+import os
+
+import uvicorn
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1))))
+    parser.add_argument("--drain-timeout", type=float, default=float(os.getenv("DRAIN_TIMEOUT", "20")),
+                        help="Seconds to let in-flight requests and queued-job generations finish on shutdown.")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    # Workers inherit the environment, so these have to be in place before uvicorn forks them.
+    os.environ["WEB_CONCURRENCY"] = str(args.workers)
+    os.environ["DRAIN_TIMEOUT"] = str(args.drain_timeout)
+    os.environ.setdefault("SHARED_STATE_URL", "sqlite:///edumentor_state.db")
+    uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers, log_level=args.log_level,
+                timeout_graceful_shutdown=args.drain_timeout)
+
+
+if __name__ == "__main__":
+    main()
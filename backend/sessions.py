@@ -0,0 +1,213 @@
+"""Per-student chat state for EduMentor.
+
+Each session is a compact `__slots__` object whose chat history is a
+bounded ring buffer with a cached token count per message, plus a rolling
+summary of older turns that no longer fit the prompt's token budget. The manager keeps sessions in least-recently-used
+order, so idle sessions and overflow past the session cap are evicted from
+the front in amortized O(1). With a SharedState store the in-memory copy is
+a cache: load() refreshes it when another worker has saved a newer
+revision and save() writes it back, so every worker sees the same history.
+"""
+import asyncio
+import json
+import time
+import uuid
+from collections import OrderedDict, deque
+from itertools import islice
+from typing import Dict, List, Tuple
+
+from shared_state import SharedState
+
+
+# Summarization starts once the ring buffer is this many messages from full, so no turn is evicted unsummarized.
+SUMMARY_HEADROOM = 4
+
+
+def count_tokens(text: str) -> int:
+    """Approximate token count (~4 characters per token), the same heuristic the local rate limiter uses."""
+    return (len(text) + 3) // 4
+
+
+class StudentSession:
+    """Chat state for one student or anonymous chat session."""
+    __slots__ = ("session_id", "chat_history", "history_tokens", "summary", "summary_tokens", "summary_task",
+                 "study_status", "current_subject", "xp", "achievements", "last_seen", "revision")
+
+    def __init__(self, session_id: str, history_messages: int = 12):
+        self.session_id = session_id
+        self.chat_history: deque = deque(maxlen=history_messages)
+        # Same maxlen, so both drop their oldest entry together.
+        self.history_tokens: deque = deque(maxlen=history_messages)
+        self.summary: str | None = None
+        self.summary_tokens = 0
+        self.summary_task: asyncio.Task | None = None
+        self.study_status = "active"
+        self.current_subject: str | None = None
+        self.xp = 0
+        self.achievements: List[str] = []
+        self.last_seen = time.monotonic()
+        self.revision: str | None = None
+
+    def to_record(self) -> str:
+        """The durable part of the session, for a shared store."""
+        return json.dumps({
+            "revision": self.revision,
+            "chat_history": list(self.chat_history),
+            "summary": self.summary,
+            "study_status": self.study_status,
+            "current_subject": self.current_subject,
+            "xp": self.xp,
+            "achievements": self.achievements,
+        })
+
+    def restore(self, data: Dict):
+        """Replaces this session's state, in place, with a decoded to_record record."""
+        self.chat_history.clear()
+        self.history_tokens.clear()
+        for message in data["chat_history"]:
+            self.chat_history.append(message)
+            self.history_tokens.append(count_tokens(message["content"]))
+        self.summary = data["summary"]
+        self.summary_tokens = count_tokens(self.summary) if self.summary else 0
+        self.study_status = data["study_status"]
+        self.current_subject = data["current_subject"]
+        self.xp = data["xp"]
+        self.achievements = data["achievements"]
+        self.revision = data["revision"]
+
+    def add_turn(self, user_input: str, reply: str, max_chars: int):
+        """Appends a user/assistant exchange, truncating each message to max_chars."""
+        for role, content in (("user", user_input[:max_chars]), ("assistant", reply[:max_chars])):
+            self.chat_history.append({"role": role, "content": content})
+            self.history_tokens.append(count_tokens(content))
+
+    @property
+    def has_context(self) -> bool:
+        return bool(self.chat_history or self.summary)
+
+    @property
+    def near_capacity(self) -> bool:
+        """True when the next turns would push messages out of the ring buffer before they are summarized."""
+        return len(self.chat_history) > max(2, self.chat_history.maxlen - SUMMARY_HEADROOM)
+
+    def context_messages(self, budget: int) -> Tuple[List[Dict[str, str]], int]:
+        """The rolling summary plus the most recent whole turns that fit in budget tokens.
+
+        Also returns how many of the oldest messages are due for summarization: those left out, or, when the
+        buffer is near capacity, at least the oldest half of it (whole turns), so they reach the summary before
+        the buffer evicts them.
+        """
+        used = self.summary_tokens
+        start = len(self.chat_history)
+        while start >= 2:
+            turn_tokens = self.history_tokens[start - 1] + self.history_tokens[start - 2]
+            if used + turn_tokens > budget:
+                break
+            used += turn_tokens
+            start -= 2
+        messages = list(islice(self.chat_history, start, None))
+        if self.summary:
+            messages.insert(0, {"role": "system", "content": f"Summary of the earlier conversation: {self.summary}"})
+        overflow = max(start, len(self.chat_history) // 4 * 2) if self.near_capacity else start
+        return messages, overflow
+
+    def apply_summary(self, summary: str, summarized: List[Dict[str, str]]):
+        """Replaces the summary and drops the messages it now covers, if they are still the oldest ones."""
+        for message in summarized:
+            # Compared by value: a refresh from the shared store replaces the message objects.
+            if not self.chat_history or self.chat_history[0] != message:
+                break
+            self.chat_history.popleft()
+            self.history_tokens.popleft()
+        self.summary = summary
+        self.summary_tokens = count_tokens(summary)
+
+
+class SessionManager:
+    """Keeps StudentSession objects keyed by session ID with idle and size-based eviction."""
+    def __init__(self, max_sessions: int = 10000, idle_timeout: float = 1800.0, history_messages: int = 12,
+                 max_message_chars: int = 4000, store: SharedState | None = None):
+        # Worst-case memory is bounded by max_sessions * (history_messages * max_message_chars + one summary).
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.history_messages = history_messages
+        self.max_message_chars = max_message_chars
+        self.store = store
+        self._sessions: "OrderedDict[str, StudentSession]" = OrderedDict()
+        self.evicted_idle = 0
+        self.evicted_capacity = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get(self, session_id: str) -> StudentSession:
+        """Returns the session for session_id, creating it if needed, and marks it as recently used."""
+        now = time.monotonic()
+        session = self._sessions.get(session_id)
+        if session is None:
+            self.evict_idle(now)
+            session = StudentSession(session_id, self.history_messages)
+            self._sessions[session_id] = session
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evicted_capacity += 1
+        else:
+            self._sessions.move_to_end(session_id)
+        session.last_seen = now
+        return session
+
+    async def load(self, session_id: str) -> StudentSession:
+        """Like get, but first picks up any newer revision another worker saved to the shared store."""
+        await self.fetch(session_id)
+        return self.get(session_id)
+
+    async def save(self, session: StudentSession):
+        """Writes the session to the shared store under a new revision; a no-op without a store."""
+        if self.store is None:
+            return
+        session.revision = uuid.uuid4().hex
+        await self.store.set(f"session:{session.session_id}", session.to_record(), self.idle_timeout)
+
+    def peek(self, session_id: str) -> StudentSession | None:
+        """Returns an existing session without creating or touching it."""
+        return self._sessions.get(session_id)
+
+    async def fetch(self, session_id: str) -> StudentSession | None:
+        """Like peek, but also finds sessions that only another worker has seen."""
+        session = self.peek(session_id)
+        if self.store is None:
+            return session
+        record = await self.store.get(f"session:{session_id}")
+        if record is None:
+            return session
+        data = json.loads(record)
+        session = session or self.get(session_id)
+        if data["revision"] != session.revision:
+            session.restore(data)
+        return session
+
+    def summary_tasks(self) -> List[asyncio.Task]:
+        """Summarization tasks still running, so shutdown can let them finish."""
+        return [session.summary_task for session in self._sessions.values()
+                if session.summary_task is not None and not session.summary_task.done()]
+
+    def evict_idle(self, now: float | None = None) -> int:
+        """Drops sessions idle for longer than idle_timeout. Oldest sessions sit at the front."""
+        cutoff = (now or time.monotonic()) - self.idle_timeout
+        evicted = 0
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if oldest.last_seen > cutoff:
+                break
+            self._sessions.popitem(last=False)
+            evicted += 1
+        self.evicted_idle += evicted
+        return evicted
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "active_sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "evicted_idle": self.evicted_idle,
+            "evicted_capacity": self.evicted_capacity,
+        }
@@ -0,0 +1,173 @@
+"""State shared between server workers: chat sessions, cached responses and leases.
+
+SharedState is a small key-value interface with expiry plus a lease
+primitive (one holder at a time, e.g. for the catalogue warm-up).
+SQLiteSharedState is the local implementation: one WAL-mode file that every
+worker on a host opens. RedisSharedState is the network implementation for
+workers spread over several hosts; it needs the optional 'redis' package.
+open_shared_state picks one from a URL:
+
+    sqlite:///edumentor_state.db      (the default)
+    redis://cache.internal:6379/0
+"""
+import asyncio
+import sqlite3
+import threading
+import time
+from typing import Iterable, List, Tuple
+
+try:
+    import redis.asyncio as redis_asyncio
+except ImportError:  # only needed for redis:// URLs
+    redis_asyncio = None
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS state (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    expires_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS state_expires ON state (expires_at);
+"""
+
+ACQUIRE_LEASE = (
+    "INSERT INTO state (key, value, expires_at) VALUES (?, ?, ?) "
+    "ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at "
+    "WHERE state.expires_at <= ? OR state.value = excluded.value"
+)
+
+RENEW_LEASE_SCRIPT = (
+    "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('pexpire', KEYS[1], ARGV[2]) end return 0"
+)
+
+
+class SharedState:
+    """Interface for shared key-value state with per-key expiry."""
+    name = "base"
+
+    async def get(self, key: str) -> str | None:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: str, ttl: float):
+        raise NotImplementedError
+
+    async def delete(self, key: str):
+        raise NotImplementedError
+
+    async def scan(self, prefix: str) -> List[Tuple[str, str]]:
+        """All live (key, value) pairs whose key starts with prefix. Meant for admin paths, not requests."""
+        raise NotImplementedError
+
+    async def acquire(self, lease: str, holder: str, ttl: float) -> bool:
+        """Takes or renews lease for holder; False while someone else holds it."""
+        raise NotImplementedError
+
+    async def close(self):
+        """Releases connections."""
+
+
+class SQLiteSharedState(SharedState):
+    """Shared state in one SQLite file, for the workers of a single host."""
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA busy_timeout=5000")
+        self._db.executescript(SCHEMA)
+        self._db_lock = threading.Lock()
+        self._writes = 0
+
+    def _execute(self, sql: str, params: Iterable = ()) -> sqlite3.Cursor:
+        with self._db_lock:
+            return self._db.execute(sql, tuple(params))
+
+    def _query(self, sql: str, params: Iterable = ()) -> List[tuple]:
+        with self._db_lock:
+            return self._db.execute(sql, tuple(params)).fetchall()
+
+    async def get(self, key: str) -> str | None:
+        rows = await asyncio.to_thread(
+            self._query, "SELECT value FROM state WHERE key = ? AND expires_at > ?", (key, time.time())
+        )
+        return rows[0][0] if rows else None
+
+    async def set(self, key: str, value: str, ttl: float):
+        await asyncio.to_thread(
+            self._execute, "INSERT OR REPLACE INTO state (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, value, time.time() + ttl),
+        )
+        self._writes += 1
+        if self._writes % 1024 == 0:
+            await asyncio.to_thread(self._execute, "DELETE FROM state WHERE expires_at <= ?", (time.time(),))
+
+    async def delete(self, key: str):
+        await asyncio.to_thread(self._execute, "DELETE FROM state WHERE key = ?", (key,))
+
+    async def scan(self, prefix: str) -> List[Tuple[str, str]]:
+        # Range scan on the primary key: every key with the prefix sorts between prefix and prefix + U+FFFF.
+        return await asyncio.to_thread(
+            self._query, "SELECT key, value FROM state WHERE key >= ? AND key < ? AND expires_at > ?",
+            (prefix, prefix + "\uffff", time.time()),
+        )
+
+    async def acquire(self, lease: str, holder: str, ttl: float) -> bool:
+        now = time.time()
+        cursor = await asyncio.to_thread(self._execute, ACQUIRE_LEASE, (lease, holder, now + ttl, now))
+        return cursor.rowcount > 0
+
+    async def close(self):
+        with self._db_lock:
+            self._db.close()
+
+
+class RedisSharedState(SharedState):
+    """Shared state in Redis, for workers on several hosts."""
+    name = "redis"
+
+    def __init__(self, url: str):
+        if redis_asyncio is None:
+            raise RuntimeError("redis:// shared state needs the optional 'redis' package on the server.")
+        self.url = url
+        self._client = redis_asyncio.from_url(url, decode_responses=True)
+
+    @property
+    def client(self):
+        """The Redis connection, for stores that need more than key-value (see progress.RedisProgressStore)."""
+        return self._client
+
+    async def get(self, key: str) -> str | None:
+        return await self._client.get(key)
+
+    async def set(self, key: str, value: str, ttl: float):
+        await self._client.set(key, value, px=max(1, int(ttl * 1000)))
+
+    async def delete(self, key: str):
+        await self._client.delete(key)
+
+    async def scan(self, prefix: str) -> List[Tuple[str, str]]:
+        keys = [key async for key in self._client.scan_iter(match=f"{prefix}*", count=1000)]
+        values = await self._client.mget(keys) if keys else []
+        return [(key, value) for key, value in zip(keys, values) if value is not None]
+
+    async def acquire(self, lease: str, holder: str, ttl: float) -> bool:
+        milliseconds = max(1, int(ttl * 1000))
+        if await self._client.set(lease, holder, nx=True, px=milliseconds):
+            return True
+        # Renewal is only safe for the current holder; a script keeps the check and the extend atomic.
+        renewed = await self._client.eval(RENEW_LEASE_SCRIPT, 1, lease, holder, milliseconds)
+        return bool(renewed)
+
+    async def close(self):
+        await self._client.aclose()
+
+
+def open_shared_state(url: str) -> SharedState:
+    """SQLiteSharedState for sqlite:///path, RedisSharedState for redis:// and rediss:// URLs."""
+    if url.startswith("sqlite:///"):
+        return SQLiteSharedState(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://")):
+        return RedisSharedState(url)
+    raise ValueError(f"Unsupported SHARED_STATE_URL {url!r}; use sqlite:///path or redis://host:port/db.")
@@ -0,0 +1,114 @@
+"""Coalescing of identical concurrent generations.
+
+SingleFlight lets concurrent callers with the same key share one in-flight
+call. SharedStream does the same for token streams: one task pumps the
+upstream stream into a buffer and every subscriber replays the buffer and
+then follows new tokens as they arrive, so late joiners still receive the
+whole answer. The upstream stream is aborted once the last subscriber
+leaves.
+"""
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time; callers arriving meanwhile await the same result."""
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Task] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    async def run(self, key: str, call: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """Returns (result, shared). A caller that is cancelled does not cancel the call for the others."""
+        task = self._calls.get(key)
+        if task is not None:
+            self.followers += 1
+            return await asyncio.shield(task), True
+        self.leaders += 1
+        task = asyncio.ensure_future(call())
+        self._calls[key] = task
+        task.add_done_callback(lambda _: self._calls.pop(key, None))
+        return await asyncio.shield(task), False
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+
+class SharedStream:
+    """Fans one token stream out to any number of subscribers."""
+    def __init__(self, source: AsyncIterator[str]):
+        self.tokens: List[str] = []
+        self.done = False
+        self.error: BaseException | None = None
+        self.subscribers = 0
+        self.abandoned = False
+        self._updated = asyncio.Event()
+        self.task = asyncio.create_task(self._pump(source))
+
+    def _notify(self):
+        self._updated.set()
+        self._updated = asyncio.Event()
+
+    async def _pump(self, source: AsyncIterator[str]):
+        try:
+            async for token in source:
+                self.tokens.append(token)
+                self._notify()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._notify()
+            await source.aclose()
+
+    def subscribe(self) -> AsyncIterator[str]:
+        # Counted on subscription, not on first iteration, so a subscriber that has not started yet keeps the stream alive.
+        self.subscribers += 1
+        return self._follow()
+
+    async def _follow(self) -> AsyncIterator[str]:
+        index = 0
+        try:
+            while True:
+                while index < len(self.tokens):
+                    yield self.tokens[index]
+                    index += 1
+                if self.done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                await self._updated.wait()
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and not self.done:
+                self.abandoned = True
+                self.task.cancel()
+
+
+class StreamGroup:
+    """Keeps one SharedStream per key while it is in flight."""
+    def __init__(self):
+        self._streams: Dict[str, SharedStream] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def subscribe(self, key: str, open_source: Callable[[], AsyncIterator[str]]) -> Tuple[AsyncIterator[str], bool]:
+        """Returns (tokens, shared), starting the source only if no stream for key is running."""
+        stream = self._streams.get(key)
+        shared = stream is not None and not stream.done and not stream.abandoned
+        if shared:
+            self.followers += 1
+        else:
+            self.leaders += 1
+            stream = self._streams[key] = SharedStream(open_source())
+            stream.task.add_done_callback(lambda _, stream=stream: self._discard(key, stream))
+        return stream.subscribe(), shared
+
+    def _discard(self, key: str, stream: SharedStream):
+        if self._streams.get(key) is stream:
+            del self._streams[key]
+
+    def __len__(self) -> int:
+        return len(self._streams)